@@ -1,6 +1,13 @@
+import os
 import collections
+import collections.abc
 import logging
 import inspect
+import time
+import threading
+import concurrent.futures
+
+from pyvivado import config, utils
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +39,7 @@ def make_hashable(d):
         for v in d:
             hs.append(make_hashable(v))
         h = frozenset(hs)        
-    elif not isinstance(d, collections.Hashable):
+    elif not isinstance(d, collections.abc.Hashable):
         logger.error('Cannot hash {}'.format(d))
         h = d
     else:
@@ -87,9 +94,30 @@ class Builder(object):
         if self.package_name is not None:
             _id = self.package_name
         else:
-            _id = (self.__class__, make_hashable(self.params))
+            _id = (self.__class__, self.fingerprint())
         return _id
 
+    def canonical_form(self):
+        '''
+        What identifies the files this builder generates (see
+        `utils.canonical`).  Builders made by factories must add the
+        factory arguments since their classes all share a name.
+        '''
+        return (self.__class__, self.params)
+
+    def fingerprint(self):
+        '''
+        A stable fingerprint of the builder class and its parameters.
+        Unlike `hash` this is the same in every process so it can be used
+        for file names and cache keys.
+
+        It is only worked out once so the parameters must not be changed
+        after it has been used.
+        '''
+        if getattr(self, '_fingerprint', None) is None:
+            self._fingerprint = utils.fingerprint(self)
+        return self._fingerprint
+
     def required_filenames(self, directory):
         '''
         Returns the files required to build this module.  It does not include
@@ -126,10 +154,26 @@ class Builder(object):
         '''
         return self.packages
 
-    def build(self, directory, false_directory=None, top_params={}):
+    def ooc_module(self):
+        '''
+        Returns the (module name, generics dictionary) of the module this
+        builder makes if it is worth synthesizing out of context (see
+        `ooc`), otherwise None.  The generics must be empty since the
+        module is replaced by a stub without generics.
+
+        Override this method in builders of large modules.
+        '''
+        return None
+
+    def build(self, directory, false_directory=None, top_params={},
+              files=None):
         '''
         Complex builders override this method to generate the required
         files.
+
+        Builders that take a `files` argument put the files that they
+        generate in it (a `utils.VirtualFiles`) rather than writing them
+        to disk when it is not None.
         '''
         pass
 
@@ -148,34 +192,152 @@ def params_from_xco(xco_filename):
     return params
 
 
+class BuilderGraph(object):
+    '''
+    The dependency graph of all the builders required by some top level
+    builders.  Each builder appears once (builders with the same ID are
+    the same builder) and the IDs are only worked out once.
+    '''
+
+    def __init__(self, top_builders=[], top_package=None, top_params={}):
+        '''
+        Args:
+            `top_builders`: The builders of the top level modules.
+            `top_package`: The name of a registered package that is
+                required at the top level.
+            `top_params`: The parameters used to create package builders.
+        '''
+        # The builders keyed by ID in the order they were found.
+        self.builders = collections.OrderedDict()
+        # The IDs of the builders that each builder depends upon.
+        self.dependencies = {}
+        todo = collections.deque()
+        def add(_id, new_builder):
+            if _id not in self.builders:
+                self.builders[_id] = new_builder
+                todo.append(_id)
+        for top_builder in top_builders:
+            add(top_builder._id(), top_builder)
+        if top_package:
+            add(top_package, self.package_builder(top_package, top_params))
+        while todo:
+            active_id = todo.popleft()
+            active_builder = self.builders[active_id]
+            dependencies = []
+            for new_builder in active_builder.required_builders():
+                _id = new_builder._id()
+                add(_id, new_builder)
+                dependencies.append(_id)
+            for new_package in active_builder.required_packages():
+                if new_package not in self.builders:
+                    add(new_package,
+                        self.package_builder(new_package, top_params))
+                dependencies.append(new_package)
+            self.dependencies[active_id] = dependencies
+        self.order = self.topological_order()
+
+    @staticmethod
+    def package_builder(package_name, top_params):
+        package_builder = package_register[package_name](top_params)
+        if package_builder._id() != package_name:
+            raise ValueError('Package builder for {} has the ID {}.'.format(
+                package_name, package_builder._id()))
+        return package_builder
+
+    def topological_order(self):
+        '''
+        Get the builder IDs ordered so that every builder comes after the
+        builders it depends upon.  Raises a `ValueError` if the
+        dependencies are circular.
+        '''
+        order = []
+        # IDs that are being visited (i.e. on the current path) are False
+        # and IDs that have been visited are True.
+        visited = {}
+        for top_id in self.builders:
+            if top_id in visited:
+                continue
+            visited[top_id] = False
+            stack = [(top_id, iter(self.dependencies[top_id]))]
+            while stack:
+                _id, dependencies = stack[-1]
+                for dependency in dependencies:
+                    if dependency not in visited:
+                        visited[dependency] = False
+                        stack.append(
+                            (dependency, iter(self.dependencies[dependency])))
+                        break
+                    elif not visited[dependency]:
+                        cycle = [self.label(i) for i, d in stack] + [
+                            self.label(dependency)]
+                        raise ValueError('Circular builder dependencies: {}'.format(
+                            ' -> '.join(cycle)))
+                else:
+                    stack.pop()
+                    visited[_id] = True
+                    order.append(_id)
+        return order
+
+    def ordered_builders(self):
+        '''
+        The builders in topological order (see `topological_order`).
+        '''
+        return [self.builders[_id] for _id in self.order]
+
+    def label(self, _id):
+        '''
+        A readable name for a builder.
+        '''
+        b = self.builders[_id]
+        if b.package_name is not None:
+            label = b.package_name
+        else:
+            label = '{}:{}'.format(b.__class__.__name__, b.fingerprint()[:8])
+        return label
+
+    def to_json(self):
+        '''
+        Get the graph as a dictionary of 'nodes' and 'edges' that can be
+        written as JSON.  Edges go from a builder to a builder that it
+        depends upon.
+        '''
+        nodes = []
+        edges = []
+        for _id in self.order:
+            b = self.builders[_id]
+            nodes.append({
+                'label': self.label(_id),
+                'class': '{}.{}'.format(b.__class__.__module__,
+                                        b.__class__.__qualname__),
+                'fingerprint': b.fingerprint(),
+            })
+            for dependency in self.dependencies[_id]:
+                edges.append([self.label(_id), self.label(dependency)])
+        return {'nodes': nodes, 'edges': edges}
+
+    def to_dot(self):
+        '''
+        Get the graph in the DOT language so it can be drawn with graphviz.
+        '''
+        lines = ['digraph builders {']
+        for _id in self.order:
+            lines.append('  "{}";'.format(self.label(_id)))
+            for dependency in self.dependencies[_id]:
+                lines.append('  "{}" -> "{}";'.format(
+                    self.label(_id), self.label(dependency)))
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+
 def get_all_builders(top_builders=[], top_package=None, top_params={}):
     '''
     Takes a list of builders and generate a list of all required builders
-    by looking at their dependencies.
+    by looking at their dependencies.  Builders come after the builders
+    they depend upon.
     '''
-    done_builders = {}
-    todo_builders = {}
-    for top_builder in top_builders:
-        todo_builders[top_builder._id()] = top_builder
-    if top_package:
-        package_builder = package_register[package_name](top_params)
-        todo_builders[package_builder._id()] = package_builder
-    while todo_builders:
-        active_id = list(todo_builders.keys())[0]
-        active_builder = todo_builders[active_id]
-        del todo_builders[active_id]
-        done_builders[active_id] = active_builder
-        for new_builder in active_builder.required_builders():
-            _id = new_builder._id()
-            if _id not in done_builders:
-                todo_builders[_id] = new_builder
-        for new_package in active_builder.required_packages():
-            if new_package not in done_builders:
-                package_builder = package_register[new_package](top_params)
-                assert(package_builder._id() == new_package)
-                todo_builders[new_package] = package_builder
-    builders = done_builders.values()
-    return builders
+    graph = BuilderGraph(top_builders=top_builders, top_package=top_package,
+                         top_params=top_params)
+    return graph.ordered_builders()
 
 def condense_ips(ips):
     '''
@@ -205,30 +367,156 @@ def get_requirements(builders, directory):
         'ips': condense_ips(ips),
     }
 
+def run_builders(graph, build, n_threads=1):
+    '''
+    Call `build(builder)` for each builder in a `BuilderGraph` using a
+    pool of `n_threads` threads.  A builder is never built before the
+    builders it depends upon have finished.
+
+    Returns a dictionary of the seconds each build took keyed by builder ID.
+    '''
+    def timed_build(b):
+        start = time.time()
+        build(b)
+        return time.time() - start
+    # The number of unbuilt dependencies of each builder and the
+    # builders that depend on each builder.
+    n_waiting = dict((_id, len(set(graph.dependencies[_id])))
+                     for _id in graph.order)
+    dependents = collections.defaultdict(list)
+    for _id in graph.order:
+        for d in set(graph.dependencies[_id]):
+            dependents[d].append(_id)
+    ready = collections.deque(
+        _id for _id in graph.order if n_waiting[_id] == 0)
+    times = {}
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        while ready or running:
+            while ready:
+                _id = ready.popleft()
+                running[executor.submit(timed_build, graph.builders[_id])] = _id
+            finished, unfinished = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                _id = running.pop(future)
+                times[_id] = future.result()
+                logger.debug('Built {} in {:.2f} s.'.format(
+                    graph.label(_id), times[_id]))
+                for dependent in dependents[_id]:
+                    n_waiting[dependent] -= 1
+                    if n_waiting[dependent] == 0:
+                        ready.append(dependent)
+    return times
+
 def build_all(directory, top_builders=[], top_package=None, top_params={},
-              false_directory=None):
+              false_directory=None, files=None, temp_directory=None,
+              n_threads=1):
     '''
     Takes a few top level builders, works out what all the
     dependencies are, generates all the required files, and returns
     the filenames and IP information of the requirements.
 
+    Files are only written if their contents have changed.  The
+    requirements include the 'changed_filenames' that were written.
+
+    Args:
+        `directory`: Where the files are generated.
+        `false_directory`: Where the files should think they are being placed.
+        `files`: If this `utils.VirtualFiles` is given the files are
+            generated in memory rather than written to `directory`.
+        `temp_directory`: Builders that can only write to disk build into
+            this directory when `files` is given.  The files they write
+            are then read into `files`.
+        `n_threads`: How many builders can build at once.  Builders are
+            built after the builders they depend upon.  The requirements
+            include the 'build_times' of each builder keyed by builder ID.
     '''
-    builders = get_all_builders(top_builders=top_builders,
-                                top_package=top_package,
-                                top_params=top_params)
-    for builder in builders:
-        argspec = inspect.getargspec(builder.build)
-        # Don't force all builders to take 'false_directory' or
-        # 'top_params' when almost none need it.
+    graph = BuilderGraph(top_builders=top_builders, top_package=top_package,
+                         top_params=top_params)
+    builders = graph.ordered_builders()
+    in_memory = (files is not None)
+    if not in_memory:
+        # Generate in memory first so that only the files that have
+        # changed are written.
+        files = utils.VirtualFiles()
+    changed_filenames = set()
+    changed_lock = threading.Lock()
+    def build(builder):
+        argspec = inspect.getfullargspec(builder.build)
+        # Don't force all builders to take 'false_directory', 'top_params'
+        # or 'files' when almost none need it.
         kwargs = {'directory': directory}
         if 'false_directory' in argspec.args:
             kwargs['false_directory'] = false_directory
         if 'top_params' in argspec.args:
             kwargs['top_params'] = top_params
-        builder.build(**kwargs)
+        if 'files' in argspec.args:
+            kwargs['files'] = files
+            builder.build(**kwargs)
+        elif in_memory:
+            build_to_memory(builder, kwargs, directory, files, temp_directory)
+        else:
+            changed = build_to_disk(builder, kwargs, directory)
+            with changed_lock:
+                changed_filenames.update(changed)
+    build_times = run_builders(graph, build, n_threads=n_threads)
+    if not in_memory:
+        changed_filenames |= set(files.write_all())
     requirements = get_requirements(builders, directory)
+    requirements['changed_filenames'] = changed_filenames
+    requirements['build_times'] = build_times
     return requirements
 
+def build_to_disk(builder, kwargs, directory):
+    '''
+    Run a builder that can only write to disk.
+    Returns the set of its files whose contents changed.
+    '''
+    fns = [fn for fn in builder.required_filenames(directory)
+           if not os.path.relpath(fn, directory).startswith(os.pardir)]
+    manifest = utils.get_default_manifest()
+    def get_digests():
+        existing = [fn for fn in fns if os.path.exists(fn)]
+        return dict(zip(existing, manifest.digests(existing)))
+    old_digests = get_digests()
+    builder.build(**kwargs)
+    new_digests = get_digests()
+    return set(fn for fn in new_digests
+               if new_digests[fn] != old_digests.get(fn, None))
+
+def build_to_memory(builder, kwargs, directory, files, temp_directory):
+    '''
+    Generate the files of a builder that can only write to disk and put
+    them in `files` as if they had been generated in `directory`.
+    '''
+    if temp_directory is None:
+        raise ValueError(
+            '{} can only build to disk so a temp_directory is required.'.format(
+                builder.__class__.__name__))
+    os.makedirs(temp_directory, exist_ok=True)
+    if 'false_directory' in kwargs:
+        kwargs['false_directory'] = kwargs['false_directory'] or directory
+    kwargs['directory'] = temp_directory
+    builder.build(**kwargs)
+    for fn in builder.required_filenames(temp_directory):
+        relative_fn = os.path.relpath(fn, temp_directory)
+        if not relative_fn.startswith(os.pardir):
+            with open(fn, 'rb') as f:
+                files[os.path.join(directory, relative_fn)] = f.read()
+
+
+def source_name(fn):
+    '''
+    How a source file given to a builder factory is identified in the
+    builder's fingerprint.  Files in `config.hdldir` are named relative to
+    it so that fingerprints don't depend on where pyvivado is installed.
+    '''
+    fn = os.path.abspath(fn)
+    relative_fn = os.path.relpath(fn, config.hdldir)
+    if relative_fn.startswith(os.pardir):
+        return fn
+    return relative_fn
 
 def make_simple_builder(filenames=[], builders=[], ips=[]):
     '''
@@ -242,30 +530,54 @@ def make_simple_builder(filenames=[], builders=[], ips=[]):
             self.simple_filenames = filenames
             self.builders = builders
             self.simple_ips = ips
+
+        def canonical_form(self):
+            return (self.__class__,
+                    [source_name(fn) for fn in filenames],
+                    # Child fingerprints are cached so shared builders
+                    # aren't serialized again.
+                    [b.fingerprint() for b in builders], ips)
             
     return SimpleBuilder
 
 def make_template_builder(template_fn):
     '''
-    Construct a Builder that formats a template.
+    Construct a Builder that formats a template.  The generated file is
+    named after the template and the fingerprint of the parameters so that
+    each set of parameters gets its own file.
     '''
     possible_endings = ('.vhd.t', '.v.t', '.sv.t')
     stem = None
     for ending in possible_endings:
-        if template_fn[-len(ending):] == ending:
-            stem = template_fn[:len(ending)]
-            suffix = template_fn[-len(ending):]
+        if template_fn.endswith(ending):
+            stem = os.path.basename(template_fn[:-len(ending)])
+            suffix = ending[:-len('.t')]
     if stem is None:
-        raise ValueError('Template {} does not end with an expected ending {}').format(
-            template_fn, possible_endings)
+        raise ValueError('Template {} does not end with an expected ending {}'.format(
+            template_fn, possible_endings))
 
     class TemplateBuilder(Builder):
         
         def __init__(self, params):
             super().__init__(params)
-            self.params_hash = hash(make_hashable(params))
+
+        def canonical_form(self):
+            return (self.__class__, source_name(template_fn), self.params)
         
         def filename(self, directory):
+            # 16 hex digits is plenty to tell the parameter sets apart.
             return os.path.join(
-                directory, '{}{}{}'.format(stem, self.params_hash, suffix))
-    
+                directory, '{}_{}{}'.format(stem, self.fingerprint()[:16], suffix))
+
+        def required_filenames(self, directory):
+            return [self.filename(directory)]
+
+        def build(self, directory, files=None):
+            utils.format_file(
+                template_filename=template_fn,
+                output_filename=self.filename(directory),
+                parameters=self.params,
+                files=files,
+            )
+
+    return TemplateBuilder
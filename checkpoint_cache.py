@@ -0,0 +1,213 @@
+'''
+Sharing the results of synthesis and implementation between projects.
+
+Projects with the same design (i.e. the same `Project.hash`) targeting the
+same part with the same strategy and synthesis options produce the same
+checkpoints and bitstream.  A `CheckpointCache` saves the post-synthesis
+and post-route checkpoints (and the bitstream) of a project so that they
+can be restored into the runs of another project rather than
+synthesizing and implementing it again.
+
+Nothing is saved automatically.  Call `Project.save_checkpoints` (with
+the same strategy and options) once a synthesis or implementation task
+has finished with FINISHED_OK to fill the cache.
+
+The cache keeps its entries in a store.  `LocalDirectoryStore` keeps them
+in a directory, which can be on a shared filesystem so that several
+machines (e.g. CI workers) share the cache.  Other stores only need the
+same `has`, `get` and `put` methods.
+'''
+
+import os
+import glob
+import shutil
+import logging
+import tempfile
+
+from pyvivado import config, utils
+
+logger = logging.getLogger(__name__)
+
+
+class LocalDirectoryStore(object):
+    '''
+    Keeps each entry (a set of files) in a directory named after its key.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def has(self, key):
+        return os.path.isdir(self.path(key))
+
+    def get(self, key, directory):
+        '''
+        Copy the files of an entry into `directory`.
+        Returns the names of the files.  Raises a `KeyError` if there is
+        no such entry.
+        '''
+        if not self.has(key):
+            raise KeyError(key)
+        names = sorted(os.listdir(self.path(key)))
+        os.makedirs(directory, exist_ok=True)
+        for name in names:
+            shutil.copy2(os.path.join(self.path(key), name),
+                         os.path.join(directory, name))
+        return names
+
+    def put(self, key, fns):
+        '''
+        Store some files as an entry.  The entry appears all at once so
+        other processes never see part of an entry.  Existing entries are
+        left alone.
+        '''
+        if self.has(key):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        temp_directory = tempfile.mkdtemp(dir=self.directory)
+        try:
+            for fn in fns:
+                shutil.copy2(fn, os.path.join(temp_directory, os.path.basename(fn)))
+            try:
+                os.rename(temp_directory, self.path(key))
+            except OSError:
+                # Someone else stored the same entry at the same time.
+                if not self.has(key):
+                    raise
+        finally:
+            if os.path.exists(temp_directory):
+                shutil.rmtree(temp_directory)
+
+    def delete(self, key):
+        if self.has(key):
+            shutil.rmtree(self.path(key))
+
+
+class CheckpointCache(object):
+    '''
+    Saves and restores the checkpoints of the synthesis and implementation
+    runs of projects.
+    '''
+
+    # For each stage the run and the files that are saved.
+    STAGES = (
+        ('synth', 'synth_1', ('*.dcp',)),
+        ('impl', 'impl_1', ('*_routed.dcp', '*.bit')),
+    )
+    # Written into restored runs.  It names the checkpoint that
+    # ::pyvivado::restored_checkpoint should open.
+    RESTORED_FN = 'pyvivado_restored.txt'
+
+    def __init__(self, store=None):
+        '''
+        Args:
+            `store`: Where the entries are kept.  Defaults to a
+                `LocalDirectoryStore` in `config.cachedir`.
+        '''
+        if store is None:
+            store = LocalDirectoryStore(
+                os.path.join(config.cachedir, 'checkpoints'))
+        self.store = store
+
+    @staticmethod
+    def key(design_hash, part, board, strategy, stage, keep_hierarchy=False):
+        '''
+        The key of the entry for a stage of a design.
+
+        Args:
+            `strategy`: Names the run settings that aren't part of the
+                design so that checkpoints built with different settings
+                aren't mixed up.
+            `keep_hierarchy`: Whether the design was synthesized keeping
+                its hierarchy.
+        '''
+        synth_options = {
+            'flatten_hierarchy': 'rebuilt' if keep_hierarchy else 'full',
+        }
+        return '{}-{}'.format(utils.fingerprint(
+            [design_hash.hex(), part, board, strategy, synth_options]), stage)
+
+    @staticmethod
+    def design(project):
+        '''
+        Get the (design hash, part, board) of a project.
+        '''
+        design_hash = project.read_hash(project.directory)
+        record = project.read_files_record(project.directory)
+        if (design_hash is None) or (record is None):
+            raise ValueError('Project {} has no record of its design.'.format(
+                project.directory))
+        return design_hash, record['part'], record['board']
+
+    @staticmethod
+    def run_directory(project, run_name):
+        return os.path.join(project.directory, 'TheProject.runs', run_name)
+
+    @staticmethod
+    def run_finished(run_directory):
+        '''
+        Whether a run finished without errors.
+        '''
+        return (os.path.exists(os.path.join(run_directory, '.vivado.end.rst')) and
+                not os.path.exists(os.path.join(run_directory, '.vivado.error.rst')))
+
+    def save(self, project, strategy='default', keep_hierarchy=False):
+        '''
+        Save the checkpoints of the finished runs of a project.  The
+        arguments are as for `key`.
+
+        Returns the names of the stages that were saved.
+        '''
+        design_hash, part, board = self.design(project)
+        saved = []
+        for stage, run_name, patterns in self.STAGES:
+            run_directory = self.run_directory(project, run_name)
+            if not self.run_finished(run_directory):
+                continue
+            fns = []
+            for pattern in patterns:
+                fns += sorted(glob.glob(os.path.join(run_directory, pattern)))
+            # A run can only be restored from a checkpoint.
+            if any(fn.endswith('.dcp') for fn in fns):
+                self.store.put(
+                    self.key(design_hash, part, board, strategy, stage,
+                             keep_hierarchy=keep_hierarchy), fns)
+                saved.append(stage)
+        logger.debug('Saved checkpoints of {} for {}.'.format(
+            project.directory, saved))
+        return saved
+
+    def restore(self, project, strategy='default', keep_hierarchy=False):
+        '''
+        Copy cached checkpoints into the runs of a project.  Runs that
+        have already finished (or been restored) are left alone.  The
+        arguments are as for `key`.
+
+        Returns the names of the stages that were restored.
+        '''
+        design_hash, part, board = self.design(project)
+        restored = []
+        for stage, run_name, patterns in self.STAGES:
+            run_directory = self.run_directory(project, run_name)
+            key = self.key(design_hash, part, board, strategy, stage,
+                           keep_hierarchy=keep_hierarchy)
+            if (self.run_finished(run_directory) or
+                    os.path.exists(os.path.join(run_directory, self.RESTORED_FN)) or
+                    not self.store.has(key)):
+                continue
+            names = self.store.get(key, run_directory)
+            checkpoints = [name for name in names if name.endswith('.dcp')]
+            if not checkpoints:
+                logger.warning('Ignoring cache entry {} with no checkpoint.'.format(key))
+                for name in names:
+                    os.remove(os.path.join(run_directory, name))
+                continue
+            with open(os.path.join(run_directory, self.RESTORED_FN), 'w') as f:
+                f.write(checkpoints[0])
+            restored.append(stage)
+        logger.debug('Restored checkpoints of {} for {}.'.format(
+            project.directory, restored))
+        return restored
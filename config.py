@@ -8,6 +8,37 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 tcldir = os.path.join(basedir, 'tcl')
 hdldir = os.path.join(basedir, 'hdl')
 testdir = os.path.join(basedir, 'test_outputs')
+# Where we keep caches that are shared between projects.
+cachedir = os.path.join(os.path.expanduser('~'), '.cache', 'pyvivado')
+# Where the generated files of IP blocks are cached so that new projects
+# don't have to generate them again (e.g. os.path.join(cachedir, 'ips')).
+# Caching synthesizes each new IP when the project is created so it is
+# off (None) by default.
+ip_cachedir = None
+
+# How many builders can generate files at once.  Builders that shell
+# out to other tools (e.g. sbt) benefit the most.  Only raise it (e.g. to
+# min(8, os.cpu_count())) if all the builders used are thread-safe.
+build_threads = 1
+
+# The default resources of a Vivado task (see resources.py): the threads
+# each Vivado process uses and how many runs launch_runs starts at once.
+vivado_threads = min(8, os.cpu_count() or 1)
+vivado_jobs = 1
+# How many cores the Vivado tasks on a host share.  Tasks wait for their
+# cores to be free before they start.  None means tasks start straight
+# away (e.g. set it to os.cpu_count()).
+core_budget = None
+# A spool directory on storage shared with other hosts.  If it is set then
+# Vivado tasks are added to the spool and run by workers started with
+# `python -m pyvivado.spool <task_spool>` rather than run here.
+task_spool = None
+
+# The sbt executable used to generate Chisel modules.  With sbt 1.4 or
+# later set sbt_client to True to keep an sbt server running between
+# builds.
+sbt = 'sbt'
+sbt_client = False
 
 default_tasks_collection = sqlite_collection.SQLLiteCollection(':memory:')
 
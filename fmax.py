@@ -0,0 +1,194 @@
+'''
+Finding the highest frequency that a design meets timing at.
+
+The design is wrapped in the JTAG-to-AXI wrapper (see `FPGAProject`) and
+the frequency that the `clk_wiz` in the wrapper generates is searched
+for.  Each round implements a few frequencies at once (in separate
+projects) and narrows the range to between the highest frequency that
+met timing and the lowest one above it that didn't.  This assumes that
+a design which meets timing at some frequency meets it at all lower ones.
+
+The timing summary of each frequency is cached in the search directory
+along with the hash of the design it was implemented from, so an
+interrupted (or extended) search doesn't implement a frequency again
+while a changed design is.
+'''
+
+import os
+import json
+import logging
+import threading
+import concurrent.futures
+
+from pyvivado import project, utils
+
+logger = logging.getLogger(__name__)
+
+
+class FmaxSearch(object):
+    '''
+    Searches for the highest frequency at which an `FPGAProject` meets
+    timing.
+    '''
+
+    CACHE_FN = 'fmax.json'
+
+    def __init__(self, directory, the_builder, parameters, part='', board='',
+                 n_parallel=3, resolution=1, profile=None):
+        '''
+        Args:
+            `directory`: Where the projects and cached results are kept.
+            `the_builder`: The builder for the top level module with an
+                AXI4Lite interface.
+            `parameters`: The top level parameters for the design (without
+                'frequency').
+            `part`: The 'part' to use when implementing.
+            `board`: The 'board' to use when implementing.
+            `n_parallel`: How many frequencies are implemented at once.
+            `resolution`: Frequencies (in MHz) are rounded to a multiple of
+                this.
+            `profile`: The `resources.ResourceProfile` of each
+                implementation's Vivado process.
+        '''
+        self.directory = directory
+        self.the_builder = the_builder
+        self.parameters = parameters
+        self.part = part
+        self.board = board
+        self.n_parallel = n_parallel
+        self.resolution = resolution
+        self.profile = profile
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.cache_fn = os.path.join(directory, self.CACHE_FN)
+        if os.path.exists(self.cache_fn):
+            with open(self.cache_fn, 'r') as f:
+                self.results = json.load(f)
+        else:
+            self.results = {}
+
+    def round(self, frequency):
+        rounded = round(frequency / self.resolution) * self.resolution
+        return float('{:.6g}'.format(rounded))
+
+    @staticmethod
+    def frequency_key(frequency):
+        return '{:g}'.format(frequency)
+
+    def project_directory(self, frequency):
+        return os.path.join(
+            self.directory, '{}MHz'.format(self.frequency_key(frequency)))
+
+    def design_hash(self, frequency):
+        '''
+        The hash (see `BuilderProject.predict_hash`) of the project that
+        would be implemented at a frequency.  Only generates the files in
+        memory.
+        '''
+        parameters = dict(self.parameters)
+        parameters['frequency'] = frequency
+        parent_params = project.FPGAProject.make_parent_params(
+            the_builder=self.the_builder,
+            parameters=parameters,
+            directory=self.project_directory(frequency),
+            part=self.part,
+            board=self.board,
+        )
+        return project.FPGAProject.predict_hash(
+            design_builders=parent_params['design_builders'],
+            simulation_builders=parent_params['simulation_builders'],
+            parameters=parent_params['parameters'],
+            directory=parent_params['directory'],
+        ).hex()
+
+    def make_project(self, frequency):
+        '''
+        Create (or update) the project for a frequency.
+        '''
+        parameters = dict(self.parameters)
+        parameters['frequency'] = frequency
+        return project.FPGAProject.create_or_update(
+            the_builder=self.the_builder,
+            parameters=parameters,
+            directory=self.project_directory(frequency),
+            part=self.part,
+            board=self.board,
+        )
+
+    def implement(self, frequency):
+        '''
+        Implement the design at a frequency and return its timing summary
+        (see `Project.get_timing`).
+        '''
+        p = self.make_project(frequency)
+        t = p.implement_and_report(bitstream=False, profile=self.profile)
+        t.wait()
+        # The timing report of an earlier implementation would otherwise
+        # be read.
+        errors = t.get_errors()
+        if errors or (t.get_current_state() != 'FINISHED_OK'):
+            raise Exception('Implementation at {} MHz finished with state {}: {}'.format(
+                frequency, t.get_current_state(), errors))
+        return p.get_timing()
+
+    def timing(self, frequency):
+        '''
+        Get the timing summary at a frequency, implementing the design if
+        it isn't cached or the design has changed since it was.
+        '''
+        key = self.frequency_key(frequency)
+        design_hash = self.design_hash(frequency)
+        with self.lock:
+            cached = self.results.get(key, None)
+        if (cached is not None) and (cached.get('design') == design_hash):
+            timing = cached['timing']
+        else:
+            logger.info('Implementing at {} MHz.'.format(key))
+            timing = self.implement(frequency)
+            with self.lock:
+                self.results[key] = {'design': design_hash, 'timing': timing}
+                utils.write_file(self.cache_fn, json.dumps(
+                    self.results, sort_keys=True, indent=2))
+        return timing
+
+    def met(self, frequencies):
+        '''
+        Check whether timing is met at each of a list of frequencies,
+        implementing up to `n_parallel` of them at once.
+        '''
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.n_parallel) as executor:
+            timings = list(executor.map(self.timing, frequencies))
+        return dict((frequency, timing['met'])
+                    for frequency, timing in zip(frequencies, timings))
+
+    def search(self, low, high):
+        '''
+        Search for the highest frequency between `low` and `high` (in MHz)
+        that meets timing.
+
+        Returns the frequency or None if timing isn't met at `low`.
+        '''
+        low = self.round(low)
+        high = self.round(high)
+        met = self.met([low, high])
+        if met[high]:
+            return high
+        if not met[low]:
+            return None
+        while True:
+            step = (high - low) / (self.n_parallel + 1)
+            frequencies = sorted(set(
+                self.round(low + step * (index + 1))
+                for index in range(self.n_parallel)) - set([low, high]))
+            if not frequencies:
+                break
+            met = self.met(frequencies)
+            for frequency in frequencies:
+                if met[frequency]:
+                    low = frequency
+                else:
+                    high = frequency
+                    break
+            logger.info('Fmax is between {} and {} MHz.'.format(low, high))
+        return low
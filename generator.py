@@ -0,0 +1,176 @@
+'''
+Builders whose files are made by external generators (e.g. Chisel
+modules generated with sbt).
+
+Running a generator is slow (sbt alone takes many seconds to start) so
+the generated files are cached in `config.cachedir`.  The cache is keyed
+by the digests of the generator sources and the fingerprint of the
+builder, so the generator only runs again if the sources or the
+parameters have changed.
+'''
+
+import os
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+
+from pyvivado import builder, config, utils
+
+logger = logging.getLogger(__name__)
+
+# Only one sbt command runs at a time.  sbt locks its project and an
+# sbt server runs one command at a time anyway.
+sbt_lock = threading.Lock()
+
+
+def run_sbt(command, cwd=None):
+    '''
+    Run an sbt command.
+
+    If `config.sbt_client` is set then the command is sent to an sbt
+    server (which is started if it isn't already running) so that the JVM
+    and sbt don't have to start up for every command.  This requires
+    sbt 1.4 or later.
+
+    Args:
+        `command`: The sbt command (e.g. 'run TestC output --dataWidth 4').
+        `cwd`: The directory containing the sbt project (defaults to
+            `config.basedir`).
+    '''
+    if cwd is None:
+        cwd = config.basedir
+    args = [config.sbt]
+    if config.sbt_client:
+        args.append('--client')
+    args.append(command)
+    logger.debug('Running sbt command: {}'.format(command))
+    with sbt_lock:
+        subprocess.check_call(args, cwd=cwd)
+
+
+def shutdown_sbt_server(cwd=None):
+    '''
+    Stop the sbt server started by `run_sbt` (if there is one).
+    '''
+    if cwd is None:
+        cwd = config.basedir
+    if config.sbt_client:
+        with sbt_lock:
+            subprocess.call([config.sbt, '--client', 'shutdown'], cwd=cwd)
+
+
+class GeneratorBuilder(builder.Builder):
+    '''
+    A builder whose files are made by running an external generator.
+
+    Subclasses override `output_names`, `source_filenames` and `generate`.
+    '''
+
+    def output_names(self):
+        '''
+        The names of the files that the generator writes (relative to the
+        directory it writes them to).
+        '''
+        raise NotImplementedError()
+
+    def source_filenames(self):
+        '''
+        The files that the generator's output depends on.  If any of these
+        change the generator is run again.
+        '''
+        return []
+
+    def generate(self, output_directory):
+        '''
+        Run the generator so that it writes its outputs to `output_directory`.
+        '''
+        raise NotImplementedError()
+
+    def required_filenames(self, directory):
+        return [os.path.join(directory, name) for name in self.output_names()]
+
+    def cache_key(self):
+        '''
+        A key that changes whenever the generator sources or the builder
+        parameters change.
+        '''
+        fns = sorted(self.source_filenames())
+        digests = utils.file_digests(fns)
+        sources = [[os.path.relpath(fn, config.basedir), digest.hex()]
+                   for fn, digest in zip(fns, digests)]
+        return utils.fingerprint((self, sources))
+
+    def cache_directory(self):
+        return os.path.join(config.cachedir, 'generated', self.cache_key())
+
+    def generate_into_cache(self, cache_directory):
+        '''
+        Run the generator and move its outputs into the cache directory.
+        Nothing is put in the cache if the generator fails.
+        '''
+        parent_directory = os.path.dirname(cache_directory)
+        os.makedirs(parent_directory, exist_ok=True)
+        output_directory = tempfile.mkdtemp(dir=parent_directory)
+        try:
+            self.generate(output_directory)
+            for name in self.output_names():
+                if not os.path.exists(os.path.join(output_directory, name)):
+                    raise Exception('{} did not generate {}.'.format(
+                        self.__class__.__name__, name))
+            try:
+                os.rename(output_directory, cache_directory)
+            except OSError:
+                # Someone else generated the same files at the same time.
+                if not os.path.exists(cache_directory):
+                    raise
+        finally:
+            if os.path.exists(output_directory):
+                shutil.rmtree(output_directory)
+
+    def build(self, directory, files=None):
+        cache_directory = self.cache_directory()
+        if os.path.exists(cache_directory):
+            logger.debug('Using cached output of {}.'.format(
+                self.__class__.__name__))
+        else:
+            self.generate_into_cache(cache_directory)
+        for name in self.output_names():
+            with open(os.path.join(cache_directory, name), 'rb') as f:
+                content = f.read()
+            fn = os.path.join(directory, name)
+            if files is None:
+                os.makedirs(os.path.dirname(fn) or '.', exist_ok=True)
+                utils.write_if_changed(fn, content)
+            else:
+                files[fn] = content
+
+
+class SbtGeneratorBuilder(GeneratorBuilder):
+    '''
+    A builder whose files are generated by an sbt command (e.g. Chisel
+    modules).  Subclasses override `output_names` and `sbt_command`.
+    '''
+
+    def sbt_command(self, output_directory):
+        '''
+        The sbt command that writes the outputs to `output_directory`.
+        '''
+        raise NotImplementedError()
+
+    def source_filenames(self):
+        '''
+        The sbt project definition and all the scala sources.
+        '''
+        fns = [os.path.join(config.basedir, fn)
+               for fn in ('build.sbt', 'main.scala')]
+        fns = [fn for fn in fns if os.path.exists(fn)]
+        for dirpath, dirnames, filenames in os.walk(config.hdldir):
+            for filename in filenames:
+                if filename.endswith('.scala'):
+                    fns.append(os.path.join(dirpath, filename))
+        return fns
+
+    def generate(self, output_directory):
+        run_sbt(self.sbt_command(output_directory))
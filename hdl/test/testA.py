@@ -18,12 +18,12 @@ class TestADefinitionsBuilder(builder.Builder):
     def get_filename(self, directory):
         return os.path.join(directory, 'testA_definitions.vhd')
 
-    def build(self, directory):
+    def build(self, directory, files=None):
         package_name = 'testA_definitions'
         data_type = get_data_type(self.data_width)
         signal.make_defs_file(
             self.get_filename(directory), package_name,
-            [data_type], [data_type])
+            [data_type], [data_type], files=files)
         
     def required_filenames(self, directory):
         return [
@@ -1,8 +1,7 @@
 import os
 import logging
-import subprocess
 
-from pyvivado import interface, signal, config, builder
+from pyvivado import interface, signal, generator
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +10,7 @@ def get_data_type(data_width):
     return signal.StdLogicVector(width=data_width, name='t_data')
 
 
-class TestCBuilder(builder.Builder):
+class TestCBuilder(generator.SbtGeneratorBuilder):
 
     def __init__(self, params):
         super().__init__(params)
@@ -21,16 +20,16 @@ class TestCBuilder(builder.Builder):
     def built_filename(self, directory):
         return os.path.join(directory, 'TestC.v')
 
-    def required_filenames(self, directory):
-        return [self.built_filename(directory)]
+    def output_names(self):
+        return ['TestC.v']
 
-    def build(self, directory):
-        cwd = os.getcwd()
-        os.chdir(config.basedir)
-        command = ['sbt', 'run TestC {} --dataWidth {}'.format(
-            directory, self.width)]
-        subprocess.call(command)
-        os.chdir(cwd)
+    def ooc_module(self):
+        # The width is fixed when the Verilog is generated.
+        return (self.module_name, {})
+
+    def sbt_command(self, output_directory):
+        return 'run TestC {} --dataWidth {}'.format(
+            os.path.abspath(output_directory), self.width)
 
 
 def get_testC_interface(params):
@@ -26,13 +26,14 @@ class TreeBuilder(builder.Builder):
             'tree_notpoweroftwo',
         )
             
-    def build(self, directory):
+    def build(self, directory, files=None):
         for base_name in self.parts:
             template_fn = os.path.join(
                 config.hdldir, 'tree', '{}.vhd.t'.format(base_name))
             output_fn = os.path.join(
                 directory, '{}_{}.vhd'.format(base_name, self.tree_name))
-            utils.format_file(template_fn, output_fn, {'tree_name': self.tree_name})
+            utils.format_file(template_fn, output_fn, {'tree_name': self.tree_name},
+                              files=files)
             
     def required_filenames(self, directory):
         fns = [os.path.join(
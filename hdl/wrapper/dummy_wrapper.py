@@ -14,10 +14,10 @@ class DummyWrapperBuilder(builder.Builder):
     def get_filename(self, directory):
         return os.path.join(directory, 'dummy_wrapper.vhd')
 
-    def build(self, directory):
+    def build(self, directory, files=None):
         template_fn = os.path.join(config.hdldir, 'wrapper', 'dummy_wrapper.vhd.t')
         output_fn = self.get_filename(directory)
-        utils.format_file(template_fn, output_fn, self.params)
+        utils.format_file(template_fn, output_fn, self.params, files=files)
         
     def required_filenames(self, directory):
         return [
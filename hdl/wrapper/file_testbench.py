@@ -25,13 +25,14 @@ class FileTestbenchBuilder(builder.Builder):
     def get_filename(self, directory):
         return os.path.join(directory, 'file_testbench.vhd')
 
-    def build(self, directory, false_directory=None):
+    def build(self, directory, false_directory=None, files=None):
         '''
         Produce the necessary files.
         `directory` is where the files will be placed.
         `false_directory` is where the files should think they are being placed.
         `false_directory` is necessary so we can compare the contents of files
         that have been placed in different directories when getting hashs.
+        `files` is where the files are put if they are generated in memory.
         '''
         if false_directory is None:
             false_directory = directory
@@ -48,7 +49,7 @@ class FileTestbenchBuilder(builder.Builder):
             'max_cycles': time_limit,
             'dut_parameters': self.interface.module_parameters,
         }
-        utils.format_file(template_fn, output_fn, template_params)
+        utils.format_file(template_fn, output_fn, template_params, files=files)
         
     def required_filenames(self, directory):
         return self.simple_filenames + [
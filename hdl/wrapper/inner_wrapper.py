@@ -69,7 +69,7 @@ class InnerWrapperBuilder(builder.Builder):
             raise ValueError('Unknown language: {}'.format(self.language))
         return fn
 
-    def build(self, directory):
+    def build(self, directory, files=None):
         if self.language == 'vhdl':
             template_fn = os.path.join(config.hdldir, 'wrapper', 'inner_wrapper.vhd.t')
         elif self.language in ('systemverilog', 'verilog'):
@@ -77,7 +77,8 @@ class InnerWrapperBuilder(builder.Builder):
         else:
             raise ValueError('Unknown language: {}'.format(self.language))            
         output_fn = self.get_filename(directory)
-        utils.format_file(template_fn, output_fn, self.template_params)
+        utils.format_file(template_fn, output_fn, self.template_params,
+                          files=files)
         
     def required_filenames(self, directory):
         return [
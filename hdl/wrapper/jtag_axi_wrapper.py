@@ -26,14 +26,14 @@ class JtagAxiWrapperBuilder(builder.Builder):
     def get_filename(self, directory):
         return os.path.join(directory, 'jtag_axi_wrapper.vhd')
 
-    def build(self, directory):
+    def build(self, directory, files=None):
         template_filename = os.path.join(config.hdldir, 'wrapper', 'jtag_axi_wrapper.vhd.t')
         filename = self.get_filename(directory)
         params = {
             'dut_name': self.top_name,
             'dut_parameters': self.top_parameters,
         }
-        utils.format_file(template_filename, filename, params)
+        utils.format_file(template_filename, filename, params, files=files)
         
     def required_filenames(self, directory):
         return [
@@ -41,10 +41,11 @@ class OuterWrapperBuilder(builder.Builder):
     def get_filename(self, directory):
         return os.path.join(directory, 'outer_wrapper.vhd')
 
-    def build(self, directory):
+    def build(self, directory, files=None):
         template_fn = os.path.join(config.hdldir, 'wrapper', 'outer_wrapper.vhd.t')
         output_fn = self.get_filename(directory)
-        utils.format_file(template_fn, output_fn, self.template_params)
+        utils.format_file(template_fn, output_fn, self.template_params,
+                          files=files)
         
     def required_filenames(self, directory):
         return [
@@ -72,6 +72,19 @@ class Interface(object):
         if needs_dummy:
             self.module_name = 'DummyDutWrapper'
 
+    def canonical_form(self):
+        '''
+        Interfaces are identified by all their attributes, including the
+        fingerprint of their builder (see `utils.canonical`).
+        '''
+        return (self.__class__, vars(self))
+
+    def fingerprint(self):
+        '''
+        A stable fingerprint of the interface.
+        '''
+        return utils.fingerprint(self)
+
     def total_width_in(self):
         '''
         Get the total width of all the input wires.
@@ -0,0 +1,76 @@
+'''
+Sharing generated IP blocks between projects.
+
+Creating an IP block and generating its output products takes a long
+time and gives the same result in every project that uses the same IP
+with the same settings.  When a project is created with an `IPCache` the
+directory of each newly generated IP block (its XCI file and output
+products) is copied into the cache and later projects copy it from there
+rather than generating it again (see ::pyvivado::create_ips).
+
+Caching is off unless `config.ip_cachedir` is set since generating an IP
+for the cache also synthesizes it, which projects that only simulate
+would otherwise never do.
+'''
+
+import os
+import logging
+
+from pyvivado import config, utils
+
+logger = logging.getLogger(__name__)
+
+
+class IPCache(object):
+    '''
+    A directory holding generated IP blocks, one subdirectory per block.
+    Each block is kept in a subdirectory per version of Vivado (as given
+    by `version -short`) since generated IP only works with the version
+    that generated it.
+    '''
+
+    def __init__(self, directory=None):
+        '''
+        Args:
+            `directory`: Where the IP blocks are kept.  Defaults to
+                `config.ip_cachedir`.
+        '''
+        if directory is None:
+            directory = config.ip_cachedir
+        self.directory = directory
+
+    @staticmethod
+    def key(ip, ip_version, part):
+        '''
+        The key of an IP block.  It depends on everything that changes the
+        generated files apart from the version of Vivado: the IP and its
+        version, its properties, the module name (which appears in the
+        generated HDL) and the part.
+
+        Args:
+            `ip`: An (ip name, ip properties, module name) tuple.
+            `ip_version`: The version of the IP ('' for the latest).
+            `part`: The part of the project.
+        '''
+        ip_name, ip_properties, module_name = ip
+        properties = sorted([str(k), str(v)] for k, v in ip_properties)
+        return utils.fingerprint(
+            [ip_name, ip_version, properties, module_name, part])
+
+    def ip_directory(self, ip, ip_version, part):
+        '''
+        The directory where an IP block is (or will be) cached.  Vivado
+        keeps the block in a subdirectory named after its version (see
+        ::pyvivado::ip_cache_dir).
+        '''
+        return os.path.join(self.directory, self.key(ip, ip_version, part))
+
+    def has(self, ip, ip_version, part, vivado_version):
+        '''
+        Whether an IP block generated by a version of Vivado (e.g.
+        '2015.1') is cached.
+        '''
+        ip_name, ip_properties, module_name = ip
+        return os.path.exists(os.path.join(
+            self.ip_directory(ip, ip_version, part), vivado_version,
+            module_name + '.xci'))
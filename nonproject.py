@@ -0,0 +1,202 @@
+'''
+Building designs with Vivado's non-project flow.
+
+A `NonProject` doesn't create a Vivado project.  The sources are read
+into memory and synthesized, placed and routed in a single Vivado
+process with no project files or separate run processes.  The
+checkpoints, bitstream and reports are written to the same places as
+they are for a `Project` so the methods for reading reports, caching
+checkpoints and deploying to the FPGA work the same way.
+'''
+
+import os
+import shutil
+import logging
+
+from pyvivado import project, checkpoint_cache, ooc
+
+logger = logging.getLogger(__name__)
+
+
+class NonProject(project.BuilderProject):
+    '''
+    A design generated from `Builder`s and built with the non-project flow.
+    '''
+
+    @classmethod
+    def create_or_update(cls, design_builders, parameters, directory,
+                         tasks_collection=None, part=None, board='',
+                         top_module=''):
+        '''
+        Generate the files of a design.  No Vivado process is spawned.  If
+        the design has changed since it was last built then the old
+        checkpoints and reports are deleted.
+
+        Args:
+            `design_builders`: The builders responsible for the synthesizable code.
+            `parameters`: Top level parameters used to generated the design.  Must include
+                'factory_name'.
+            `directory`: Where the design is generated and built.
+            `tasks_collection`: How we keep track of Vivado processes.
+            `part`: The 'part' to build for.
+            `board`: The 'board' to build for.
+            `top_module`: The top level module in the design (found by
+                Vivado if it is '').
+        '''
+        part_name, board_name = cls.part_and_board(part, board)
+        if not part_name:
+            raise ValueError('The non-project flow requires a part.')
+        os.makedirs(directory, exist_ok=True)
+        params_fn = os.path.join(directory, 'params.txt')
+        if os.path.exists(params_fn):
+            os.remove(params_fn)
+        cls.write_params(params=parameters, directory=directory)
+        generated = cls.generate_files(
+            design_builders=design_builders,
+            simulation_builders=[],
+            parameters=parameters,
+            directory=directory,
+        )
+        generated['files'].write_all()
+        new_hash = cls.hash(
+            design_files=generated['design_files'],
+            simulation_files=[],
+            ips=generated['ips'],
+            files=generated['files'],
+        )
+        old_record = cls.read_files_record(directory)
+        if (cls.read_hash(directory) != new_hash) or (old_record is None) or (
+                (old_record['part'], old_record['board'], old_record['top_module']) !=
+                (part_name, board_name, top_module)):
+            logger.debug('Design in {} has changed.'.format(directory))
+            cls.delete_outputs(directory)
+            cls.write_hash(directory, new_hash)
+            cls.write_files_record(
+                directory, design_files=generated['design_files'],
+                simulation_files=[], ips=generated['ips'], part=part_name,
+                board=board_name, top_module=top_module,
+                files=generated['files'])
+        return cls(directory=directory, tasks_collection=tasks_collection)
+
+    @staticmethod
+    def delete_outputs(directory):
+        '''
+        Delete the checkpoints and reports of a previous build.
+        '''
+        runs_directory = os.path.join(directory, 'TheProject.runs')
+        if os.path.exists(runs_directory):
+            shutil.rmtree(runs_directory)
+        for fn in os.listdir(directory):
+            if fn.startswith(('synth_', 'impl_')) and fn.endswith(('.txt', '.txt.json')):
+                os.remove(os.path.join(directory, fn))
+
+    def built_stages(self):
+        '''
+        The stages (see `checkpoint_cache.CheckpointCache.STAGES`) that
+        have already been built for the current design or whose
+        checkpoints were restored from a cache.
+        '''
+        cache = checkpoint_cache.CheckpointCache
+        stages = []
+        for stage, run_name, patterns in cache.STAGES:
+            run_directory = cache.run_directory(self, run_name)
+            if cache.run_finished(run_directory) or os.path.exists(
+                    os.path.join(run_directory, cache.RESTORED_FN)):
+                stages.append(stage)
+        return stages
+
+    def build_steps(self, implement=True, bitstream=False, reports=True,
+                    keep_hierarchy=False):
+        '''
+        The (step name, TCL command) tuples to build the design.  Stages
+        that have already been built are skipped.
+
+        Args:
+            `implement`: Whether to place and route the design or just
+                synthesize it.
+            `bitstream`: Whether to generate the bitstream.
+            `reports`: Whether to generate the reports of the last stage.
+            `keep_hierarchy`: Whether to keep the hierarchy of the design
+                when synthesizing.
+        '''
+        record = self.read_files_record(self.directory)
+        if record is None:
+            raise ValueError('No design in {}.'.format(self.directory))
+        built = self.built_stages()
+        steps = []
+        if ('synth' not in built) and not (implement and 'impl' in built):
+            steps.append(('nonproject_read', '::pyvivado::nonproject_read {{{}}} {{{}}} {{{}}} {{{}}}'.format(
+                self.directory, record['part'], ooc.tcl_list(record['design_files']),
+                self.tcl_ips(record['ips'], part=record['part']))))
+            steps.append(('synthesize', '::pyvivado::nonproject_synthesize {{{}}} {{{}}} {{{}}}'.format(
+                self.directory, record['top_module'],
+                'keep_hierarchy' if keep_hierarchy else '')))
+        if implement and ('impl' not in built):
+            steps.append(('implement', '::pyvivado::nonproject_implement {{{}}}'.format(
+                self.directory)))
+        if reports:
+            prefix = 'impl' if implement else 'synth'
+            steps.append(('{}_reports'.format(prefix), '::pyvivado::nonproject_reports {{{}}} {}'.format(
+                self.directory, prefix)))
+        if implement and bitstream:
+            steps.append(('bitstream', '::pyvivado::nonproject_write_bitstream {{{}}}'.format(
+                self.directory)))
+        return steps
+
+    def build(self, implement=True, bitstream=False, reports=True,
+              keep_hierarchy=False, cache=None, profile=None,
+              strategy='default'):
+        '''
+        Spawn a single Vivado process to build the design (see
+        `build_steps`).
+
+        If a `checkpoint_cache.CheckpointCache` is given then any cached
+        checkpoints (for this `strategy` and `keep_hierarchy`) are
+        restored first.  `profile` is the `resources.ResourceProfile` of
+        the Vivado process.
+
+        Returns the task.
+        '''
+        if cache is not None:
+            self.restore_checkpoints(cache, strategy=strategy,
+                                     keep_hierarchy=keep_hierarchy)
+        steps = self.build_steps(
+            implement=implement, bitstream=bitstream, reports=reports,
+            keep_hierarchy=keep_hierarchy)
+        return self.run_pipeline(
+            steps=steps,
+            description='Build design with the non-project flow.',
+            profile=profile,
+        )
+
+    def synthesize(self, keep_hierarchy=False, cache=None, profile=None,
+                   strategy='default'):
+        return self.build(implement=False, reports=False,
+                          keep_hierarchy=keep_hierarchy, cache=cache,
+                          profile=profile, strategy=strategy)
+
+    def implement(self, cache=None, profile=None, strategy='default',
+                  keep_hierarchy=False):
+        return self.build(implement=True, bitstream=True, reports=False,
+                          keep_hierarchy=keep_hierarchy, cache=cache,
+                          profile=profile, strategy=strategy)
+
+    def synthesize_and_report(self, keep_hierarchy=False, cache=None,
+                              profile=None, strategy='default'):
+        return self.build(implement=False, keep_hierarchy=keep_hierarchy,
+                          cache=cache, profile=profile, strategy=strategy)
+
+    def implement_and_report(self, bitstream=True, cache=None, profile=None,
+                             strategy='default', keep_hierarchy=False):
+        return self.build(implement=True, bitstream=bitstream,
+                          keep_hierarchy=keep_hierarchy, cache=cache,
+                          profile=profile, strategy=strategy)
+
+    def generate_reports(self, from_synthesis=False, profile=None):
+        prefix = 'synth' if from_synthesis else 'impl'
+        return self.run_pipeline(
+            steps=[('{}_reports'.format(prefix), '::pyvivado::nonproject_reports {{{}}} {}'.format(
+                self.directory, prefix))],
+            description='Generate reports.',
+            profile=profile,
+        )
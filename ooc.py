@@ -0,0 +1,173 @@
+'''
+Out of context synthesis of the modules in a design.
+
+Builders of modules that are worth synthesizing separately say so with
+`Builder.ooc_module`.  Each of those modules is synthesized out of
+context once and its checkpoint is cached in `config.cachedir`, keyed by
+the builder fingerprint, the contents of its files, the generics and the
+part.  Synthesis of the whole design then links the cached checkpoints
+so only modules whose inputs have changed are synthesized again.
+
+Only leaf modules (whose builders don't require other builders apart
+from packages) are synthesized out of context.  A module is replaced by
+a stub without generics (written by `write_vhdl -mode synth_stub`) so
+modules with generics can't be synthesized out of context.  Give them
+a wrapper that fixes the generics instead.
+
+The project keeps the checkpoints until it is synthesized in the usual
+way (e.g. `Project.synthesize`), which puts the module sources back.
+'''
+
+import os
+import logging
+
+from pyvivado import builder, config, utils
+
+logger = logging.getLogger(__name__)
+
+
+class OOCModule(object):
+    '''
+    A module that can be synthesized out of context.
+    '''
+
+    def __init__(self, builder, module_name, generics, filenames,
+                 package_filenames):
+        '''
+        Args:
+            `builder`: The builder of the module.
+            `module_name`: The name of the module.
+            `generics`: A dictionary of the generics to synthesize with.
+            `filenames`: The files of the module.
+            `package_filenames`: The files of the packages it uses.
+        '''
+        self.builder = builder
+        self.module_name = module_name
+        self.generics = generics
+        self.filenames = filenames
+        self.package_filenames = package_filenames
+
+    def key(self, part):
+        '''
+        A key that changes whenever the synthesized module could change.
+        '''
+        fns = self.package_filenames + self.filenames
+        digests = [[os.path.basename(fn), digest.hex()]
+                   for fn, digest in zip(fns, utils.file_digests(fns))]
+        return utils.fingerprint([
+            self.builder.fingerprint(), self.module_name,
+            sorted([str(k), str(v)] for k, v in self.generics.items()),
+            digests, part, config.vivado])
+
+
+def find_modules(graph, directory):
+    '''
+    Find the modules in a `builder.BuilderGraph` that can be synthesized
+    out of context.
+
+    Args:
+        `graph`: The `builder.BuilderGraph` of the design.
+        `directory`: The directory the files were generated in.
+    '''
+    modules = []
+    module_names = set()
+    for _id in graph.order:
+        b = graph.builders[_id]
+        ooc_module = b.ooc_module()
+        if (ooc_module is None) or b.required_builders():
+            continue
+        module_name, generics = ooc_module
+        if generics:
+            raise ValueError(
+                'Cannot synthesize {} out of context with the generics {} since its stub '
+                'has no generics.  Use a wrapper without generics instead.'.format(
+                    module_name, generics))
+        if module_name in module_names:
+            # The stub can only declare one version of a module.
+            logger.warning('Not synthesizing {} out of context since it has several versions.'.format(
+                module_name))
+            modules = [m for m in modules if m.module_name != module_name]
+            continue
+        module_names.add(module_name)
+        package_filenames = []
+        for package_id in graph.dependencies[_id]:
+            package_filenames += graph.builders[package_id].required_filenames(
+                directory)
+        modules.append(OOCModule(
+            builder=b, module_name=module_name, generics=generics,
+            filenames=list(b.required_filenames(directory)),
+            package_filenames=package_filenames))
+    return modules
+
+
+class OOCCache(object):
+    '''
+    A directory holding the checkpoints and stubs of modules synthesized
+    out of context, one subdirectory per module.
+    '''
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.path.join(config.cachedir, 'ooc')
+        self.directory = directory
+
+    def module_directory(self, module, part):
+        return os.path.join(self.directory, module.key(part))
+
+    def has(self, module, part):
+        return os.path.exists(os.path.join(
+            self.module_directory(module, part), module.module_name + '.dcp'))
+
+
+def tcl_list(items):
+    return ' '.join(['{' + str(item) + '}' for item in items])
+
+
+def synthesize(project, design_builders, top_params={}, cache=None,
+               keep_hierarchy=False, profile=None):
+    '''
+    Spawn a single Vivado process that synthesizes the modules of a design
+    that aren't already cached out of context, swaps their checkpoints in
+    for their sources and then synthesizes the project.
+
+    Args:
+        `project`: The `Project` (its files must already be generated).
+        `design_builders`: The builders of the design.
+        `top_params`: The parameters used to create package builders.
+        `cache`: An `OOCCache` (defaults to one in `config.cachedir`).
+        `keep_hierarchy`: Passed on to `Project.synthesize_step`.
+        `profile`: The `resources.ResourceProfile` of the Vivado process.
+
+    Returns the task.
+    '''
+    if cache is None:
+        cache = OOCCache()
+    record = project.read_files_record(project.directory)
+    if (record is None) or not record['part']:
+        raise ValueError('Out of context synthesis requires a project with a part.')
+    part = record['part']
+    graph = builder.BuilderGraph(top_builders=design_builders,
+                                 top_params=top_params)
+    modules = find_modules(graph, project.directory)
+    steps = []
+    tcl_modules = []
+    for module in modules:
+        module_directory = cache.module_directory(module, part)
+        if not cache.has(module, part):
+            generics = [(k, v) for k, v in sorted(module.generics.items())]
+            command = '::pyvivado::synthesize_ooc {{{}}} {{{}}} {{{}}} {{{}}} {{{}}}'.format(
+                part, module.module_name,
+                ' '.join(['{{{} {}}}'.format(k, v) for k, v in generics]),
+                tcl_list(module.package_filenames + module.filenames),
+                module_directory)
+            steps.append(('ooc_{}'.format(module.module_name), command))
+        tcl_modules.append('{{{}}} {{{}}} {{{}}}'.format(
+            module.module_name, tcl_list(module.filenames), module_directory))
+    logger.debug('Synthesizing {} of {} modules out of context.'.format(
+        len(steps), len(modules)))
+    steps.append(('ooc_link', '::pyvivado::use_ooc_checkpoints {{{}}} {{{}}}'.format(
+        project.directory, tcl_list(tcl_modules))))
+    steps.append(project.synthesize_step(keep_hierarchy=keep_hierarchy, ooc=True))
+    return project.run_pipeline(
+        steps, description='Synthesize project with out of context modules.',
+        profile=profile)
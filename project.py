@@ -1,5 +1,4 @@
 import os
-import fnmatch
 import logging
 import time
 import json
@@ -7,7 +6,8 @@ import hashlib
 import shutil
 
 from pyvivado import config, task, utils, interface, builder, redis_utils
-from pyvivado import connection, sqlite_collection, boards
+from pyvivado import connection, sqlite_collection, boards, retention
+from pyvivado import checkpoint_cache, ip_cache, reports
 from pyvivado.hdl.wrapper import inner_wrapper, file_testbench, jtag_axi_wrapper, jtag_axi_wrapper_no_reset
 
 logger = logging.getLogger(__name__)
@@ -30,10 +30,13 @@ class Project(object):
         return tasks_collection
 
     @staticmethod
-    def hash(design_files, simulation_files, ips):
+    def hash(design_files, simulation_files, ips, files=None):
         '''
         Generate a hash that based on the files and IP in the project.
         This is used to tell when the files in the project have been changed.
+
+        `files` is a `utils.VirtualFiles` with the contents of any files
+        that are generated but haven't been written to disk.
         '''
         h = hashlib.sha1()
         design_files = sorted(list(design_files))
@@ -45,13 +48,13 @@ class Project(object):
         # Check that names are unique
         names = [a[2] for a in ips]
         assert(len(names) == len(set(names)))
-        design_files_hash = utils.files_hash(design_files)
-        simulation_files_hash = utils.files_hash(simulation_files)
+        design_files_hash = utils.files_hash(design_files, files=files)
+        simulation_files_hash = utils.files_hash(simulation_files, files=files)
         # FIXME: Not sure whether this will work properly for
         # the ips
         ips_hash = str(tuple(ips)).encode('ascii')
-        h.update(utils.files_hash(design_files))
-        h.update(utils.files_hash(simulation_files))
+        h.update(design_files_hash)
+        h.update(simulation_files_hash)
         h.update(ips_hash)
         logger.debug('design {} simulation {} ips {}'.format(
             design_files_hash, simulation_files_hash, ips_hash))
@@ -74,19 +77,133 @@ class Project(object):
         return h
 
     @staticmethod
-    def write_hash(directory, h):
+    def write_hash(directory, h, pending=False):
         '''
         Write a record of the project's hash.
+
+        If `pending` is True the record only replaces the current one
+        once `commit_update` is called.
         '''
         hash_fn = os.path.join(directory, 'hash.txt')
+        if pending:
+            hash_fn += '.pending'
         with open(hash_fn, 'wb') as f:
             f.write(h)
 
+    @staticmethod
+    def files_record_fn(directory):
+        return os.path.join(directory, 'files.json')
+
+    @classmethod
+    def commit_update(cls, directory):
+        '''
+        Replace the hash and the record of the files with those written
+        by `update` once the task updating the project has succeeded.
+        '''
+        for fn in (os.path.join(directory, 'hash.txt'),
+                   cls.files_record_fn(directory)):
+            if os.path.exists(fn + '.pending'):
+                os.replace(fn + '.pending', fn)
+
+    @classmethod
+    def read_files_record(cls, directory):
+        '''
+        Read the record of the files, IP and settings that the project
+        was created (or last updated) with.  Returns None if there is no
+        record.
+        '''
+        fn = cls.files_record_fn(directory)
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                record = json.load(f)
+        else:
+            record = None
+        return record
+
+    @classmethod
+    def write_files_record(cls, directory, design_files, simulation_files,
+                           ips, part, board, top_module, files=None,
+                           pending=False):
+        '''
+        Record the files (and their digests), IP and settings of the
+        project so that it can be updated incrementally later.
+
+        If `pending` is True the record only replaces the current one
+        once `commit_update` is called.
+        '''
+        design_files = sorted(design_files)
+        simulation_files = sorted(simulation_files)
+        all_files = design_files + simulation_files
+        digests = utils.file_digests(all_files, files=files)
+        record = {
+            'design_files': design_files,
+            'simulation_files': simulation_files,
+            'ips': json.loads(json.dumps(list(ips))),
+            'part': part,
+            'board': board,
+            'top_module': top_module,
+            'digests': dict(
+                (fn, digest.hex()) for fn, digest in zip(all_files, digests)),
+        }
+        fn = cls.files_record_fn(directory)
+        if pending:
+            fn += '.pending'
+        with open(fn, 'w') as f:
+            json.dump(record, f, indent=2)
+
+    @staticmethod
+    def tcl_ips(ips, part=''):
+        '''
+        Format the IP information into a TCL-friendly format.
+
+        If `config.ip_cachedir` is set then each IP also gets the directory
+        where its generated files are cached (see `ip_cache.IPCache`).
+        The cache depends on the `part`.
+        '''
+        if config.ip_cachedir is not None:
+            cache = ip_cache.IPCache(config.ip_cachedir)
+        else:
+            cache = None
+        tcl_ips = []
+        for ip_name, ip_properties, module_name in ips:
+            ip_version = ''
+            tcl_start = '{ip_name} {{{ip_version}}} {module_name}'.format(
+                ip_name=ip_name, ip_version=ip_version, module_name=module_name)
+            tcl_properties = ' '.join(
+                ['{{ {} {} }}'.format(k, v) for k,v in ip_properties])
+            tcl_ip = '{} {{ {} }}'.format(tcl_start, tcl_properties)
+            if cache is not None:
+                tcl_ip += ' {{{}}}'.format(cache.ip_directory(
+                    (ip_name, ip_properties, module_name), ip_version, part))
+            tcl_ips.append(tcl_ip)
+        tcl_ips = ' '.join(['{{ {} }}'.format(ip) for ip in tcl_ips])
+        return tcl_ips
+
+    @staticmethod
+    def part_and_board(part, board):
+        '''
+        Work out the Vivado part and board names from the `part` and
+        `board` passed to `create`.
+        '''
+        if board in boards.params:
+            board_params = boards.params[board]
+            board_name = board_params['xilinx_name']
+            part_name = board_params['part']
+            assert(part is None)
+        else:
+            board_name = board
+            part_name = part
+        if board_name is None:
+            board_name = ''
+        if part_name is None:
+            part_name = ''
+        return part_name, board_name
+
     @classmethod
     def create(cls, directory, design_files, simulation_files,
                tasks_collection=None,
                part=None, board='', ips=[],
-               top_module=''):
+               top_module='', steps=(), files=None):
         '''
         Create a new Vivado project.
 
@@ -100,6 +217,13 @@ class Project(object):
             `ips`: A list of (ip name, ip parameters, module name) tuples that are
                    used to specify the required IP blocks.
             `top_module`: The name of the top level module.
+            `steps`: A list of (step name, TCL command) tuples that are run
+                in the same Vivado process once the project is created
+                (e.g. a simulation).  The project creation is the 'create'
+                step.
+            `files`: A `utils.VirtualFiles` with the contents of the
+                generated files (which must already be written) so that
+                they don't need to be read again to work out the hash.
 
         Returns:
             A python `Project` object that wraps a Vivado project.  The Vivado project
@@ -108,17 +232,8 @@ class Project(object):
         '''
         if tasks_collection is None:
             tasks_collection = cls.default_tasks_collection(directory)
-        # Format the IP infomation into a TCL-friendly format.
-        tcl_ips = []
-        for ip_name, ip_properties, module_name in ips:
-            ip_version = ''
-            tcl_start = '{ip_name} {{{ip_version}}} {module_name}'.format(
-                ip_name=ip_name, ip_version=ip_version, module_name=module_name)
-            tcl_properties = ' '.join(
-                ['{{ {} {} }}'.format(k, v) for k,v in ip_properties])
-            tcl_ip = '{} {{ {} }}'.format(tcl_start, tcl_properties)
-            tcl_ips.append(tcl_ip)
-        tcl_ips = ' '.join(['{{ {} }}'.format(ip) for ip in tcl_ips])
+        part_name, board_name = cls.part_and_board(part, board)
+        tcl_ips = cls.tcl_ips(ips, part=part_name)
         # Fail if a project already exists in this directory.
         if os.path.exists(os.path.join(directory, 'TheProject.xpr')):
             raise Exception('Project already exists.')
@@ -129,19 +244,12 @@ class Project(object):
             design_files=design_files,
             simulation_files=simulation_files,
             ips=ips,
+            files=files,
         ))
-        if board in boards.params:
-            board_params = boards.params[board]
-            board_name = board_params['xilinx_name']
-            part_name = board_params['part']
-            assert(part is None)
-        else:
-            board_name = board
-            part_name = part
-        if board_name is None:
-            board_name = ''
-        if part_name is None:
-            part_name = ''
+        cls.write_files_record(
+            directory, design_files=design_files,
+            simulation_files=simulation_files, ips=ips, part=part_name,
+            board=board_name, top_module=top_module, files=files)
         # Generate a TCL command to create the project.
         command_template = '''::pyvivado::create_vivado_project {{{directory}}} {{ {design_files} }} {{ {simulation_files} }} {{{part}}} {{{board}}} {{{ips}}} {{{top_module}}}'''
         command = command_template.format(
@@ -158,12 +266,22 @@ class Project(object):
         logger.debug('Command is {}'.format(command))
         logger.debug('Directory of new project is {}.'.format(directory))
         # Create a task to create the project.
-        t = task.VivadoTask.create(
-            parent_directory=directory,
-            description='Creating a new Vivado project.',
-            command_text=command,
-            tasks_collection=tasks_collection
-        )
+        if steps:
+            t = task.VivadoTask.create_pipeline(
+                parent_directory=directory,
+                description='Creating a new Vivado project.',
+                steps=[('create', command)] + list(steps),
+                tasks_collection=tasks_collection,
+                kind='create',
+            )
+        else:
+            t = task.VivadoTask.create(
+                parent_directory=directory,
+                description='Creating a new Vivado project.',
+                command_text=command,
+                tasks_collection=tasks_collection,
+                kind='create',
+            )
         t.run()
         # Finally create the python project wrapper and return it.
         # Note that the Vivado process is still running and the Vivado
@@ -171,6 +289,135 @@ class Project(object):
         p = cls(directory, tasks_collection)
         return p
     
+    @staticmethod
+    def delete(directory, tasks_collection=None):
+        '''
+        Delete a project directory along with the records of its tasks.
+        '''
+        shutil.rmtree(directory)
+        if tasks_collection is not None:
+            tasks_collection.delete_by_parent_directory(
+                os.path.abspath(directory))
+
+    @classmethod
+    def update(cls, directory, design_files, simulation_files,
+               tasks_collection=None, part=None, board='', ips=[],
+               top_module='', files=None):
+        '''
+        Bring an existing project up to date with new files and IP rather
+        than deleting it and creating it again.  Only the files and IP
+        that have changed are added, removed or regenerated, and the runs
+        are only reset if the design has changed, so that Vivado can reuse
+        as much of its previous work as possible.
+
+        The arguments are the same as for `create`.  Generated files in
+        `files` are written if their contents have changed.
+
+        Returns the task updating the project (None if nothing had
+        changed).  Pass it to `BuilderProject.check_update` (or call
+        `commit_update` once it has succeeded).  Raises a `ValueError` if the project can't be updated
+        (e.g. because the part has changed) and must be recreated.
+        '''
+        record = cls.read_files_record(directory)
+        if record is None:
+            raise ValueError('No record of the files in project {}.'.format(
+                directory))
+        part_name, board_name = cls.part_and_board(part, board)
+        if (record['part'], record['board'], record['top_module']) != (
+                part_name, board_name, top_module):
+            raise ValueError('Project {} has a different part, board or top module.'.format(
+                directory))
+        if files is None:
+            files = {}
+        # Only write files that have changed so that Vivado doesn't
+        # think that the others need recompiling.
+        changed_files = set()
+        for fn in sorted(set(design_files) | set(simulation_files)):
+            if fn in files:
+                digest = files.digest(fn).hex()
+                if digest != record['digests'].get(fn, None):
+                    utils.write_if_changed(fn, files[fn])
+                    changed_files.add(fn)
+            else:
+                digest = utils.file_digests([fn])[0].hex()
+                if digest != record['digests'].get(fn, None):
+                    changed_files.add(fn)
+        old_design_files = set(record['design_files'])
+        old_simulation_files = set(record['simulation_files'])
+        add_design_files = sorted(set(design_files) - old_design_files)
+        remove_design_files = sorted(old_design_files - set(design_files))
+        add_simulation_files = sorted(set(simulation_files) - old_simulation_files)
+        remove_simulation_files = sorted(old_simulation_files - set(simulation_files))
+        # IPs are identified by all their settings so a changed IP is
+        # removed and created again.
+        def ip_key(ip):
+            return json.dumps(ip, sort_keys=True)
+        old_ips = dict((ip_key(ip), ip) for ip in record['ips'])
+        new_ips = dict((ip_key(ip), ip) for ip in json.loads(json.dumps(list(ips))))
+        add_ips = [new_ips[key] for key in new_ips if key not in old_ips]
+        remove_ips = [old_ips[key] for key in old_ips if key not in new_ips]
+        design_changed = bool(
+            add_design_files or remove_design_files or add_ips or remove_ips or
+            (changed_files & set(design_files)))
+        simulation_changed = bool(
+            add_simulation_files or remove_simulation_files or
+            (changed_files & set(simulation_files)))
+        # If the Vivado project needs updating the new records are only
+        # used once the update has succeeded (see `commit_update`).
+        # Otherwise a failed update would leave a broken project that
+        # looked up to date.
+        pending = design_changed or simulation_changed
+        cls.write_files_record(
+            directory, design_files=design_files,
+            simulation_files=simulation_files, ips=ips, part=part_name,
+            board=board_name, top_module=top_module, files=files,
+            pending=pending)
+        cls.write_hash(directory, cls.hash(
+            design_files=design_files,
+            simulation_files=simulation_files,
+            ips=ips,
+            files=files,
+        ), pending=pending)
+        if not pending:
+            return None
+        logger.debug('Updating project {}: {} design files added, {} removed; '
+                     '{} simulation files added, {} removed; {} IPs added, {} removed; '
+                     '{} files changed.'.format(
+                         directory, len(add_design_files), len(remove_design_files),
+                         len(add_simulation_files), len(remove_simulation_files),
+                         len(add_ips), len(remove_ips), len(changed_files)))
+        # Generated files that are no longer used are deleted.
+        for fn in remove_design_files + remove_simulation_files:
+            in_project = os.path.abspath(fn).startswith(
+                os.path.abspath(directory) + os.sep)
+            if in_project and os.path.exists(fn):
+                os.remove(fn)
+        def tcl_list(items):
+            return ' '.join(['{' + item + '}' for item in items])
+        command_template = '''::pyvivado::update_vivado_project {{{directory}}} {{{add_design_files}}} {{{remove_design_files}}} {{{add_simulation_files}}} {{{remove_simulation_files}}} {{{remove_ips}}} {{{add_ips}}} {reset_runs}'''
+        command = command_template.format(
+            directory=directory,
+            add_design_files=tcl_list(add_design_files),
+            remove_design_files=tcl_list(remove_design_files),
+            add_simulation_files=tcl_list(add_simulation_files),
+            remove_simulation_files=tcl_list(remove_simulation_files),
+            remove_ips=tcl_list([module_name for ip_name, ip_properties, module_name
+                                 in remove_ips]),
+            add_ips=cls.tcl_ips(add_ips, part=part_name),
+            reset_runs=int(design_changed),
+        )
+        if tasks_collection is None:
+            tasks_collection = cls.default_tasks_collection(directory)
+        t = task.VivadoTask.create(
+            parent_directory=directory,
+            description='Updating the Vivado project.',
+            command_text=command,
+            tasks_collection=tasks_collection,
+            kind='update',
+        )
+        t.run()
+        return t
+
     def __init__(self, directory, tasks_collection=None):
         '''
         Create a python wrapper around a Vivado project.
@@ -186,158 +433,433 @@ class Project(object):
             self.tasks_collection = tasks_collection
         self.filename = os.path.join(directory, 'TheProject.xpr')
         
-    def get_tasks(self):
+    def get_tasks(self, limit=None, offset=0, newest_first=False):
         '''
-        Get all the tasks (Vivado processes) that have been run on this proejct.
-        We get them from their directories in the project directory rather
-        than from checking the `tasks_collection`.
+        Get the tasks (Vivado processes) that have been run on this project
+        in the order they were created.
+
+        Args:
+            `limit`: The maximum number of tasks to return.
+            `offset`: The number of tasks to skip (for paging).
+            `newest_first`: Return the most recent tasks first.
         '''
-        ids = [int(fn[5:]) for fn in os.listdir(self.directory)
-               if fnmatch.fnmatch(fn, 'task_*')]
+        records = self.tasks_collection.find_by_parent_directory(
+            self.directory, limit=limit, offset=offset,
+            newest_first=newest_first)
         tasks = [
-            task.VivadoTask(_id=_id, tasks_collection=self.tasks_collection)
-            for _id in ids]
+            task.VivadoTask(_id=record['id'], tasks_collection=self.tasks_collection)
+            for record in records]
         return tasks
 
     def unfinished_tasks(self):
         '''
         Gets a list of all tasks on this project that have not finished.
         '''
-        tasks = [t for t in self.get_tasks() if not t.is_finished()]
+        records = self.tasks_collection.find(
+            parent_directory=self.directory, state=['NOT_STARTED', 'RUNNING'])
+        tasks = [
+            task.VivadoTask(_id=record['id'], tasks_collection=self.tasks_collection)
+            for record in records]
+        # The database doesn't know about tasks that could only report
+        # their state in a file.
+        tasks = [t for t in tasks if not t.is_finished()]
         return tasks
 
-    def get_most_recent_task(self):
+    def clean_up_tasks(self, policy=None):
+        '''
+        Compress or delete the directories of old tasks in this project.
+        The tasks are still recorded in the tasks database.
+
+        Args:
+            `policy`: A `retention.RetentionPolicy`.  Defaults to keeping
+                the last few tasks of each kind and compressing the logs
+                of the others.
+
+        Returns the summary from `RetentionPolicy.apply`.
+        '''
+        if policy is None:
+            policy = retention.RetentionPolicy()
+        return policy.apply(self.get_tasks())
+
+    def reconcile(self):
+        '''
+        Work out what happened to the unfinished tasks of this project.
+        Useful after the python process that started them has died.
+        Tasks whose Vivado process has died are marked as failed and runs
+        that they left half finished are cleaned up.
+
+        Returns a dictionary mapping the status returned by
+        `VivadoTask.reconcile` to lists of tasks.  The 'alive' tasks can be
+        waited on or cancelled as usual.
+        '''
+        statuses = {}
+        for t in self.unfinished_tasks():
+            status = t.reconcile()
+            statuses.setdefault(status, []).append(t)
+        if statuses.get('dead') and not (
+                statuses.get('alive') or statuses.get('unknown')):
+            # Only clean the runs if nothing could still be using them.
+            task.clean_stale_runs(self.directory)
+        return statuses
+
+    def resume_pipeline(self, t):
+        '''
+        Spawn a new task that runs the steps of a finished pipeline task
+        that did not complete (e.g. because its process died).
+
+        Returns the new task or None if all the steps had finished.
+        '''
+        steps = t.get_steps()
+        if not steps:
+            raise ValueError('Task {} is not a pipeline.'.format(t._id))
+        if not t.is_finished():
+            raise Exception('Task {} has not finished.'.format(t._id))
+        finished_steps = t.get_finished_steps()
+        remaining_steps = [step for step in steps
+                           if step[0] not in finished_steps]
+        if remaining_steps:
+            new_t = self.run_pipeline(
+                steps=remaining_steps,
+                description='Resuming task {}: {}'.format(t._id, t.description),
+            )
+        else:
+            new_t = None
+        return new_t
+
+    def get_most_recent_task(self, description=None, kind=None):
         '''
         Get the most recent task that was run on this project.
+
+        Args:
+            `description`: Only consider tasks with this description.
+            `kind`: Only consider tasks of this kind (e.g. 'synthesize').
         '''
-        ids = [int(fn[5:]) for fn in os.listdir(self.directory)
-               if fnmatch.fnmatch(fn, 'task_*')]
-        ids.sort()
-        t = task.VivadoTask(_id=ids[0], tasks_collection=self.tasks_collection)
+        record = self.tasks_collection.find_latest(
+            self.directory, description=description, kind=kind)
+        if record is None:
+            raise Exception('No matching tasks found in {}'.format(
+                self.directory))
+        t = task.VivadoTask(_id=record['id'], tasks_collection=self.tasks_collection)
         return t
 
-    def wait_for_most_recent_task(self):
+    def wait_for_most_recent_task(self, timeout=None):
         '''
         Get the most recent task that was run on this project and wait
         for it to complete.
+
+        If `timeout` seconds pass first the task is killed and a
+        `TimeoutError` is raised.
         '''
         t = self.get_most_recent_task()
+        start_time = time.time()
         while not t.is_finished():
+            if (timeout is not None) and (time.time() - start_time > timeout):
+                t.cancel(state='TIMED_OUT')
+                raise TimeoutError('Task {} timed out after {}s.'.format(
+                    t._id, timeout))
             logger.debug('Waiting for tasks to finish.')
             time.sleep(1)
         t.log_messages(t.get_messages())
         return t
 
-    def utilization_file(self, from_synthesis=False):
+    def report_file(self, kind, from_synthesis=False):
+        '''
+        The filename of a report (see `reports.PARSERS` for the kinds).
+        '''
         if from_synthesis:
-            fn = 'synth_utilization.txt'
+            stage = 'synth'
         else:
-            fn = 'impl_utilization.txt'
-        fn = os.path.join(self.directory, fn)
-        return fn
+            stage = 'impl'
+        return os.path.join(self.directory, '{}_{}.txt'.format(stage, kind))
+
+    def utilization_file(self, from_synthesis=False):
+        return self.report_file('utilization', from_synthesis=from_synthesis)
 
     def power_file(self, from_synthesis=False):
-        if from_synthesis:
-            fn = 'synth_power.txt'
-        else:
-            fn = 'impl_power.txt'
-        fn = os.path.join(self.directory, fn)
-        return fn
+        return self.report_file('power', from_synthesis=from_synthesis)
+
+    def timing_file(self, from_synthesis=False):
+        return self.report_file('timing', from_synthesis=from_synthesis)
+
+    def get_report(self, kind, from_synthesis=False):
+        '''
+        Get the parsed contents of a report (see `reports.load`).  The
+        report must already have been generated (see `generate_reports`).
+        '''
+        fn = self.report_file(kind, from_synthesis=from_synthesis)
+        if not os.path.exists(fn):
+            raise Exception('The {} report {} has not been generated.'.format(
+                kind, fn))
+        return reports.load(fn, kind)
+
+    def diff_report(self, kind, from_synthesis=False):
+        '''
+        Compare a report with the one from the previous run (see
+        `reports.diff`).  Returns None if there wasn't a previous run.
+        '''
+        current = self.get_report(kind, from_synthesis=from_synthesis)
+        previous = reports.load_previous(
+            self.report_file(kind, from_synthesis=from_synthesis), kind)
+        if previous is None:
+            return None
+        return reports.diff(previous, current)
+
+    def get_timing(self, from_synthesis=False):
+        '''
+        Get the timing summary (see `reports.parse_timing`).
+        '''
+        return self.get_report('timing', from_synthesis=from_synthesis)
+
+    def get_clock_utilization(self, from_synthesis=False):
+        return self.get_report('clock_utilization', from_synthesis=from_synthesis)
 
     def get_power(self, from_synthesis=False, names=None):
+        '''
+        Get the power (W) of on-chip components.
+
+        Args:
+            `names`: The components to get (defaults to ['Total']).
+        '''
         if names is None:
             names = ['Total']
-        fn = self.power_file(from_synthesis=from_synthesis)
-        pwers = {}
-        with open(fn, 'r') as f:
-            for line in f:
-                bits = [s.strip() for s in line.split('|')]
-                if (len(bits) == 7) and (bits[1] in names):
-                    pwers[bits[1]] = float(bits[2])
-        return pwers
-
-    def get_utilization(self, from_synthesis=False):
-        fn = self.utilization_file(from_synthesis=from_synthesis)
-        if not os.path.exists(fn):
-            t = self.generate_reports(from_synthesis=from_synthesis)
-            t.wait()
-            t.log_messages(t.get_messages())
-        parents = []
-        with open(fn, 'r') as f:
-            found_hier = False
-            for line in f:
-                if not found_hier:
-                    bits = [s.strip() for s in line.split('|')]
-                    if (len(bits) > 1) and (bits[1] == 'Instance'):
-                        categories = bits[3: -1]
-                        found_hier = True
-                else:
-                    bits = line.split('|')
-                    if len(bits) > 2:
-                        hier_level = (len(bits[1]) - len(bits[1].lstrip()) - 1)//2
-                        this_ut = {
-                            'Instance': bits[1].strip(),
-                            'Module': bits[2].strip(),
-                            'children': [],
-                        }
-                        for index, category in enumerate(categories):
-                            this_ut[category] = int(bits[index+3].strip())
-                        if len(parents) == 0:
-                            assert(hier_level == 0)
-                            parents = [this_ut]
-                        else:
-                            parent = parents[hier_level-1]
-                            parent['children'].append(this_ut)
-                            parents = parents[:hier_level] + [this_ut]
-        return parents[0]
-
-    def synthesize(self, keep_hierarchy=False):
+        on_chip = self.get_report('power', from_synthesis=from_synthesis)['on_chip']
+        return dict((name, on_chip[name]) for name in names if name in on_chip)
+
+    def get_utilization(self, from_synthesis=False, instance=None):
         '''
-        Spawn a Vivado process to synthesize the project.
+        Get the utilization (see `reports.parse_utilization`).
+
+        Args:
+            `instance`: Get the utilization of an instance rather than the
+                top (see `reports.find_instance`).
+        '''
+        utilization = self.get_report('utilization', from_synthesis=from_synthesis)
+        if instance is not None:
+            utilization = reports.find_instance(utilization, instance)
+            if utilization is None:
+                raise ValueError('No instance {} in the utilization report.'.format(
+                    instance))
+        return utilization
+
+    def synthesize_step(self, keep_hierarchy=False, ooc=False):
+        '''
+        The (step name, TCL command) to synthesize the project.
+
+        Args:
+            `ooc`: Whether to use the out of context checkpoints linked
+                by `ooc.synthesize`.  Otherwise any that were linked are
+                removed and the project is synthesized from its sources.
         '''
+        if ooc:
+            proc = '::pyvivado::open_and_synthesize_ooc'
+        else:
+            proc = '::pyvivado::open_and_synthesize'
         if keep_hierarchy:
-            command_templ='::pyvivado::open_and_synthesize {{{}}} "keep_hierarchy"'
+            command_templ='{} {{{}}} "keep_hierarchy"'
         else:
-            command_templ='::pyvivado::open_and_synthesize {{{}}} {{}}'
+            command_templ='{} {{{}}} {{}}'
+        return ('synthesize', command_templ.format(proc, self.directory))
+
+    def implement_step(self, bitstream=True):
+        '''
+        The (step name, TCL command) to implement the project.
+
+        Args:
+            `bitstream`: Whether the bitstream is generated as part of
+                the implementation.
+        '''
+        if bitstream:
+            command_templ = '::pyvivado::open_and_implement {{{}}}'
+        else:
+            command_templ = '::pyvivado::open_and_implement_without_bitstream {{{}}}'
+        return ('implement', command_templ.format(self.directory))
+
+    def bitstream_step(self):
+        '''
+        The (step name, TCL command) to generate the bitstream of an
+        implemented project.
+        '''
+        return ('bitstream', '::pyvivado::open_and_write_bitstream {{{}}}'.format(
+            self.directory))
+
+    def reports_step(self, from_synthesis=False):
+        '''
+        The (step name, TCL command) to generate the power, utilization,
+        timing and clock utilization reports.
+        '''
+        if from_synthesis:
+            step = ('synth_reports',
+                    '::pyvivado::generate_synth_reports {{{}}}')
+        else:
+            step = ('impl_reports',
+                    '::pyvivado::generate_impl_reports {{{}}}')
+        return (step[0], step[1].format(self.directory))
+
+    def run_pipeline(self, steps, description=None, profile=None):
+        '''
+        Spawn a single Vivado process that runs several steps one after
+        another.  The project (and any opened runs) are only loaded once.
+
+        Args:
+            `steps`: A list of (step name, TCL command) tuples such as those
+                returned by `synthesize_step` and `reports_step`.
+            `description`: A description of the task.
+            `profile`: The `resources.ResourceProfile` of the Vivado
+                process (defaults to the one set in `config`).
+
+        Returns the task.  Use `VivadoTask.wait_for_step` to wait for
+        individual steps.
+        '''
+        if description is None:
+            description = 'Pipeline: {}.'.format(
+                ', '.join([name for name, command_text in steps]))
+        t = task.VivadoTask.create_pipeline(
+            parent_directory=self.directory,
+            steps=steps,
+            description=description,
+            tasks_collection=self.tasks_collection,
+            profile=profile,
+        )
+        t.run()
+        return t
+
+    def restore_checkpoints(self, cache=None, strategy='default',
+                            keep_hierarchy=False):
+        '''
+        Restore the checkpoints of a previous synthesis and implementation
+        of the same design from a `checkpoint_cache.CheckpointCache` so
+        that Vivado doesn't have to run them again.
+
+        Args:
+            `strategy`: Names the run settings (see
+                `checkpoint_cache.CheckpointCache.key`).
+            `keep_hierarchy`: Whether the design is synthesized keeping
+                its hierarchy.
+
+        Returns the names of the stages that were restored.
+        '''
+        if cache is None:
+            cache = checkpoint_cache.CheckpointCache()
+        return cache.restore(self, strategy=strategy,
+                             keep_hierarchy=keep_hierarchy)
+
+    def save_checkpoints(self, cache=None, strategy='default',
+                         keep_hierarchy=False):
+        '''
+        Save the checkpoints of the finished synthesis and implementation
+        runs to a `checkpoint_cache.CheckpointCache`.  The arguments are
+        as for `restore_checkpoints`.
+
+        Nothing else fills the cache so call this once a synthesis or
+        implementation task has finished with FINISHED_OK.
+
+        Returns the names of the stages that were saved.
+        '''
+        if cache is None:
+            cache = checkpoint_cache.CheckpointCache()
+        return cache.save(self, strategy=strategy,
+                          keep_hierarchy=keep_hierarchy)
+
+    def synthesize(self, keep_hierarchy=False, cache=None, profile=None,
+                   strategy='default'):
+        '''
+        Spawn a Vivado process to synthesize the project.
+
+        If a `checkpoint_cache.CheckpointCache` is given then any cached
+        checkpoints (for this `strategy` and `keep_hierarchy`) are
+        restored first.  `profile` is the `resources.ResourceProfile` that
+        sets how many threads and parallel runs Vivado uses.
+        '''
+        if cache is not None:
+            self.restore_checkpoints(cache, strategy=strategy,
+                                     keep_hierarchy=keep_hierarchy)
+        name, command = self.synthesize_step(keep_hierarchy=keep_hierarchy)
         t = task.VivadoTask.create(
             parent_directory=self.directory,
-            command_text=command_templ.format(self.directory),
+            command_text=command,
             description='Synthesize project.',
             tasks_collection=self.tasks_collection,
+            kind='synthesize',
+            profile=profile,
         )
         t.run()
         return t
 
-    def implement(self):
+    def implement(self, cache=None, profile=None, strategy='default',
+                  keep_hierarchy=False):
         '''
         Spawn a Vivado process to implement the project.
+
+        If a `checkpoint_cache.CheckpointCache` is given then any cached
+        checkpoints (for this `strategy` and `keep_hierarchy`, which says
+        how the project was synthesized) are restored first.  `profile`
+        is the `resources.ResourceProfile` that sets how many threads and
+        parallel runs Vivado uses.
         '''
+        if cache is not None:
+            self.restore_checkpoints(cache, strategy=strategy,
+                                     keep_hierarchy=keep_hierarchy)
+        name, command = self.implement_step()
         t = task.VivadoTask.create(
             parent_directory=self.directory,
-            command_text='::pyvivado::open_and_implement {{{}}}'.format(
-                self.directory),
+            command_text=command,
             description='Implement project.',
             tasks_collection=self.tasks_collection,
+            kind='implement',
+            profile=profile,
         )
         t.run()
         return t
 
-    def generate_reports(self, from_synthesis=False):
+    def synthesize_and_report(self, keep_hierarchy=False, cache=None,
+                              profile=None, strategy='default'):
+        '''
+        Spawn a single Vivado process to synthesize the project and
+        generate the synthesis reports.
+        '''
+        if cache is not None:
+            self.restore_checkpoints(cache, strategy=strategy,
+                                     keep_hierarchy=keep_hierarchy)
+        return self.run_pipeline(
+            steps=[self.synthesize_step(keep_hierarchy=keep_hierarchy),
+                   self.reports_step(from_synthesis=True)],
+            description='Synthesize project and generate reports.',
+            profile=profile,
+        )
+
+    def implement_and_report(self, bitstream=True, cache=None, profile=None,
+                             strategy='default', keep_hierarchy=False):
+        '''
+        Spawn a single Vivado process to implement the project, generate
+        the implementation reports and then (optionally) the bitstream.
+        '''
+        if cache is not None:
+            self.restore_checkpoints(cache, strategy=strategy,
+                                     keep_hierarchy=keep_hierarchy)
+        steps = [self.implement_step(bitstream=False), self.reports_step()]
+        if bitstream:
+            steps.append(self.bitstream_step())
+        return self.run_pipeline(
+            steps=steps,
+            description='Implement project and generate reports.',
+            profile=profile,
+        )
+
+    def generate_reports(self, from_synthesis=False, profile=None):
         '''
         Spawn a Vivado process to generate reports
         '''
-        if from_synthesis:
-            command_templ = '::pyvivado::generate_synth_reports {{{}}}'
-        else:
-            command_templ = '::pyvivado::generate_impl_reports {{{}}}'
+        name, command = self.reports_step(from_synthesis=from_synthesis)
         t = task.VivadoTask.create(
             parent_directory=self.directory,
-            command_text=command_templ.format(self.directory),
+            command_text=command,
             description='Generate reports.',
             tasks_collection=self.tasks_collection,
+            kind='reports',
+            profile=profile,
         )
         t.run()
-        return t        
+        return t
 
 
 class BuilderProject(Project):
@@ -346,9 +868,55 @@ class BuilderProject(Project):
     created using `Builder`s rather than by explicitly listing the files.
     '''
 
+    @classmethod
+    def generate_files(cls, design_builders, simulation_builders, parameters,
+                       directory, temp_directory=None):
+        '''
+        Generate the files for the project that these builders would create
+        in memory.  Nothing is written to disk except by builders that
+        can only build to disk.
+
+        Args:
+            `design_builders`: The builders responsible for the synthesizable code.
+            `simulation_builders`: The builders responsible for the simulation code.
+            `parameters`: Top level parameters used to generated the design.
+            `directory`: The project location.
+            `temp_directory`: Where builders that can only build to disk
+                generate their files.  It is deleted afterwards.  Defaults
+                to 'temp' in the project directory.
+
+        Returns a dictionary with the 'design_files', 'simulation_files',
+        'ips' and the generated 'files' (a `utils.VirtualFiles`).
+        '''
+        if temp_directory is None:
+            temp_directory = os.path.join(directory, 'temp')
+        files = utils.VirtualFiles()
+        try:
+            design_requirements = builder.build_all(
+                directory, top_builders=design_builders, top_params=parameters,
+                files=files, temp_directory=temp_directory,
+                n_threads=config.build_threads)
+            simulation_requirements = builder.build_all(
+                directory, top_builders=simulation_builders,
+                top_params=parameters, false_directory=directory,
+                files=files, temp_directory=temp_directory,
+                n_threads=config.build_threads)
+        finally:
+            if os.path.exists(temp_directory):
+                shutil.rmtree(temp_directory)
+        # Work out what IP blocks are required.
+        ips = builder.condense_ips(
+            design_requirements['ips'] + simulation_requirements['ips'])
+        return {
+            'design_files': design_requirements['filenames'],
+            'simulation_files': simulation_requirements['filenames'],
+            'ips': ips,
+            'files': files,
+        }
+
     @classmethod
     def predict_hash(cls, design_builders, simulation_builders, parameters,
-                     temp_directory, directory):
+                     directory, temp_directory=None, generated=None):
         '''
         Get the project hash for the project that these builders would create.
 
@@ -356,29 +924,26 @@ class BuilderProject(Project):
             `design_builders`: The builders responsible for the synthesizable code.
             `simulation_builders`: The builders responsible for the simulation code.
             `parameters`: Top level parameters used to generated the design.
-            `temp_directory`: We temporary directory where we'll generate the files
-                so we can work out the hash.
             `directory`: The real project location.  This is required since some
                 simulation files may need this information.
+            `temp_directory`: Where builders that can only build to disk
+                generate their files.
+            `generated`: The output of `generate_files` if it has already
+                been called.
         '''
-        # Make a new directory for temporary files.
-        if os.path.exists(temp_directory):
-            shutil.rmtree(temp_directory)
-        os.makedirs(temp_directory)
-        # Build all the required files.
-        design_requirements = builder.build_all(
-            temp_directory, top_builders=design_builders, top_params=parameters)
-        simulation_requirements = builder.build_all(
-            temp_directory, top_builders=simulation_builders,
-            top_params=parameters, false_directory=directory)
-        # Work out what IP blocks are required.
-        ips = builder.condense_ips(
-            design_requirements['ips'] + simulation_requirements['ips'])
-        # And generate the hash.
+        if generated is None:
+            generated = cls.generate_files(
+                design_builders=design_builders,
+                simulation_builders=simulation_builders,
+                parameters=parameters,
+                directory=directory,
+                temp_directory=temp_directory,
+            )
         new_hash = cls.hash(
-            design_files=design_requirements['filenames'],
-            simulation_files=simulation_requirements['filenames'],
-            ips=ips)
+            design_files=generated['design_files'],
+            simulation_files=generated['simulation_files'],
+            ips=generated['ips'],
+            files=generated['files'])
         return new_hash
             
 
@@ -393,37 +958,118 @@ class BuilderProject(Project):
             `design_builders`: The builders responsible for the synthesizable code.
             `simulation_builders`: The builders responsible for the simulation code.
             `parameters`: Top level parameters used to generated the design.
-            `temp_directory`: We temporary directory where we'll generate the files
-                so we can work out the hash.
             `directory`: The real project location.  This is required since some
                 simulation files may need this information.
             `tasks_collection`: How we keep track of Vivado processes.
             `part`: The 'part' to use when implementing.
             `board`: The 'board' to use when implementing.
             `top_module`: The top level module in the design.
+
+        Returns the output of `generate_files` (or None if it wasn't
+        needed) so that the files don't need to be generated again when
+        the project is recreated.
         '''
+        generated = None
         if os.path.exists(directory):
             # Check that project file exists
             if not os.path.exists(os.path.join(directory, 'TheProject.xpr')):
-                shutil.rmtree(directory)
+                cls.delete(directory, tasks_collection)
             else:
+                generated = cls.generate_files(
+                    design_builders=design_builders,
+                    simulation_builders=simulation_builders,
+                    parameters=parameters,
+                    directory=directory,
+                )
                 new_hash = cls.predict_hash(
                     design_builders=design_builders,
                     simulation_builders=simulation_builders,
                     parameters=parameters,
-                    temp_directory=os.path.join(directory, 'temp'),
                     directory=directory,
+                    generated=generated,
                 )
                 old_hash = cls.read_hash(directory)
                 if new_hash != old_hash:
                     logger.debug('Project has changed {}->{}.  Deleting and regenerating.'.format(old_hash, new_hash))
-                    shutil.rmtree(directory)
+                    cls.delete(directory, tasks_collection)
                 else:
                     logger.debug('Project has not changed since last time.')
+        return generated
             
+    @classmethod
+    def update_if_changed(cls, design_builders, simulation_builders, parameters,
+                          directory, tasks_collection=None, part='', board='',
+                          top_module=''):
+        '''
+        Check if the dependencies of the project have changed.  If they have
+        update the project incrementally (see `Project.update`).  If it can't
+        be updated it is deleted so that it can be recreated later.
+
+        Takes the same arguments as `delete_if_changed`.
+
+        Returns a (generated, t) tuple where `generated` is the output of
+        `generate_files` (or None) and `t` is the task updating the
+        project (or None).
+        '''
+        generated = None
+        t = None
+        if not os.path.exists(directory):
+            return generated, t
+        if (not os.path.exists(os.path.join(directory, 'TheProject.xpr'))) or (
+                cls.read_files_record(directory) is None):
+            # We don't know enough about the project to update it.
+            generated = cls.delete_if_changed(
+                design_builders=design_builders,
+                simulation_builders=simulation_builders,
+                parameters=parameters,
+                directory=directory,
+                tasks_collection=tasks_collection,
+                part=part,
+                board=board,
+                top_module=top_module,
+            )
+            return generated, t
+        generated = cls.generate_files(
+            design_builders=design_builders,
+            simulation_builders=simulation_builders,
+            parameters=parameters,
+            directory=directory,
+        )
+        new_hash = cls.predict_hash(
+            design_builders=design_builders,
+            simulation_builders=simulation_builders,
+            parameters=parameters,
+            directory=directory,
+            generated=generated,
+        )
+        if new_hash == cls.read_hash(directory):
+            logger.debug('Project has not changed since last time.')
+            return generated, t
+        try:
+            t = cls.update(
+                directory=directory,
+                design_files=generated['design_files'],
+                simulation_files=generated['simulation_files'],
+                tasks_collection=tasks_collection,
+                part=part,
+                board=board,
+                ips=generated['ips'],
+                top_module=top_module,
+                files=generated['files'],
+            )
+        except ValueError as e:
+            logger.debug('Cannot update project ({}).  Deleting and regenerating.'.format(e))
+            cls.delete(directory, tasks_collection)
+        else:
+            # The parameters are used to regenerate the interface.
+            with open(os.path.join(directory, 'params.txt'), 'w') as f:
+                f.write(cls.params_text(parameters))
+        return generated, t
+
     @classmethod
     def create(cls, design_builders, simulation_builders, parameters, directory,
-               tasks_collection=None, part=None, board='', top_module=''):
+               tasks_collection=None, part=None, board='', top_module='',
+               steps=(), generated=None):
         '''
         Create a new Vivado project from `Builder`'s specifying the top level
         modules.  Spawns a Viavdo process to create the project and returns a 
@@ -436,32 +1082,37 @@ class BuilderProject(Project):
             `parameters`: Top level parameters used to generated the design.  Must include
                 'factory_name' which will be used to find the `interface` for test bench
                 projects that read the parameters and the `comm` for fpga projects. 
-            `temp_directory`: We temporary directory where we'll generate the files
-                so we can work out the hash.
             `directory`: The real project location.  This is required since some
                 simulation files may need this information.
             `tasks_collection`: How we keep track of Vivado processes.
             `part`: The 'part' to use when implementing.
             `board`: The 'board' to use when implementing.
             `top_module`: The top level module in the design.
+            `steps`: Extra (step name, TCL command) tuples to run in the
+                same Vivado process once the project is created.
+            `generated`: The output of `generate_files` for this directory
+                if the files have already been generated in memory.
         '''
-        
         cls.write_params(params=parameters, directory=directory)
-        design_requirements = builder.build_all(
-            directory, top_builders=design_builders, top_params=parameters)
-        simulation_requirements = builder.build_all(
-            directory, top_builders=simulation_builders, top_params=parameters)
-        ips = builder.condense_ips(
-            design_requirements['ips'] + simulation_requirements['ips'])
+        if generated is None:
+            generated = cls.generate_files(
+                design_builders=design_builders,
+                simulation_builders=simulation_builders,
+                parameters=parameters,
+                directory=directory,
+            )
+        generated['files'].write_all()
         p = super().create(
             directory=directory,
-            design_files=design_requirements['filenames'],
-            simulation_files=simulation_requirements['filenames'],
+            design_files=generated['design_files'],
+            simulation_files=generated['simulation_files'],
             tasks_collection=tasks_collection,
-            ips=ips,
+            ips=generated['ips'],
             board=board,
             part=part,
             top_module=top_module,
+            steps=steps,
+            files=generated['files'],
         )
         return p
 
@@ -471,24 +1122,24 @@ class BuilderProject(Project):
         '''
         Create a new BuilderProject if one does not already exist in the 
         directory.  If one does exist and the dependencies have been modified
-        then delete the old project and create a new one.  If one does exist
-        and the dependencies have not been modified then use the existing
-        project.
+        then update the old project (or delete it and create a new one if it
+        can't be updated).  If one does exist and the dependencies have not
+        been modified then use the existing project.
         '''
-        if os.path.exists(directory):
-            cls.delete_if_changed(
-                design_builders=design_builders,
-                simulation_builders=simulation_builders,
-                parameters=parameters,
-                directory=directory,
-                tasks_collection=tasks_collection,
-                part=part,
-                board=board,
-                top_module=top_module,
-            )
+        generated, update_task = cls.update_if_changed(
+            design_builders=design_builders,
+            simulation_builders=simulation_builders,
+            parameters=parameters,
+            directory=directory,
+            tasks_collection=tasks_collection,
+            part=part,
+            board=board,
+            top_module=top_module,
+        )
         if os.path.exists(directory):
             logger.debug('Using old Project.')
             p = cls(directory=directory, tasks_collection=tasks_collection)
+            cls.check_update(update_task)
         else:
             logger.debug('Making new Project.')
             os.makedirs(directory)
@@ -501,12 +1152,26 @@ class BuilderProject(Project):
                 part=part,
                 board=board,
                 top_module=top_module,
+                generated=generated,
             )
             t = p.wait_for_most_recent_task()
             errors = t.get_errors()
             assert(len(errors) == 0)
         return p
 
+    @classmethod
+    def check_update(cls, update_task):
+        '''
+        Wait for the task returned by `update_if_changed` (if there was
+        one) and make sure it succeeded.  The project's hash and record of
+        its files are only brought up to date once it has.
+        '''
+        if update_task is not None:
+            update_task.wait()
+            errors = update_task.get_errors()
+            assert(len(errors) == 0)
+            cls.commit_update(update_task.parent_directory)
+
     def read_params(self):
         '''
         Read the parameters that were used to generate this project.
@@ -574,9 +1239,9 @@ class FPGAProject(BuilderProject):
         '''
         Create a new FPGAProject if one does not already exist in the 
         directory.  If one does exist and the dependencies have been modified
-        then delete the old project and create a new one.  If one does exist
-        and the dependencies have not been modified then use the existing
-        project.
+        then update the old project (or delete it and create a new one if it
+        can't be updated).  If one does exist and the dependencies have not
+        been modified then use the existing project.
 
         Args: 
             `the_builder`: The builder for the top level module with an AXI4Lite
@@ -591,15 +1256,15 @@ class FPGAProject(BuilderProject):
         parent_params = cls.make_parent_params(
             the_builder=the_builder, parameters=parameters, directory=directory,
             tasks_collection=tasks_collection, part=part, board=board)
-        if os.path.exists(directory):
-            cls.delete_if_changed(**parent_params)
+        generated, update_task = cls.update_if_changed(**parent_params)
         if os.path.exists(directory):
             logger.debug('Using old Project.')
             p = cls(directory=directory, tasks_collection=tasks_collection)
+            cls.check_update(update_task)
         else:
             logger.debug('Making new Project.')
             os.makedirs(directory)
-            p = super().create(**parent_params)
+            p = super().create(generated=generated, **parent_params)
             t = p.wait_for_most_recent_task()
             
             errors = t.get_errors()
@@ -670,6 +1335,7 @@ class FPGAProject(BuilderProject):
             command_text='::pyvivado::monitor_redis {} {} {:0} 0'.format(hwcode, hwtarget, int(jtagfreq)),
             description=description,
             tasks_collection=self.tasks_collection,
+            kind='monitor',
         )
         t.run()
         self.wait_for_monitor(hwcode=hwcode, monitor_task=t)
@@ -710,6 +1376,7 @@ class FPGAProject(BuilderProject):
                 self.directory, hwcode, hwtarget, int(jtagfreq), fake_int),
             description=description,
             tasks_collection=self.tasks_collection,
+            kind='deploy',
         )
         t.run()
         # Wait for the task to start monitoring and get the
@@ -757,9 +1424,9 @@ class FileTestBenchProject(BuilderProject):
         '''
         Create a new FileTestBenchProject if one does not already exist in the 
         directory.  If one does exist and the dependencies have been modified
-        then delete the old project and create a new one.  If one does exist
-        and the dependencies have not been modified then use the existing
-        project.
+        then update the old project (or delete it and create a new one if it
+        can't be updated).  If one does exist and the dependencies have not
+        been modified then use the existing project.
 
         Args: 
             `interface`: The `Interface` object for the top level module.
@@ -771,15 +1438,15 @@ class FileTestBenchProject(BuilderProject):
         parent_params = cls.make_parent_params(
             interface=interface, directory=directory,
             tasks_collection=tasks_collection, part=part, board=board)
-        if os.path.exists(directory):
-            super().delete_if_changed(**parent_params)
+        generated, update_task = super().update_if_changed(**parent_params)
         if os.path.exists(directory):
             logger.debug('Using old Project.')
             p = cls(directory=directory, tasks_collection=tasks_collection)
+            cls.check_update(update_task)
         else:
             logger.debug('Making new Project.')
             os.makedirs(directory)
-            p = super().create(**parent_params)
+            p = super().create(generated=generated, **parent_params)
             t = p.wait_for_most_recent_task()
             errors = t.get_errors()
             assert(len(errors) == 0)
@@ -798,6 +1465,81 @@ class FileTestBenchProject(BuilderProject):
         self.interface = interface.module_register[self.params['factory_name']](
             params=self.params)
 
+    @classmethod
+    def create_and_simulate(cls, interface, directory, input_data,
+                            runtime=None, sim_type='hdl',
+                            tasks_collection=None, part=None, board=''):
+        '''
+        Like `create_or_update` followed by `run_simulation` except that
+        when a new project must be created the simulation is run in the
+        same Vivado process, so the project is only opened once.
+
+        Returns a (p, errors, output_data) tuple where:
+            `p`: is the `FileTestBenchProject`.
+            `errors`: If a list of errors produced by the simulation task.
+            `output_data`: A list of dictionaries of the output wire values.
+        '''
+        parent_params = cls.make_parent_params(
+            interface=interface, directory=directory,
+            tasks_collection=tasks_collection, part=part, board=board)
+        generated, update_task = super().update_if_changed(**parent_params)
+        if os.path.exists(directory):
+            logger.debug('Using old Project.')
+            p = cls(directory=directory, tasks_collection=tasks_collection)
+            cls.check_update(update_task)
+            errors, data_out = p.run_simulation(
+                input_data=input_data, runtime=runtime, sim_type=sim_type)
+        else:
+            logger.debug('Making new Project and simulating.')
+            os.makedirs(directory)
+            directory = os.path.abspath(directory)
+            interface.write_input_file(
+                input_data, os.path.join(directory, 'input.data'))
+            step = cls.simulation_step(
+                directory=directory, runtime=cls.default_runtime(
+                    input_data, runtime), sim_type=sim_type)
+            p = super().create(steps=[step], generated=generated,
+                               **parent_params)
+            t = p.get_most_recent_task()
+            t.wait_for_step('create')
+            errors = t.get_errors()
+            assert(len(errors) == 0)
+            t.wait()
+            errors = t.get_errors()
+            data_out = p.read_simulation_output()
+        return p, errors, data_out
+
+    @staticmethod
+    def default_runtime(input_data, runtime=None):
+        if runtime is None:
+            runtime = '{} ns'.format((len(input_data) + 20) * 10)
+        return runtime
+
+    @staticmethod
+    def simulation_step(directory, runtime, sim_type='hdl'):
+        '''
+        The (step name, TCL command) to run a simulation of the project in
+        `directory`.
+        '''
+        command_template = '''
+::pyvivado::ensure_project_open {{{directory}}}
+::pyvivado::run_{sim_type}_simulation {{{directory}}} {{{runtime}}}
+'''
+        command = command_template.format(
+            runtime=runtime, sim_type=sim_type, directory=directory)
+        return ('simulate', command)
+
+    def read_simulation_output(self):
+        '''
+        Read the output file written by the last simulation.
+        '''
+        if not os.path.exists(self.output_filename):
+            logger.error('Failed to create output file from simulation')
+            data_out = []
+        else:
+            data_out = self.interface.read_output_file(self.output_filename)
+        return data_out
+
     def run_simulation(self, input_data, runtime=None, sim_type='hdl'):
         '''
         Spawns a vivado process that will run a simulation of the project.
@@ -812,21 +1554,16 @@ class FileTestBenchProject(BuilderProject):
             `errors`: If a list of errors produced by the simulation task.
             `output_data`: A list of dictionaries of the output wire values.
         '''
-        command_template = '''
-open_project {{{project_filename}}}
-::pyvivado::run_{sim_type}_simulation {{{directory}}} {{{runtime}}}
-'''
-        if runtime is None:
-            runtime = '{} ns'.format((len(input_data) + 20) * 10)
-        command = command_template.format(
-            project_filename=self.filename, runtime=runtime, sim_type=sim_type,
-            directory=self.directory) 
+        runtime = self.default_runtime(input_data, runtime)
+        name, command = self.simulation_step(
+            directory=self.directory, runtime=runtime, sim_type=sim_type)
         # Create a task to run the simulation.
         t = task.VivadoTask.create(
             parent_directory=self.directory,
             description='Running a HDL simulation.',
             command_text=command,
             tasks_collection=self.tasks_collection,
+            kind='simulate',
         )
         # Write the input file to the task directory.
         self.interface.write_input_file(
@@ -834,12 +1571,6 @@ open_project {{{project_filename}}}
         # Run the simulation task and wait for it to complete.
         t.run_and_wait()
         errors = t.get_errors()
-        if not os.path.exists(self.output_filename):
-            logger.error('Failed to create output file from simulation')
-            data_out = []
-        else:
-            # Read the output files.
-            data_out = self.interface.read_output_file(
-                os.path.join(t.directory, self.output_filename))
+        data_out = self.read_simulation_output()
         return errors, data_out
 
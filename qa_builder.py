@@ -0,0 +1,172 @@
+import unittest
+import os
+import sys
+import shutil
+import logging
+import subprocess
+import time
+
+from pyvivado import config, builder, utils
+from pyvivado.hdl.test import testA
+from pyvivado.hdl.wrapper import inner_wrapper
+
+logger = logging.getLogger('pyvivado.test_builder')
+
+
+def get_interface():
+    return testA.get_testA_interface({
+        'data_width': 3,
+        'array_length': 4,
+    })
+
+
+class SleepBuilder(builder.Builder):
+    # (name, start, end) of each build.
+    builds = []
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.builders = [SleepBuilder({'name': name, 'dependencies': []})
+                         for name in params['dependencies']]
+
+    def build(self, directory):
+        start = time.time()
+        time.sleep(0.2)
+        self.builds.append((self.params['name'], start, time.time()))
+
+
+class CycleBuilder(builder.Builder):
+    # Depends on the builder with the next index.
+
+    def required_builders(self):
+        return [CycleBuilder({'index': (self.params['index'] + 1) % 3})]
+
+
+class CountingBuilder(builder.Builder):
+    # Counts how many times builders are serialized.
+    n_serialized = 0
+
+    def __init__(self, params, builders=[]):
+        super().__init__(params)
+        self.builders = builders
+
+    def canonical_form(self):
+        CountingBuilder.n_serialized += 1
+        return (self.__class__, self.params,
+                [b.fingerprint() for b in self.builders])
+
+
+class TestBuilder(unittest.TestCase):
+
+    def test_fingerprint(self):
+        interface = get_interface()
+        wrapper_builder = inner_wrapper.InnerWrapperBuilder({
+            'interface': interface,
+        })
+        self.assertEqual(interface.fingerprint(), get_interface().fingerprint())
+        self.assertEqual(utils.fingerprint({'a': 1, 'b': [1, 2]}),
+                         utils.fingerprint({'b': (1, 2), 'a': 1}))
+        self.assertNotEqual(utils.fingerprint({'a': 1}),
+                            utils.fingerprint({'a': '1'}))
+        # Fingerprints don't depend on hash randomization.
+        code = '\n'.join([
+            'from pyvivado import qa_builder',
+            'from pyvivado.hdl.wrapper import inner_wrapper',
+            'interface = qa_builder.get_interface()',
+            'print(interface.fingerprint())',
+            'print(inner_wrapper.InnerWrapperBuilder({"interface": interface}).fingerprint())',
+        ])
+        env = dict(os.environ, PYTHONHASHSEED='123')
+        env['PYTHONPATH'] = os.pathsep.join(
+            [p for p in sys.path if p] + [env.get('PYTHONPATH', '')])
+        output = subprocess.check_output(
+            [sys.executable, '-c', code], env=env).decode('utf-8').split()
+        self.assertEqual(output, [interface.fingerprint(),
+                                  wrapper_builder.fingerprint()])
+
+    def test_template_builder(self):
+        directory = os.path.join(config.testdir, 'testtemplatebuilder')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        template_fn = os.path.join(directory, 'thing.vhd.t')
+        with open(template_fn, 'w') as f:
+            f.write('constant WIDTH: natural := {{width}};\n')
+        TemplateBuilder = builder.make_template_builder(template_fn)
+        builders = [TemplateBuilder({'width': 3}), TemplateBuilder({'width': 4}),
+                    TemplateBuilder({'width': 3})]
+        self.assertEqual(builders[0]._id(), builders[2]._id())
+        requirements = builder.build_all(directory, top_builders=builders)
+        fns = sorted(requirements['filenames'])
+        self.assertEqual(len(fns), 2)
+        for fn in fns:
+            self.assertTrue(os.path.basename(fn).startswith('thing_'))
+            self.assertTrue(fn.endswith('.vhd'))
+        with open(builders[0].filename(directory), 'r') as f:
+            self.assertEqual(f.read().strip(), 'constant WIDTH: natural := 3;')
+        with self.assertRaises(ValueError):
+            builder.make_template_builder('thing.txt')
+
+    def test_simple_builder_fingerprint(self):
+        # Files with the same name in different directories are different
+        # files.
+        builders = [builder.make_simple_builder(filenames=[fn])({})
+                    for fn in ('/x/a/pkg.vhd', '/y/b/pkg.vhd', '/x/a/pkg.vhd')]
+        self.assertNotEqual(builders[0].fingerprint(), builders[1].fingerprint())
+        self.assertEqual(builders[0].fingerprint(), builders[2].fingerprint())
+
+    def test_parallel_build_all(self):
+        directory = os.path.join(config.testdir, 'testparallelbuildall')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        top_builder = SleepBuilder({'name': 'top',
+                                    'dependencies': ['a', 'b', 'c', 'd']})
+        SleepBuilder.builds = []
+        requirements = builder.build_all(
+            directory, top_builders=[top_builder], n_threads=4)
+        self.assertEqual(len(requirements['build_times']), 5)
+        self.assertGreaterEqual(
+            requirements['build_times'][top_builder._id()], 0.2)
+        builds = dict((name, (start, end))
+                      for name, start, end in SleepBuilder.builds)
+        for name in 'abcd':
+            self.assertLessEqual(builds[name][1], builds['top'][0])
+        # The independent builders ran at the same time.
+        self.assertLess(max(builds[name][0] for name in 'abcd'),
+                        min(builds[name][1] for name in 'abcd'))
+
+    def test_builder_graph(self):
+        top_builder = SleepBuilder({'name': 'top', 'dependencies': ['a', 'b']})
+        graph = builder.BuilderGraph(top_builders=[
+            top_builder, SleepBuilder({'name': 'a', 'dependencies': []})])
+        self.assertEqual(len(graph.builders), 3)
+        order = [graph.builders[_id].params['name'] for _id in graph.order]
+        self.assertEqual(order[-1], 'top')
+        self.assertEqual(sorted(order[:2]), ['a', 'b'])
+        exported = graph.to_json()
+        self.assertEqual(len(exported['nodes']), 3)
+        self.assertEqual(len(exported['edges']), 2)
+        top_label = graph.label(top_builder._id())
+        self.assertTrue(top_label.startswith('SleepBuilder:'))
+        self.assertTrue('"{}" -> '.format(top_label) in graph.to_dot())
+
+    def test_builder_graph_fingerprints_once(self):
+        # A diamond: top depends on left and right which share bottom.
+        bottom = CountingBuilder({'name': 'bottom'})
+        left = CountingBuilder({'name': 'left'}, [bottom])
+        right = CountingBuilder({'name': 'right'}, [bottom])
+        top = CountingBuilder({'name': 'top'}, [left, right])
+        CountingBuilder.n_serialized = 0
+        graph = builder.BuilderGraph(top_builders=[top])
+        graph.to_json()
+        graph.to_dot()
+        self.assertEqual(len(graph.builders), 4)
+        self.assertEqual(CountingBuilder.n_serialized, 4)
+        with self.assertRaises(ValueError):
+            builder.BuilderGraph(top_builders=[CycleBuilder({'index': 0})])
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import os
+import shutil
+import logging
+
+from pyvivado import config, project, checkpoint_cache
+
+logger = logging.getLogger('pyvivado.test_checkpoint_cache')
+
+
+def make_fake_project(directory, part, runs):
+    '''
+    Make a directory that looks like a project whose runs have finished.
+    `runs` maps run names to the files they produced.
+    '''
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory)
+    project.Project.write_hash(directory, b'design')
+    project.Project.write_files_record(
+        directory, design_files=[], simulation_files=[], ips=[],
+        part=part, board='', top_module='')
+    for run_name, names in runs.items():
+        run_directory = os.path.join(directory, 'TheProject.runs', run_name)
+        os.makedirs(run_directory)
+        for name in names + ['.vivado.end.rst']:
+            with open(os.path.join(run_directory, name), 'w') as f:
+                f.write(name)
+    return project.Project(
+        directory, tasks_collection=config.default_tasks_collection)
+
+
+class TestCheckpointCache(unittest.TestCase):
+
+    def test_save_and_restore(self):
+        directory = os.path.join(config.testdir, 'testcheckpointcache')
+        cache = checkpoint_cache.CheckpointCache(
+            checkpoint_cache.LocalDirectoryStore(os.path.join(directory, 'store')))
+        p = make_fake_project(os.path.join(directory, 'original'), 'xc7', {
+            'synth_1': ['top.dcp', 'runme.log'],
+            'impl_1': ['top_routed.dcp', 'top_placed.dcp', 'top.bit'],
+        })
+        self.assertEqual(p.save_checkpoints(cache), ['synth', 'impl'])
+        # The same design in another directory.
+        p2 = make_fake_project(os.path.join(directory, 'copy'), 'xc7', {})
+        self.assertEqual(p2.restore_checkpoints(cache), ['synth', 'impl'])
+        impl_directory = os.path.join(p2.directory, 'TheProject.runs', 'impl_1')
+        self.assertEqual(sorted(os.listdir(impl_directory)), [
+            cache.RESTORED_FN, 'top.bit', 'top_routed.dcp'])
+        with open(os.path.join(impl_directory, cache.RESTORED_FN), 'r') as f:
+            self.assertEqual(f.read(), 'top_routed.dcp')
+        self.assertEqual(p2.restore_checkpoints(cache), [])
+        # Nothing is restored for a different part or strategy.
+        p3 = make_fake_project(os.path.join(directory, 'otherpart'), 'xcku', {})
+        self.assertEqual(p3.restore_checkpoints(cache), [])
+        self.assertEqual(p2.restore_checkpoints(cache, strategy='fast'), [])
+        # Nor for different synthesis options.
+        p6 = make_fake_project(os.path.join(directory, 'keephierarchy'), 'xc7', {})
+        self.assertEqual(p6.restore_checkpoints(cache, keep_hierarchy=True), [])
+        self.assertEqual(p6.save_checkpoints(cache, keep_hierarchy=True), [])
+        self.assertEqual(p6.restore_checkpoints(cache), ['synth', 'impl'])
+        # Runs without a checkpoint aren't saved and entries without one
+        # aren't restored.
+        p4 = make_fake_project(os.path.join(directory, 'bitonly'), 'xcvu', {
+            'impl_1': ['top.bit'],
+        })
+        self.assertEqual(p4.save_checkpoints(cache), [])
+        design_hash, part, board = cache.design(p4)
+        cache.store.put(cache.key(design_hash, part, board, 'default', 'impl'),
+                        [os.path.join(p4.directory, 'TheProject.runs', 'impl_1', 'top.bit')])
+        p5 = make_fake_project(os.path.join(directory, 'bitonlycopy'), 'xcvu', {})
+        self.assertEqual(p5.restore_checkpoints(cache), [])
+        self.assertEqual(os.listdir(os.path.join(p5.directory, 'TheProject.runs', 'impl_1')), [])
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os
+import shutil
+import logging
+
+from pyvivado import config, fmax, project, test_utils
+
+logger = logging.getLogger('pyvivado.test_fmax')
+
+TIMING_REPORT = '''
+------------------------------------------------------------------------------------------------
+| Design Timing Summary
+| ---------------------
+------------------------------------------------------------------------------------------------
+
+    WNS(ns)      TNS(ns)  TNS Failing Endpoints  TNS Total Endpoints      WHS(ns)      THS(ns)  THS Failing Endpoints  THS Total Endpoints     WPWS(ns)     TPWS(ns)  TPWS Failing Endpoints  TPWS Total Endpoints
+    -------      -------  ---------------------  -------------------      -------      -------  ---------------------  -------------------     --------     --------  ----------------------  --------------------
+     -0.412       -3.250                     12                 1571        0.054        0.000                      0                 1571        1.750        0.000                       0                   745
+
+
+Timing constraints are not met.
+'''
+
+
+class FakeFmaxSearch(fmax.FmaxSearch):
+    # Timing is met up to 237 MHz.
+    design = 'first'
+
+    def design_hash(self, frequency):
+        return self.design
+
+    def implement(self, frequency):
+        self.implemented.append(frequency)
+        return {'WNS': 237 - frequency, 'met': frequency <= 237}
+
+
+class StaleFmaxSearch(fmax.FmaxSearch):
+    # A project left with the timing report of an earlier implementation.
+
+    def make_project(self, frequency):
+        directory = self.project_directory(frequency)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'impl_timing.txt'), 'w') as f:
+            f.write(TIMING_REPORT)
+        return project.Project(directory,
+                               tasks_collection=config.default_tasks_collection)
+
+
+class TestFmax(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(config.testdir, 'testfmax')
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+
+    def test_get_timing(self):
+        with open(os.path.join(self.directory, 'impl_timing.txt'), 'w') as f:
+            f.write(TIMING_REPORT)
+        p = project.Project(self.directory,
+                            tasks_collection=config.default_tasks_collection)
+        timing = p.get_timing()
+        self.assertEqual(timing['WNS'], -0.412)
+        self.assertEqual(timing['TNS Failing Endpoints'], 12)
+        self.assertEqual(timing['WHS'], 0.054)
+        self.assertFalse(timing['met'])
+
+    def test_search(self):
+        def make_search():
+            s = FakeFmaxSearch(self.directory, the_builder=None, parameters={},
+                               n_parallel=3)
+            s.implemented = []
+            return s
+        s = make_search()
+        self.assertEqual(s.search(100, 400), 237)
+        self.assertEqual(len(s.implemented), len(set(s.implemented)))
+        # The timing of each frequency is cached.
+        s = make_search()
+        self.assertEqual(s.search(100, 400), 237)
+        self.assertEqual(s.implemented, [])
+        self.assertEqual(s.search(250, 300), None)
+        self.assertEqual(s.search(100, 200), 200)
+        # A changed design is implemented again.
+        s.design = 'second'
+        s.implemented = []
+        self.assertEqual(s.search(100, 200), 200)
+        self.assertEqual(sorted(s.implemented), [100, 200])
+
+    def test_failed_implementation(self):
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_fake_vivado(
+            self.directory, final_state='TIMED_OUT')
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        s = StaleFmaxSearch(self.directory, the_builder=None, parameters={})
+        # The old timing report isn't read when the implementation fails.
+        with self.assertRaises(Exception):
+            s.implement(200)
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
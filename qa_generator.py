@@ -0,0 +1,78 @@
+import unittest
+import os
+import shutil
+import logging
+
+from pyvivado import config, generator, builder, utils
+
+logger = logging.getLogger('pyvivado.test_generator')
+
+
+class EchoBuilder(generator.GeneratorBuilder):
+    # The output directories that the generator was run for.
+    generated = []
+    source_fn = None
+
+    def output_names(self):
+        return ['echo.v']
+
+    def source_filenames(self):
+        return [self.source_fn]
+
+    def generate(self, output_directory):
+        self.generated.append(output_directory)
+        if self.params['width'] < 0:
+            raise ValueError('Negative width.')
+        with open(self.source_fn, 'r') as f:
+            source = f.read()
+        with open(os.path.join(output_directory, 'echo.v'), 'w') as f:
+            f.write('{} {}'.format(source, self.params['width']))
+
+
+class TestGenerator(unittest.TestCase):
+
+    def test_generator_cache(self):
+        directory = os.path.join(config.testdir, 'testgeneratorcache')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        old_cachedir = config.cachedir
+        config.cachedir = os.path.join(directory, 'cache')
+        self.addCleanup(setattr, config, 'cachedir', old_cachedir)
+        EchoBuilder.source_fn = os.path.join(directory, 'echo.scala')
+        with open(EchoBuilder.source_fn, 'w') as f:
+            f.write('echo')
+        def build(width):
+            output_directory = os.path.join(directory, 'output')
+            builder.build_all(output_directory,
+                              top_builders=[EchoBuilder({'width': width})])
+            with open(os.path.join(output_directory, 'echo.v'), 'r') as f:
+                return f.read()
+        EchoBuilder.generated = []
+        self.assertEqual(build(3), 'echo 3')
+        self.assertEqual(build(3), 'echo 3')
+        self.assertEqual(len(EchoBuilder.generated), 1)
+        self.assertEqual(build(4), 'echo 4')
+        self.assertEqual(len(EchoBuilder.generated), 2)
+        # Changing the sources means generating again.
+        with open(EchoBuilder.source_fn, 'w') as f:
+            f.write('ECHO')
+        os.utime(EchoBuilder.source_fn, (0, 0))
+        self.assertEqual(build(3), 'ECHO 3')
+        self.assertEqual(len(EchoBuilder.generated), 3)
+        # Failures aren't cached.
+        for i in range(2):
+            with self.assertRaises(ValueError):
+                build(-1)
+        self.assertEqual(len(EchoBuilder.generated), 5)
+        self.assertEqual(len(os.listdir(os.path.join(config.cachedir, 'generated'))), 3)
+        # The outputs can be generated in memory.
+        files = utils.VirtualFiles()
+        builder.build_all(directory, top_builders=[EchoBuilder({'width': 4})],
+                          files=files)
+        self.assertEqual(files[os.path.join(directory, 'echo.v')], b'ECHO 4')
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
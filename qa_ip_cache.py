@@ -0,0 +1,85 @@
+import unittest
+import os
+import shutil
+import logging
+
+from pyvivado import config, ip_cache, project, task, test_utils
+
+logger = logging.getLogger('pyvivado.test_ip_cache')
+
+# Just enough of Vivado for ::pyvivado::create_ips to run in tclsh.
+# Creating an IP writes its XCI file and records the command.
+FAKE_VIVADO_COMMANDS = '''
+proc current_project {} { return project }
+proc version {args} { return 2015.1 }
+proc get_ips {name} { return $name }
+proc set_property {args} {}
+proc synth_ip {ip} {}
+proc generate_target {args} { ::log "generate_target $args" }
+proc add_files {args} { ::log "add_files [lindex $args end]" }
+proc get_property {name object} {
+    if {$name == "DIRECTORY"} { return [pwd] }
+    return [file join [pwd] TheProject.srcs sources_1 ip $object "${object}.xci"]
+}
+proc create_ip {args} {
+    set module_name [lindex $args end]
+    set ip_dir [file join [pwd] TheProject.srcs sources_1 ip $module_name]
+    file mkdir $ip_dir
+    set f [open [file join $ip_dir "${module_name}.xci"] w]
+    puts $f $args
+    close $f
+    ::log "create_ip $module_name"
+}
+proc ::log {message} {
+    set f [open [file join $::pyvivado_task_dir log.txt] a]
+    puts $f $message
+    close $f
+}
+'''
+
+
+class TestIPCache(unittest.TestCase):
+
+    def test_key(self):
+        ip = ('clk_wiz', (('PRIM_IN_FREQ', 200), ('CLKOUT1_FREQ', 100)), 'clk')
+        same_ip = ('clk_wiz', [('CLKOUT1_FREQ', '100'), ('PRIM_IN_FREQ', '200')], 'clk')
+        key = ip_cache.IPCache.key(ip, '', 'xc7')
+        self.assertEqual(key, ip_cache.IPCache.key(same_ip, '', 'xc7'))
+        self.assertNotEqual(key, ip_cache.IPCache.key(ip, '', 'xcku'))
+        self.assertNotEqual(key, ip_cache.IPCache.key(ip, '5.1', 'xc7'))
+
+    @unittest.skipUnless(shutil.which('tclsh'), 'Requires tclsh')
+    def test_create_ips(self):
+        directory = os.path.join(config.testdir, 'testipcache')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        old_vivado = config.vivado
+        old_ip_cachedir = config.ip_cachedir
+        config.vivado = test_utils.make_tclsh_vivado(directory)
+        config.ip_cachedir = os.path.join(directory, 'ips')
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        self.addCleanup(setattr, config, 'ip_cachedir', old_ip_cachedir)
+        ips = [('clk_wiz', (('PRIM_IN_FREQ', 200),), 'clk')]
+        command = FAKE_VIVADO_COMMANDS + '::pyvivado::create_ips {{{}}}'.format(
+            project.Project.tcl_ips(ips, part='xc7'))
+        logs = []
+        for i in range(2):
+            t = task.VivadoTask.create(
+                directory, command_text=command,
+                tasks_collection=config.default_tasks_collection)
+            t.run_and_wait(sleep_time=0.05)
+            with open(os.path.join(t.directory, 'log.txt'), 'r') as f:
+                logs.append(f.read().split('\n'))
+            self.assertTrue(os.path.exists(os.path.join(
+                t.directory, 'TheProject.srcs', 'sources_1', 'ip', 'clk', 'clk.xci')))
+        # The first project generates the IP and the second copies it.
+        self.assertEqual(logs[0][:2], ['create_ip clk', 'generate_target all clk'])
+        self.assertTrue(logs[1][0].startswith('add_files '))
+        self.assertTrue(ip_cache.IPCache().has(ips[0], '', 'xc7', '2015.1'))
+        self.assertFalse(ip_cache.IPCache().has(ips[0], '', 'xc7', '2016.1'))
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
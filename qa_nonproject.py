@@ -0,0 +1,115 @@
+import unittest
+import os
+import shutil
+import logging
+
+from pyvivado import config, builder, checkpoint_cache, nonproject, task, test_utils
+
+logger = logging.getLogger('pyvivado.test_nonproject')
+
+# Just enough of Vivado for the non-project flow to run in tclsh.
+# Checkpoints, bitstreams and reports are written with the name of the
+# top module and the commands are recorded.
+FAKE_VIVADO_COMMANDS = '''
+proc create_project {args} { ::log "create_project $args" }
+proc current_project {} { return project }
+proc set_property {args} {}
+proc read_vhdl {fn} { ::log "read_vhdl [file tail $fn]" }
+proc find_top {} { return leaf }
+proc synth_design {args} { set ::top [lindex $args 1]; ::log "synth_design $args" }
+proc open_checkpoint {fn} { set ::top leaf; ::log "open_checkpoint [file tail $fn]" }
+proc close_design {} {}
+proc current_design {} { return design }
+proc get_property {name object} { return $::top }
+foreach command {opt_design place_design phys_opt_design route_design} {
+    proc $command {} "::log $command"
+}
+proc ::write {fn} {
+    set f [open $fn w]
+    puts $f $::top
+    close $f
+}
+proc write_checkpoint {args} { ::write [lindex $args end] }
+proc write_bitstream {args} { ::write [lindex $args end] }
+foreach command {report_power report_utilization report_timing_summary report_clock_utilization} {
+    proc $command {args} { ::write [lindex $args 1] }
+}
+proc ::log {message} {
+    set f [open [file join $::pyvivado_task_dir log.txt] a]
+    puts $f $message
+    close $f
+}
+'''
+
+
+class LeafBuilder(builder.Builder):
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.simple_filenames = [params['filename']]
+
+
+class TestNonProject(unittest.TestCase):
+
+    def run_steps(self, p, steps):
+        t = task.VivadoTask.create_pipeline(
+            parent_directory=p.directory,
+            steps=[('fake', FAKE_VIVADO_COMMANDS)] + steps,
+            tasks_collection=p.tasks_collection)
+        t.run_and_wait(sleep_time=0.05, timeout=30)
+        self.assertEqual(t.get_errors(), [])
+        with open(os.path.join(t.directory, 'log.txt'), 'r') as f:
+            return f.read().strip().split('\n')
+
+    @unittest.skipUnless(shutil.which('tclsh'), 'Requires tclsh')
+    def test_build(self):
+        directory = os.path.join(config.testdir, 'testnonproject')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_tclsh_vivado(directory)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        leaf_fn = os.path.join(directory, 'leaf.vhd')
+        with open(leaf_fn, 'w') as f:
+            f.write('entity leaf')
+        build_directory = os.path.join(directory, 'build')
+        def create():
+            return nonproject.NonProject.create_or_update(
+                design_builders=[LeafBuilder({'filename': leaf_fn})],
+                parameters={'factory_name': 'leaf'},
+                directory=build_directory, part='xc7a35t',
+                tasks_collection=config.default_tasks_collection)
+        p = create()
+        steps = p.build_steps(implement=True, bitstream=True)
+        self.assertEqual([name for name, command in steps],
+                         ['nonproject_read', 'synthesize', 'implement',
+                          'impl_reports', 'bitstream'])
+        log = self.run_steps(p, steps)
+        self.assertEqual(log[:3], ['create_project -in_memory -part xc7a35t',
+                                   'read_vhdl leaf.vhd', 'synth_design -top leaf -flatten_hierarchy full'])
+        runs_directory = os.path.join(build_directory, 'TheProject.runs')
+        for fn in (os.path.join('synth_1', 'leaf.dcp'),
+                   os.path.join('impl_1', 'leaf_routed.dcp'),
+                   os.path.join('impl_1', 'leaf.bit')):
+            self.assertTrue(os.path.exists(os.path.join(runs_directory, fn)))
+        self.assertTrue(os.path.exists(p.utilization_file()))
+        # The checkpoints can be cached like those of a project.
+        cache = checkpoint_cache.CheckpointCache(checkpoint_cache.LocalDirectoryStore(
+            os.path.join(directory, 'cache')))
+        self.assertEqual(p.save_checkpoints(cache), ['synth', 'impl'])
+        # Built stages are opened from their checkpoints rather than built again.
+        steps = create().build_steps(implement=True)
+        self.assertEqual([name for name, command in steps], ['impl_reports'])
+        self.assertEqual(self.run_steps(p, steps), ['open_checkpoint leaf_routed.dcp'])
+        # Changing the design deletes the old outputs.
+        with open(leaf_fn, 'w') as f:
+            f.write('entity leaf is')
+        p = create()
+        self.assertEqual(p.built_stages(), [])
+        self.assertFalse(os.path.exists(p.utilization_file()))
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+import os
+import shutil
+import logging
+
+from pyvivado import config, project, builder, ooc, task, test_utils
+
+logger = logging.getLogger('pyvivado.test_ooc')
+
+# Just enough of a Vivado project for ::pyvivado::use_ooc_checkpoints to
+# run in tclsh.  The project starts with two sources.
+FAKE_VIVADO_COMMANDS = '''
+set ::files {/src/leaf.vhd /src/top.vhd}
+set ::unsynthesized {}
+proc ::log {message} {
+    set f [open [file join $::pyvivado_task_dir log.txt] a]
+    puts $f $message
+    close $f
+}
+proc ::state {} {
+    ::log "files: $::files"
+    ::log "unsynthesized: $::unsynthesized"
+}
+proc ::pyvivado::ensure_project_open {proj_dir} {}
+proc ::pyvivado::is_synthesized {} { return 0 }
+proc ::pyvivado::restored_checkpoint {run_name} { return "" }
+proc get_runs {name} { return $name }
+proc get_files {args} {
+    set found {}
+    foreach fn $::files {
+        foreach pattern [lindex $args end] {
+            if {[string match $pattern $fn]} {
+                lappend found $fn
+                break
+            }
+        }
+    }
+    return $found
+}
+proc add_files {args} { set ::files [concat $::files [lindex $args end]] }
+proc remove_files {fns} {
+    foreach fn $fns {
+        set i [lsearch -exact $::files $fn]
+        set ::files [lreplace $::files $i $i]
+    }
+}
+proc set_property {name value objects} {
+    if {$name != "USED_IN_SYNTHESIS"} { return }
+    foreach fn $objects {
+        set i [lsearch -exact $::unsynthesized $fn]
+        if {$i >= 0} { set ::unsynthesized [lreplace $::unsynthesized $i $i] }
+        if {!$value} { lappend ::unsynthesized $fn }
+    }
+}
+proc reset_run {name} { ::log "reset_run $name" }
+proc update_compile_order {args} {}
+proc launch_runs {name args} { ::log "launch_runs $name" }
+proc wait_on_run {name} {}
+'''
+
+
+class LeafBuilder(builder.Builder):
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.simple_filenames = [params['filename']]
+
+    def ooc_module(self):
+        return ('leaf', self.params.get('generics', {}))
+
+
+class TopBuilder(LeafBuilder):
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.builders = [LeafBuilder(params['leaf_params'])]
+
+
+class TestOOC(unittest.TestCase):
+
+    def test_synthesize(self):
+        directory = os.path.join(config.testdir, 'testooc')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_fake_vivado(directory)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        leaf_fn = os.path.join(directory, 'leaf.vhd')
+        with open(leaf_fn, 'w') as f:
+            f.write('entity leaf')
+        top_builder = TopBuilder({
+            'filename': os.path.join(directory, 'top.vhd'),
+            'leaf_params': {'filename': leaf_fn}})
+        graph = builder.BuilderGraph(top_builders=[top_builder])
+        modules = ooc.find_modules(graph, directory)
+        # Only leaf modules are synthesized out of context.
+        self.assertEqual([(m.module_name, m.generics, m.filenames) for m in modules],
+                         [('leaf', {}, [leaf_fn])])
+        # The stub of a module can't declare generics.
+        with self.assertRaises(ValueError):
+            ooc.find_modules(builder.BuilderGraph(top_builders=[
+                LeafBuilder({'filename': leaf_fn, 'generics': {'WIDTH': 4}})]),
+                directory)
+        project.Project.write_hash(directory, b'design')
+        project.Project.write_files_record(
+            directory, design_files=[leaf_fn], simulation_files=[], ips=[],
+            part='xc7', board='', top_module='')
+        p = project.Project(directory,
+                            tasks_collection=config.default_tasks_collection)
+        cache = ooc.OOCCache(os.path.join(directory, 'cache'))
+        def synthesize():
+            t = ooc.synthesize(p, [top_builder], cache=cache)
+            t.wait(sleep_time=0.05, timeout=30)
+            return [name for name, command in t.get_steps()]
+        self.assertEqual(synthesize(), ['ooc_leaf', 'ooc_link', 'synthesize'])
+        # Pretend that Vivado synthesized the module.
+        module_directory = cache.module_directory(modules[0], 'xc7')
+        os.makedirs(module_directory)
+        with open(os.path.join(module_directory, 'leaf.dcp'), 'w') as f:
+            f.write('checkpoint')
+        self.assertEqual(synthesize(), ['ooc_link', 'synthesize'])
+        # Changing the module means synthesizing it again.
+        with open(leaf_fn, 'w') as f:
+            f.write('entity leaf is')
+        self.assertFalse(cache.has(modules[0], 'xc7'))
+
+    @unittest.skipUnless(shutil.which('tclsh'), 'Requires tclsh')
+    def test_remove_checkpoints(self):
+        directory = os.path.join(config.testdir, 'testoocremove')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_tclsh_vivado(directory)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        modules = ooc.tcl_list(['{leaf} {/src/leaf.vhd} {/cache/key}'])
+        command = FAKE_VIVADO_COMMANDS + '''
+::pyvivado::use_ooc_checkpoints {{{directory}}} {{{modules}}}
+::state
+::pyvivado::use_ooc_checkpoints {{{directory}}} {{{modules}}}
+::pyvivado::open_and_synthesize {{{directory}}} {{}}
+::state
+'''.format(directory=directory, modules=modules)
+        t = task.VivadoTask.create(
+            directory, command_text=command,
+            tasks_collection=config.default_tasks_collection)
+        t.run_and_wait(sleep_time=0.05)
+        with open(os.path.join(t.directory, 'log.txt'), 'r') as f:
+            log = f.read().strip().split('\n')
+        self.assertEqual(log, [
+            'reset_run synth_1',
+            'files: /src/leaf.vhd /src/top.vhd /cache/key/leaf_stub.vhd /cache/key/leaf.dcp',
+            'unsynthesized: /src/leaf.vhd',
+            # Linking the same checkpoints again changes nothing.
+            # Synthesizing the usual way puts the sources back.
+            'reset_run synth_1',
+            'launch_runs synth_1',
+            'files: /src/leaf.vhd /src/top.vhd',
+            'unsynthesized:',
+        ])
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
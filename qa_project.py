@@ -3,14 +3,38 @@ import unittest
 import shutil
 import logging
 import time
+import re
+import json
+import stat
 
-from pyvivado import config, project, redis_connection
+from pyvivado import config, project, redis_connection, task, test_utils
 
 from pyvivado.hdl.test import testA
 from pyvivado.hdl.wrapper import inner_wrapper, file_testbench
 
 logger = logging.getLogger('pyvivado.test_project')
 
+# Just enough of Vivado for the bitstream step to run in tclsh.  The
+# commands are recorded in log.txt in the task directory.
+FAKE_VIVADO_COMMANDS = '''
+proc ::log {message} {
+    set f [open log.txt a]
+    puts $f $message
+    close $f
+}
+set ::projects {}
+proc get_projects {args} { return $::projects }
+proc open_project {fn} { set ::projects [list [file tail $fn]]; ::log "open_project [file tail $fn]" }
+proc get_runs {name} { return $name }
+proc get_property {name object} { return [pwd] }
+proc launch_runs {args} {
+    if {[llength $::projects] == 0} { error "No open project" }
+    ::log "launch_runs $args"
+}
+proc wait_on_run {name} {}
+source [lindex $argv 0]
+'''
+
 
 class TestProject(unittest.TestCase):
 
@@ -48,7 +72,215 @@ class TestProject(unittest.TestCase):
                 temp_directory=os.path.join(
                     config.testdir, 'test_hash_prediction_{}'.format(i)),
             )
-            self.assertEqual(h, b'\x02$\xfb\x94\xd8\xe7\xd9\x10\xee\xe3\x18\x0b\x8e\x18F&a\x84\xe3\xcc')
+            self.assertEqual(h, b'\xafM\xc6\xa6Bn\x84\xd8\x95\xde\x1d\x80\x90\xd4%\xe8\x1b\xc9\x932')
+            # Nothing is written to disk.
+            self.assertFalse(os.path.exists(os.path.join(
+                config.testdir, 'test_hash_prediction_{}'.format(i))))
+
+    def test_create_from_generated_files(self):
+        dn = os.path.join(config.testdir, 'proj_test_generated_files')
+        if os.path.exists(dn):
+            shutil.rmtree(dn)
+        os.makedirs(dn)
+        tasks_collection = config.default_tasks_collection
+        tasks_collection.drop()
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_fake_vivado(config.testdir)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        interface = testA.get_testA_interface({
+            'data_width': 3,
+            'array_length': 4,
+        })
+        parent_params = project.FileTestBenchProject.make_parent_params(
+            interface=interface, directory=dn,
+            tasks_collection=tasks_collection)
+        del parent_params['tasks_collection']
+        generated = project.BuilderProject.generate_files(
+            design_builders=parent_params['design_builders'],
+            simulation_builders=parent_params['simulation_builders'],
+            parameters=parent_params['parameters'],
+            directory=dn,
+        )
+        self.assertEqual(os.listdir(dn), [])
+        p = project.BuilderProject.create(
+            tasks_collection=tasks_collection, generated=generated,
+            **parent_params)
+        p.wait_for_most_recent_task(timeout=30)
+        for fn in generated['files']:
+            self.assertTrue(os.path.exists(fn))
+        # The hash of the files on disk matches the prediction.
+        h = project.BuilderProject.hash(
+            design_files=generated['design_files'],
+            simulation_files=generated['simulation_files'],
+            ips=generated['ips'])
+        self.assertEqual(h, project.BuilderProject.read_hash(dn))
+
+    def test_update(self):
+        dn = os.path.join(config.testdir, 'proj_test_update')
+        if os.path.exists(dn):
+            shutil.rmtree(dn)
+        os.makedirs(dn)
+        tasks_collection = config.default_tasks_collection
+        tasks_collection.drop()
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_fake_vivado(config.testdir)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+
+        def get_parent_params(data_width):
+            interface = testA.get_testA_interface({
+                'data_width': data_width,
+                'array_length': 4,
+            })
+            parent_params = project.FileTestBenchProject.make_parent_params(
+                interface=interface, directory=dn,
+                tasks_collection=tasks_collection)
+            return parent_params
+
+        p = project.BuilderProject.create(**get_parent_params(3))
+        p.wait_for_most_recent_task(timeout=30)
+        # The fake Vivado doesn't really create the project.
+        open(p.filename, 'w').close()
+        inner_wrapper_fn = os.path.join(dn, 'inner_wrapper.vhd')
+        definitions_fn = os.path.join(dn, 'testA_definitions.vhd')
+        mtime = os.stat(inner_wrapper_fn).st_mtime_ns
+        # Nothing has changed.
+        generated, t = project.BuilderProject.update_if_changed(
+            **get_parent_params(3))
+        self.assertEqual(t, None)
+        # Pretend that only the definitions file has changed.
+        record = project.BuilderProject.read_files_record(dn)
+        record['digests'][definitions_fn] = ''
+        with open(project.BuilderProject.files_record_fn(dn), 'w') as f:
+            json.dump(record, f)
+        project.BuilderProject.write_hash(dn, b'')
+        os.remove(definitions_fn)
+        generated, t = project.BuilderProject.update_if_changed(
+            **get_parent_params(3))
+        self.assertEqual(t.kind, 'update')
+        with open(os.path.join(t.directory, 'command.tcl'), 'r') as f:
+            command = f.read()
+        # The runs are reset.
+        self.assertTrue(re.search(r'update_vivado_project .* 1$', command, re.M))
+        project.BuilderProject.check_update(t)
+        self.assertTrue(os.path.exists(definitions_fn))
+        self.assertEqual(os.stat(inner_wrapper_fn).st_mtime_ns, mtime)
+        # Change the parameters but fail to update the project.
+        old_hash = project.BuilderProject.read_hash(dn)
+        config.vivado = test_utils.make_fake_vivado(
+            dn, final_state='FINISHED_ERROR', messages=['ERROR: broken'])
+        generated, t = project.BuilderProject.update_if_changed(
+            **get_parent_params(4))
+        with self.assertRaises(Exception):
+            project.BuilderProject.check_update(t)
+        self.assertEqual(project.BuilderProject.read_hash(dn), old_hash)
+        # The project is still out of date so it is updated again.
+        config.vivado = test_utils.make_fake_vivado(config.testdir)
+        generated, t = project.BuilderProject.update_if_changed(
+            **get_parent_params(4))
+        self.assertEqual(t.kind, 'update')
+        project.BuilderProject.check_update(t)
+        self.assertEqual(p.read_params()['data_width'], 4)
+        h = project.BuilderProject.predict_hash(
+            directory=dn, **dict((k, v) for k, v in get_parent_params(4).items()
+                                 if k in ('design_builders', 'simulation_builders',
+                                          'parameters')))
+        self.assertEqual(h, project.BuilderProject.read_hash(dn))
+        # A different top module means the project must be recreated.
+        with self.assertRaises(ValueError):
+            project.BuilderProject.update(
+                directory=dn, design_files=generated['design_files'],
+                simulation_files=generated['simulation_files'],
+                ips=generated['ips'], top_module='Other')
+
+    def test_task_lookup(self):
+        dn = os.path.join(config.testdir, 'proj_test_task_lookup')
+        if os.path.exists(dn):
+            shutil.rmtree(dn)
+        os.makedirs(dn)
+        tasks_collection = config.default_tasks_collection
+        tasks_collection.drop()
+        p = project.Project(dn, tasks_collection=tasks_collection)
+        kinds = ['create', 'synthesize', 'implement', 'synthesize', 'reports']
+        ts = [task.VivadoTask.create(dn, command_text='', kind=kind,
+                                     description='Task {}'.format(i),
+                                     tasks_collection=tasks_collection)
+              for i, kind in enumerate(kinds)]
+        ids = [t._id for t in ts]
+        self.assertEqual([t._id for t in p.get_tasks()], ids)
+        self.assertEqual([t._id for t in p.get_tasks(limit=2, offset=1)],
+                         ids[1:3])
+        self.assertEqual([t._id for t in p.get_tasks(newest_first=True, limit=2)],
+                         [ids[4], ids[3]])
+        self.assertEqual(p.get_most_recent_task()._id, ids[-1])
+        self.assertEqual(p.get_most_recent_task(kind='synthesize')._id, ids[3])
+        self.assertEqual(p.get_most_recent_task(description='Task 2')._id, ids[2])
+        with self.assertRaises(Exception):
+            p.get_most_recent_task(kind='simulate')
+        # Tasks in other directories are ignored.
+        other = project.Project(config.testdir, tasks_collection=tasks_collection)
+        self.assertEqual(other.get_tasks(), [])
+
+    def test_resume_pipeline(self):
+        dn = os.path.join(config.testdir, 'proj_test_resume_pipeline')
+        if os.path.exists(dn):
+            shutil.rmtree(dn)
+        os.makedirs(dn)
+        tasks_collection = config.default_tasks_collection
+        tasks_collection.drop()
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_fake_vivado(dn)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        p = project.Project(dn, tasks_collection=tasks_collection)
+        steps = [p.implement_step(bitstream=False), p.reports_step(),
+                 p.bitstream_step()]
+        t = task.VivadoTask.create_pipeline(
+            dn, steps=steps, tasks_collection=tasks_collection)
+        # Pretend that the task died after the first step.
+        with open(os.path.join(t.directory, 'steps.txt'), 'w') as f:
+            f.write('implement\n')
+        t.set_current_state('FINISHED_ERROR')
+        new_t = p.resume_pipeline(t)
+        self.assertEqual([name for name, command in new_t.get_steps()],
+                         ['impl_reports', 'bitstream'])
+        new_t.wait(sleep_time=0.05, timeout=30)
+        self.assertEqual(p.reconcile(), {})
+
+    @unittest.skipUnless(shutil.which('tclsh'), 'Requires tclsh')
+    def test_resume_bitstream(self):
+        dn = os.path.join(config.testdir, 'proj_test_resume_bitstream')
+        if os.path.exists(dn):
+            shutil.rmtree(dn)
+        os.makedirs(dn)
+        tasks_collection = config.default_tasks_collection
+        fake_fn = os.path.join(dn, 'fake_vivado.tcl')
+        with open(fake_fn, 'w') as f:
+            f.write(FAKE_VIVADO_COMMANDS)
+        vivado_fn = os.path.join(dn, 'fake_vivado')
+        with open(vivado_fn, 'w') as f:
+            f.write('#!/bin/sh\nexec tclsh "{}" "$4"\n'.format(fake_fn))
+        os.chmod(vivado_fn, os.stat(vivado_fn).st_mode | stat.S_IEXEC)
+        old_vivado = config.vivado
+        config.vivado = vivado_fn
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        p = project.Project(dn, tasks_collection=tasks_collection)
+        steps = [p.implement_step(bitstream=False), p.reports_step(),
+                 p.bitstream_step()]
+        t = task.VivadoTask.create_pipeline(
+            dn, steps=steps, tasks_collection=tasks_collection)
+        # Pretend that the task died before generating the bitstream.
+        with open(os.path.join(t.directory, 'steps.txt'), 'w') as f:
+            f.write('implement\nimpl_reports\n')
+        t.set_current_state('FINISHED_ERROR')
+        new_t = p.resume_pipeline(t)
+        self.assertEqual([name for name, command in new_t.get_steps()],
+                         ['bitstream'])
+        new_t.wait(sleep_time=0.05, timeout=30)
+        self.assertEqual(new_t.get_current_state(), 'FINISHED_OK')
+        # The new Vivado process opens the project itself.
+        with open(os.path.join(new_t.directory, 'log.txt'), 'r') as f:
+            self.assertEqual(f.read().strip().split('\n'), [
+                'open_project TheProject.xpr',
+                'launch_runs impl_1 -to_step write_bitstream -jobs 1'])
 
     def test_one(self):
         logger.debug('Running TestProject.test_one')
@@ -0,0 +1,183 @@
+import unittest
+import os
+import shutil
+import logging
+
+from pyvivado import config, project, reports
+
+logger = logging.getLogger('pyvivado.test_reports')
+
+UTILIZATION_REPORT = '''
+Copyright 1986-2015 Xilinx, Inc. All Rights Reserved.
+-------------------------------------------------------------------------------
+| Design       : top
+| Device       : 7a35tcsg324-1
+-------------------------------------------------------------------------------
+
+Utilization Design Information
+
+Table of Contents
+-----------------
+1. Utilization by Hierarchy
+
+1. Utilization by Hierarchy
+---------------------------
+
++------------+--------+------------+------------+-----+--------+--------------+
+|  Instance  | Module | Total LUTs | Logic LUTs | FFs | RAMB36 | DSP48 Blocks |
++------------+--------+------------+------------+-----+--------+--------------+
+| top        |  (top) |        120 |        110 | 200 |    0.5 |            2 |
+|   (top)    |  (top) |         20 |         20 |  50 |      0 |            0 |
+|   adder    |  adder |        100 |         90 | 150 |    0.5 |            2 |
+|     inner  |  inner |         60 |         60 | 100 |      0 |            2 |
++------------+--------+------------+------------+-----+--------+--------------+
+'''
+
+POWER_REPORT = '''
+1. Summary
+----------
+
++--------------------------+--------------+
+| Total On-Chip Power (W)  | 0.095        |
+| Design Power Budget (W)  | Unspecified* |
+| Junction Temperature (C) | 25.4         |
++--------------------------+--------------+
+
+
+1.1 On-Chip Components
+----------------------
+
++----------------+-----------+----------+-----------+-----------------+
+| On-Chip        | Power (W) | Used     | Available | Utilization (%) |
++----------------+-----------+----------+-----------+-----------------+
+| Clocks         |     0.002 |        3 |       --- |             --- |
+| Static Power   |     0.072 |          |           |                 |
+| Total          |     0.095 |          |           |                 |
++----------------+-----------+----------+-----------+-----------------+
+
+
+4.1 Hierarchy
+-------------
+
++--------+-----------+
+| Name   | Power (W) |
++--------+-----------+
+| top    |     0.023 |
+|   adder|     0.020 |
++--------+-----------+
+'''
+
+TIMING_REPORT = '''
+------------------------------------------------------------------------------------------------
+| Design Timing Summary
+| ---------------------
+------------------------------------------------------------------------------------------------
+
+    WNS(ns)      TNS(ns)  TNS Failing Endpoints  TNS Total Endpoints      WHS(ns)      THS(ns)  THS Failing Endpoints  THS Total Endpoints     WPWS(ns)     TPWS(ns)  TPWS Failing Endpoints  TPWS Total Endpoints
+    -------      -------  ---------------------  -------------------      -------      -------  ---------------------  -------------------     --------     --------  ----------------------  --------------------
+      1.234        0.000                      0                 1571        0.054        0.000                      0                 1571           NA           NA                      NA                    NA
+
+
+All user specified timing constraints are met.
+
+
+------------------------------------------------------------------------------------------------
+| Clock Summary
+| -------------
+------------------------------------------------------------------------------------------------
+
+Clock               Waveform(ns)       Period(ns)      Frequency(MHz)
+-----               ------------       ----------      --------------
+clk                 {0.000 5.000}      10.000          100.000
+  clk_out1_clk_wiz  {0.000 2.500}      5.000           200.000
+
+
+------------------------------------------------------------------------------------------------
+| Intra Clock Table
+| -----------------
+------------------------------------------------------------------------------------------------
+'''
+
+CLOCK_UTILIZATION_REPORT = '''
+1. Clock Primitive Utilization
+------------------------------
+
++-------+------+-----------+-----------+
+| Type  | Used | Available | Num Fixed |
++-------+------+-----------+-----------+
+| BUFG  |    2 |        32 |         0 |
+| MMCM  |    1 |         5 |         0 |
++-------+------+-----------+-----------+
+'''
+
+
+class TestReports(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(config.testdir, 'testreports')
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+
+    def test_parsers(self):
+        utilization = reports.parse_utilization(UTILIZATION_REPORT)
+        self.assertEqual(utilization['Total LUTs'], 120)
+        self.assertEqual(utilization['RAMB36'], 0.5)
+        self.assertEqual([c['Instance'] for c in utilization['children']],
+                         ['(top)', 'adder'])
+        self.assertEqual(reports.find_instance(utilization, 'inner')['FFs'], 100)
+        self.assertEqual(reports.find_instance(utilization, 'top/adder/inner')['FFs'], 100)
+        self.assertEqual(reports.find_instance(utilization, 'adder/missing'), None)
+        power = reports.parse_power(POWER_REPORT)
+        self.assertEqual(power['summary']['Total On-Chip Power (W)'], 0.095)
+        self.assertEqual(power['summary']['Design Power Budget (W)'], 'Unspecified*')
+        self.assertEqual(power['on_chip']['Static Power'], 0.072)
+        self.assertEqual(power['hierarchy'][0]['children'][0]['Name'], 'adder')
+        timing = reports.parse_timing(TIMING_REPORT)
+        self.assertEqual(timing['WNS'], 1.234)
+        self.assertEqual(timing['THS Total Endpoints'], 1571)
+        self.assertEqual(timing['WPWS'], None)
+        self.assertTrue(timing['met'])
+        self.assertEqual(timing['clocks']['clk_out1_clk_wiz']['Frequency'], 200)
+        clocks = reports.parse_clock_utilization(CLOCK_UTILIZATION_REPORT)
+        self.assertEqual(clocks['primitives']['BUFG']['Used'], 2)
+        self.assertEqual(clocks['tables']['Clock Primitive Utilization'][1]['Type'], 'MMCM')
+
+    def test_sidecar(self):
+        p = project.Project(self.directory,
+                            tasks_collection=config.default_tasks_collection)
+        # Reports are no longer generated when they are missing.
+        self.assertRaises(Exception, p.get_utilization)
+        fn = p.utilization_file()
+        with open(fn, 'w') as f:
+            f.write(UTILIZATION_REPORT)
+        parsed = []
+        old_parser = reports.PARSERS['utilization']
+        def parser(text):
+            parsed.append(text)
+            return old_parser(text)
+        reports.PARSERS['utilization'] = parser
+        self.addCleanup(reports.PARSERS.__setitem__, 'utilization', old_parser)
+        self.assertEqual(p.get_utilization(instance='adder')['Total LUTs'], 100)
+        self.assertEqual(p.get_utilization()['Total LUTs'], 120)
+        self.assertEqual(len(parsed), 1)
+        self.assertTrue(os.path.exists(reports.sidecar_filename(fn)))
+        self.assertEqual(p.diff_report('utilization'), None)
+        # Rewriting the same report doesn't parse it again.
+        with open(fn, 'w') as f:
+            f.write(UTILIZATION_REPORT)
+        os.utime(fn, ns=(0, 0))
+        p.get_utilization()
+        self.assertEqual(len(parsed), 1)
+        # A new run is compared with the previous one.
+        with open(fn, 'w') as f:
+            f.write(UTILIZATION_REPORT.replace('|         60 |', '|         70 |'))
+        self.assertEqual(p.get_utilization(instance='inner')['Total LUTs'], 70)
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual(p.diff_report('utilization'), {
+            'adder/inner/Total LUTs': {'old': 60, 'new': 70, 'change': 10}})
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import time
+import shutil
+import logging
+import subprocess
+
+from pyvivado import config, resources, task, test_utils
+
+logger = logging.getLogger('pyvivado.test_resources')
+
+
+class TestResources(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(config.testdir, 'testresources')
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+
+    def sleeper(self, seconds=30):
+        p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep({})'.format(seconds)])
+        def finish():
+            p.kill()
+            p.wait()
+        self.addCleanup(finish)
+        return p
+
+    def test_profile(self):
+        profile = resources.ResourceProfile(threads=4, jobs=3)
+        self.assertEqual(profile.cores(), 12)
+        self.assertEqual(profile.tcl(), '::pyvivado::use_resources 4 3')
+        self.assertEqual(resources.ResourceProfile.from_dict(profile.to_dict()).cores(), 12)
+        self.assertRaises(ValueError, resources.ResourceProfile, threads=0)
+
+    def test_budget(self):
+        budget = resources.CoreBudget(4, directory=self.directory)
+        first = self.sleeper()
+        budget.run('first', 3, lambda: first.pid)
+        self.assertEqual(budget.in_use(), 3)
+        second = self.sleeper()
+        self.assertRaises(TimeoutError, budget.run, 'second', 2, lambda: second.pid,
+                          sleep_time=0.05, timeout=0.2)
+        # A finished process (even one that hasn't been reaped) frees its cores.
+        first.kill()
+        time.sleep(0.2)
+        budget.run('second', 2, lambda: second.pid, sleep_time=0.05, timeout=5)
+        self.assertEqual(budget.in_use(), 2)
+        # A process that needs more than the budget runs on its own.
+        second.kill()
+        second.wait()
+        third = self.sleeper()
+        budget.run('third', 16, lambda: third.pid, sleep_time=0.05, timeout=5)
+        self.assertEqual(budget.in_use(), 4)
+
+    def test_task(self):
+        old_vivado = config.vivado
+        old_cachedir = config.cachedir
+        old_core_budget = config.core_budget
+        config.vivado = test_utils.make_fake_vivado(self.directory, run_time=0.5)
+        config.cachedir = self.directory
+        config.core_budget = 2
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        self.addCleanup(setattr, config, 'cachedir', old_cachedir)
+        self.addCleanup(setattr, config, 'core_budget', old_core_budget)
+        profile = resources.ResourceProfile(threads=2, jobs=1)
+        tasks = [task.VivadoTask.create(
+            self.directory, command_text='', profile=profile,
+            tasks_collection=config.default_tasks_collection) for i in range(2)]
+        self.assertEqual(tasks[0].get_profile().to_dict(), {'threads': 2, 'jobs': 1})
+        with open(os.path.join(tasks[0].directory, 'command.tcl'), 'r') as f:
+            self.assertTrue('::pyvivado::use_resources 2 1' in f.read())
+        start_time = time.time()
+        tasks[0].run()
+        # The second task waits for the cores the first is using.
+        tasks[1].run()
+        self.assertTrue(time.time() - start_time > 0.4)
+        self.assertTrue(tasks[0].is_finished())
+        tasks[1].wait(sleep_time=0.05)
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,189 @@
+import unittest
+import os
+import sys
+import time
+import shutil
+import logging
+import subprocess
+
+from pyvivado import config, resources, spool, sqlite_collection, task, test_utils
+
+logger = logging.getLogger('pyvivado.test_spool')
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(config.testdir, 'testspool')
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+        self.spool_directory = os.path.join(self.directory, 'spool')
+        old_task_spool = config.task_spool
+        config.task_spool = self.spool_directory
+        self.addCleanup(setattr, config, 'task_spool', old_task_spool)
+
+    def create_task(self):
+        return task.VivadoTask.create(
+            self.directory, command_text='',
+            tasks_collection=config.default_tasks_collection)
+
+    def start_worker(self, vivado, slots=1):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        p = subprocess.Popen(
+            [sys.executable, '-m', 'pyvivado.spool', self.spool_directory,
+             '--slots', str(slots), '--vivado', vivado, '--poll', '0.05',
+             '--idle-timeout', '30'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        def finish():
+            p.kill()
+            p.wait()
+        self.addCleanup(finish)
+        return p
+
+    def test_workers(self):
+        vivado = test_utils.make_fake_vivado(self.directory, run_time=0.5)
+        tasks = [self.create_task() for i in range(5)]
+        for t in tasks:
+            t.run()
+        self.assertEqual(tasks[0].reconcile(), 'queued')
+        self.assertEqual(len(spool.Spool(self.spool_directory).pending()), 5)
+        self.start_worker(vivado)
+        self.start_worker(vivado, slots=2)
+        for t in tasks:
+            t.wait(sleep_time=0.05, timeout=30)
+            self.assertEqual(t.get_current_state(), 'FINISHED_OK')
+            self.assertTrue(t.get_process_info() is not None)
+        # The workers remove the tasks once Vivado exits.
+        the_spool = spool.Spool(self.spool_directory)
+        end_time = time.time() + 10
+        while the_spool.running() and (time.time() < end_time):
+            time.sleep(0.05)
+        self.assertEqual(the_spool.running(), [])
+
+    def test_cancel(self):
+        vivado = test_utils.make_fake_vivado(self.directory, run_time=30)
+        queued = self.create_task()
+        running = self.create_task()
+        queued.run()
+        self.assertTrue(queued.cancel())
+        running.run()
+        self.start_worker(vivado)
+        while running.get_pid() is None:
+            time.sleep(0.05)
+        # The worker skipped the cancelled task.
+        self.assertEqual(queued.get_process_info(), None)
+        self.assertEqual(queued.get_current_state(), 'CANCELLED')
+        # A running task is killed by its worker.
+        self.assertRaises(TimeoutError, running.wait, sleep_time=0.05, timeout=0.5)
+        self.assertEqual(running.get_current_state(), 'TIMED_OUT')
+        pid = running.get_pid()
+        end_time = time.time() + 10
+        while task.process_exists(pid) and (time.time() < end_time):
+            time.sleep(0.05)
+        self.assertFalse(task.process_exists(pid))
+
+    def use_vivado(self, vivado):
+        old_vivado = config.vivado
+        config.vivado = vivado
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+
+    def stop_worker(self, worker):
+        def finish():
+            for directory, p in worker.running.values():
+                task.kill_process_group(p.pid, grace_period=0)
+                p.wait()
+        self.addCleanup(finish)
+
+    def test_lost_lease(self):
+        self.use_vivado(test_utils.make_fake_vivado(self.directory, run_time=30))
+        the_spool = spool.Spool(self.spool_directory)
+        worker = spool.Worker(the_spool)
+        self.stop_worker(worker)
+        t = self.create_task()
+        t.run()
+        worker.step()
+        self.assertEqual(len(worker.running), 1)
+        (key, (directory, p)), = worker.running.items()
+        # Another worker thinks the lease has expired.
+        self.assertEqual(the_spool.reap(0, 2, 'other'), [key])
+        worker.check()
+        self.assertEqual(worker.running, {})
+        self.assertNotEqual(p.poll(), None)
+        self.assertEqual(the_spool.pending(), [key])
+
+    def test_waiting_for_cores(self):
+        self.use_vivado(test_utils.make_fake_vivado(self.directory, run_time=0.5))
+        old_cachedir = config.cachedir
+        old_core_budget = config.core_budget
+        config.cachedir = self.directory
+        config.core_budget = 1
+        self.addCleanup(setattr, config, 'cachedir', old_cachedir)
+        self.addCleanup(setattr, config, 'core_budget', old_core_budget)
+        the_spool = spool.Spool(self.spool_directory)
+        worker = spool.Worker(the_spool, n_slots=2, poll_seconds=0.05)
+        self.stop_worker(worker)
+        profile = resources.ResourceProfile(threads=1, jobs=1)
+        tasks = [task.VivadoTask.create(
+            self.directory, command_text='', profile=profile,
+            tasks_collection=config.default_tasks_collection) for i in range(2)]
+        for t in tasks:
+            t.run()
+        # The second task waits for the core without blocking the worker.
+        worker.step()
+        self.assertEqual(len(worker.running), 1)
+        self.assertEqual(len(worker.waiting), 1)
+        key, = worker.waiting
+        os.utime(the_spool.running_fn(key), (0, 0))
+        worker.step()
+        self.assertNotEqual(os.stat(the_spool.running_fn(key)).st_mtime, 0)
+        worker.run(idle_timeout=0.1)
+        for t in tasks:
+            self.assertEqual(t.get_current_state(), 'FINISHED_OK')
+
+    def test_finished_before_requeue(self):
+        tasks_collection = sqlite_collection.SQLLiteCollection(
+            os.path.join(self.directory, 'tasks.db'))
+        t = task.VivadoTask.create(
+            self.directory, command_text='', tasks_collection=tasks_collection)
+        # Vivado on a worker doesn't write to the submitter's database.
+        with open(os.path.join(t.directory, 'command.tcl'), 'r') as f:
+            self.assertTrue('set ::pyvivado_tasks_db {}\n' in f.read())
+        t.run()
+        # The first attempt finished but its task was put back in the
+        # spool before its state file was written.
+        t.set_current_state('FINISHED_OK')
+        spool.write_file_state(t.directory, 'RUNNING')
+        the_spool = spool.Spool(self.spool_directory)
+        worker = spool.Worker(the_spool)
+        self.stop_worker(worker)
+        worker.step()
+        self.assertEqual(worker.running, {})
+        self.assertEqual(the_spool.pending(), [])
+        self.assertEqual(the_spool.running(), [])
+
+    def test_lease(self):
+        the_spool = spool.Spool(self.spool_directory)
+        t = self.create_task()
+        t.run()
+        # A worker claims the task and then goes away.
+        key, entry = the_spool.claim('lost')
+        self.assertEqual(entry['attempts'], 1)
+        self.assertEqual(the_spool.claim('other'), None)
+        self.assertEqual(the_spool.reap(10, 2, 'other'), [])
+        self.assertEqual(the_spool.reap(0, 2, 'other'), [key])
+        self.assertEqual(the_spool.pending(), [key])
+        # Once it has been tried twice the task fails.
+        key, entry = the_spool.claim('lost')
+        self.assertEqual(entry['attempts'], 2)
+        self.assertEqual(the_spool.reap(0, 2, 'other'), [key])
+        self.assertEqual(the_spool.pending(), [])
+        self.assertEqual(the_spool.running(), [])
+        self.assertEqual(t.get_current_state(), 'FINISHED_ERROR')
+        self.assertTrue(t.get_errors())
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
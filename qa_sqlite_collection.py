@@ -0,0 +1,105 @@
+import unittest
+import os
+import shutil
+import logging
+import sqlite3
+import threading
+import multiprocessing
+
+from pyvivado import config, sqlite_collection
+
+logger = logging.getLogger('pyvivado.test_sqlite_collection')
+
+
+def insert_records(fn, n_records, name):
+    collection = sqlite_collection.SQLLiteCollection(fn)
+    for i in range(n_records):
+        collection.insert({'parent_directory': name, 'state': 'NOT_STARTED'})
+
+
+class TestSQLLiteCollection(unittest.TestCase):
+
+    def make_fn(self, name):
+        directory = os.path.join(config.testdir, name)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        return os.path.join(directory, 'tasks.db')
+
+    def test_update_and_find(self):
+        collection = sqlite_collection.SQLLiteCollection(':memory:')
+        ids = collection.insert_many([
+            {'parent_directory': 'a', 'state': 'NOT_STARTED'},
+            {'parent_directory': 'a', 'state': 'NOT_STARTED'},
+            {'parent_directory': 'b', 'state': 'NOT_STARTED'},
+        ])
+        self.assertEqual(collection.count(), 3)
+        collection.update({'id': ids[1], 'state': 'RUNNING'})
+        self.assertEqual(collection.find_by_id(ids[1])['state'], 'RUNNING')
+        self.assertEqual(collection.find_by_id(ids[1])['parent_directory'], 'a')
+        running = collection.find(state='RUNNING')
+        self.assertEqual([r['id'] for r in running], [ids[1]])
+        self.assertEqual(len(collection.find(parent_directory='a',
+                                             state='NOT_STARTED')), 1)
+        with self.assertRaises(ValueError):
+            collection.update({'id': ids[0], 'bad_field': 1})
+        with self.assertRaises(ValueError):
+            collection.update({'id': 12345, 'state': 'RUNNING'})
+
+    def test_transaction_rollback(self):
+        collection = sqlite_collection.SQLLiteCollection(':memory:')
+        with self.assertRaises(ValueError):
+            with collection.transaction():
+                collection.insert({'parent_directory': 'a'})
+                raise ValueError('Stop')
+        self.assertEqual(collection.count(), 0)
+
+    def test_old_database(self):
+        fn = self.make_fn('testolddatabase')
+        conn = sqlite3.connect(fn)
+        conn.execute('''CREATE TABLE tasks (id INTEGER PRIMARY KEY,
+        parent_directory TEXT, directory TEXT, description TEXT, state TEXT)''')
+        conn.execute("INSERT INTO tasks VALUES (NULL, 'a', '', '', 'RUNNING')")
+        conn.commit()
+        conn.close()
+        collection = sqlite_collection.SQLLiteCollection(fn)
+        record = collection.find_by_id(1)
+        self.assertEqual(record['state'], 'RUNNING')
+        self.assertEqual(record['kind'], None)
+
+    def test_threads(self):
+        fn = self.make_fn('testthreads')
+        collection = sqlite_collection.SQLLiteCollection(fn)
+        n_threads = 8
+        n_records = 50
+        def insert(name):
+            for i in range(n_records):
+                collection.insert({'parent_directory': name})
+        threads = [threading.Thread(target=insert, args=(str(i),))
+                   for i in range(n_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(collection.count(), n_threads * n_records)
+        self.assertEqual(collection.count(parent_directory='3'), n_records)
+
+    def test_processes(self):
+        fn = self.make_fn('testprocesses')
+        collection = sqlite_collection.SQLLiteCollection(fn)
+        n_processes = 6
+        n_records = 50
+        processes = [multiprocessing.Process(
+            target=insert_records, args=(fn, n_records, str(i)))
+                     for i in range(n_processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(collection.count(), n_processes * n_records)
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import os
+import csv
+import shutil
+import logging
+
+from pyvivado import config, sweep, test_utils
+from pyvivado.hdl.test import testA
+
+logger = logging.getLogger('pyvivado.test_sweep')
+
+
+class FakeSweep(sweep.Sweep):
+    # The fake Vivado doesn't write reports.
+
+    def collect(self, p):
+        params = p.read_params()
+        if params['data_width'] == 5:
+            raise ValueError('Broken point.')
+        return {'utilization': {'LUT': params['data_width'] * params['array_length']}}
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_sweep(self):
+        directory = os.path.join(config.testdir, 'testsweep')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_fake_vivado(directory)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        points = sweep.grid_points({'data_width': [3, 4, 5], 'array_length': [2]})
+        self.assertEqual(points[0], {'array_length': 2, 'data_width': 3})
+        s = FakeSweep(os.path.join(directory, 'sweep'), testA.get_testA_interface,
+                      points, implement=False, n_parallel=3)
+        self.assertEqual(s.run(), 1)
+        rows = s.results.rows()
+        self.assertEqual(sorted(row['utilization.LUT'] for row in rows), [6, 8])
+        for row in rows:
+            self.assertTrue(row['seconds'] > 0)
+        # Only the failed point is run again.
+        self.assertEqual(s.todo(), [points[2]])
+        csv_fn = os.path.join(directory, 'sweep.csv')
+        s.results.to_csv(csv_fn)
+        with open(csv_fn, 'r') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 2)
+        s.results.close()
+        # A point whose Vivado task fails isn't recorded as done even if
+        # its results can be collected.
+        config.vivado = test_utils.make_fake_vivado(
+            directory, final_state='FINISHED_ERROR')
+        s = FakeSweep(os.path.join(directory, 'failing'), testA.get_testA_interface,
+                      points[:1], implement=False)
+        self.assertEqual(s.run(), 1)
+        self.assertEqual(s.todo(), points[:1])
+        s.results.close()
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
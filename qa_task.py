@@ -3,8 +3,12 @@ import os
 import shutil
 import logging
 import time
+import signal
+import socket
+import subprocess
+import sys
 
-from pyvivado import task, config
+from pyvivado import task, config, test_utils, sqlite_collection, retention
 
 logger = logging.getLogger('pyvivado.test_task')
 
@@ -24,6 +28,240 @@ class TestTask(unittest.TestCase):
         record = tasks_collection.find_by_id(t._id)
         self.assertEqual(record['parent_directory'], parent_directory)
 
+    def test_pipeline_steps(self):
+        parent_directory = os.path.join(config.testdir, 'testpipelinesteps')
+        if os.path.exists(parent_directory):
+            shutil.rmtree(parent_directory)
+        os.makedirs(parent_directory)
+        tasks_collection = config.default_tasks_collection
+        tasks_collection.drop()
+        steps = [('first', 'puts "first"'), ('second', 'puts "second"')]
+        t = task.VivadoTask.create_pipeline(
+            parent_directory, steps=steps, tasks_collection=tasks_collection)
+        self.assertEqual(t.get_steps(), steps)
+        self.assertEqual(t.get_finished_steps(), [])
+        with open(os.path.join(t.directory, 'command.tcl'), 'r') as f:
+            command = f.read()
+        self.assertTrue('::pyvivado::step_finished {first}' in command)
+        self.assertTrue(command.index('"first"') < command.index('"second"'))
+        # Pretend that Vivado finished the first step.
+        with open(os.path.join(t.directory, 'steps.txt'), 'w') as f:
+            f.write('first\n')
+        self.assertEqual(t.get_finished_steps(), ['first'])
+        t.wait_for_step('first', sleep_time=0)
+        with self.assertRaises(ValueError):
+            task.VivadoTask.create_pipeline(
+                parent_directory, steps=steps + [('first', '')],
+                tasks_collection=tasks_collection)
+
+    def make_fake_task(self, name, run_time):
+        parent_directory = os.path.join(config.testdir, name)
+        if os.path.exists(parent_directory):
+            shutil.rmtree(parent_directory)
+        os.makedirs(parent_directory)
+        tasks_collection = config.default_tasks_collection
+        tasks_collection.drop()
+        self.old_vivado = config.vivado
+        config.vivado = test_utils.make_fake_vivado(
+            parent_directory, run_time=run_time)
+        self.addCleanup(setattr, config, 'vivado', self.old_vivado)
+        t = task.VivadoTask.create(
+            parent_directory, command_text='',
+            tasks_collection=tasks_collection)
+        return t
+
+    def wait_for_child_pid(self, t):
+        fn = os.path.join(t.directory, 'child_pid.txt')
+        while not os.path.exists(fn):
+            time.sleep(0.05)
+        time.sleep(0.05)
+        with open(fn, 'r') as f:
+            return int(f.read())
+
+    def assertProcessGone(self, pid):
+        for i in range(50):
+            if not task.process_exists(pid):
+                break
+            time.sleep(0.1)
+        self.assertFalse(task.process_exists(pid))
+
+    def test_fake_task_finishes(self):
+        t = self.make_fake_task('testfaketask', run_time=0)
+        t.run_and_wait(sleep_time=0.05, timeout=30)
+        self.assertEqual(t.get_current_state(), 'FINISHED_OK')
+        self.assertFalse(t.cancel())
+
+    def test_cancel(self):
+        t = self.make_fake_task('testcancel', run_time=60)
+        t.run()
+        child_pid = self.wait_for_child_pid(t)
+        self.assertTrue(t.is_alive())
+        if os.path.exists('/proc'):
+            self.assertTrue(child_pid in task.process_descendants(t.get_pid()))
+        self.assertTrue(t.cancel())
+        self.assertTrue(t.is_finished())
+        self.assertEqual(t.get_current_state(), 'CANCELLED')
+        self.assertFalse(t.is_alive())
+        self.assertProcessGone(child_pid)
+
+    def test_timeout(self):
+        t = self.make_fake_task('testtimeout', run_time=60)
+        t.run()
+        child_pid = self.wait_for_child_pid(t)
+        with self.assertRaises(TimeoutError):
+            t.wait(sleep_time=0.05, timeout=0.2)
+        self.assertEqual(t.get_current_state(), 'TIMED_OUT')
+        # A fresh task object only knows the process ID.
+        t2 = task.VivadoTask(_id=t._id, tasks_collection=t.tasks_collection)
+        self.assertFalse(t2.is_alive())
+        self.assertProcessGone(child_pid)
+
+    def test_reconcile(self):
+        t = self.make_fake_task('testreconcile', run_time=60)
+        t.run()
+        self.wait_for_child_pid(t)
+        # Pretend the python process that started the task has gone.
+        t2 = task.VivadoTask(_id=t._id, tasks_collection=t.tasks_collection)
+        self.assertEqual(t2.get_process_info()['pid'], t.process.pid)
+        self.assertEqual(t2.reconcile(), 'alive')
+        task.kill_process_group(t2.get_pid())
+        t.process.wait()
+        self.assertEqual(t2.reconcile(), 'dead')
+        self.assertEqual(t2.get_current_state(), 'FINISHED_ERROR')
+        self.assertTrue(len(t2.get_errors()) > 0)
+        self.assertEqual(t2.reconcile(), 'finished')
+
+    def test_state_fallback(self):
+        t = self.make_fake_task('teststatefallback', run_time=0)
+        self.assertEqual(t.get_current_state(), 'NOT_STARTED')
+        # The fake task can only report its state in a file.
+        with open(t.current_state_fn(), 'w') as f:
+            f.write('FINISHED_OK')
+        self.assertTrue(t.is_finished())
+        self.assertEqual(t.tasks_collection.get_state(int(t._id)), 'FINISHED_OK')
+        # Finished tasks don't change state.
+        self.assertFalse(t.set_current_state('RUNNING'))
+        self.assertEqual([state for state, time in t.get_state_history()],
+                         ['NOT_STARTED', 'FINISHED_OK'])
+
+    @unittest.skipUnless(shutil.which('tclsh'), 'Requires tclsh')
+    def test_database_state(self):
+        parent_directory = os.path.join(config.testdir, 'testdatabasestate')
+        if os.path.exists(parent_directory):
+            shutil.rmtree(parent_directory)
+        os.makedirs(parent_directory)
+        tasks_collection = sqlite_collection.SQLLiteCollection(
+            os.path.join(parent_directory, 'tasks.db'))
+        old_vivado = config.vivado
+        config.vivado = test_utils.make_tclsh_vivado(parent_directory)
+        self.addCleanup(setattr, config, 'vivado', old_vivado)
+        t_ok = task.VivadoTask.create(
+            parent_directory, command_text='after 500',
+            tasks_collection=tasks_collection)
+        t_error = task.VivadoTask.create(
+            parent_directory, command_text='error "broken"',
+            tasks_collection=tasks_collection)
+        t_ok.run()
+        self.assertEqual(
+            [t._id for t in task.running_tasks(tasks_collection)], [t_ok._id])
+        t_ok.wait(sleep_time=0.05, timeout=30)
+        t_error.run()
+        with self.assertRaises(Exception):
+            t_error.wait(sleep_time=0.05, timeout=30)
+        self.assertEqual(t_ok.get_current_state(), 'FINISHED_OK')
+        self.assertEqual(t_error.get_current_state(), 'FINISHED_ERROR')
+        self.assertEqual([state for state, time in t_ok.get_state_history()],
+                         ['NOT_STARTED', 'RUNNING', 'FINISHED_OK'])
+        # Tcl wrote the state straight to the database.
+        for t in (t_ok, t_error):
+            self.assertFalse(os.path.exists(t.current_state_fn()))
+        self.assertEqual(task.running_tasks(tasks_collection), [])
+
+    def test_retention(self):
+        parent_directory = os.path.join(config.testdir, 'testretention')
+        if os.path.exists(parent_directory):
+            shutil.rmtree(parent_directory)
+        os.makedirs(parent_directory)
+        tasks_collection = config.default_tasks_collection
+        tasks_collection.drop()
+        tasks = []
+        for kind in ('simulate', 'simulate', 'simulate', 'synthesize'):
+            t = task.VivadoTask.create(
+                parent_directory, command_text='', kind=kind,
+                tasks_collection=tasks_collection)
+            with open(os.path.join(t.directory, 'stdout.txt'), 'w') as f:
+                f.write('ERROR: broken\n' * 1000)
+            tasks.append(t)
+        unfinished = tasks.pop()
+        for t in tasks:
+            t.set_current_state('FINISHED_ERROR')
+        policy = retention.RetentionPolicy(keep_last=1, compress='lzma')
+        summary = policy.apply(tasks + [unfinished])
+        self.assertEqual(summary['compressed'], [tasks[0]._id, tasks[1]._id])
+        self.assertEqual(summary['deleted'], [])
+        self.assertTrue(os.path.exists(
+            os.path.join(tasks[0].directory, 'stdout.txt.xz')))
+        self.assertEqual(len(tasks[0].get_errors()), 1000)
+        self.assertTrue(os.path.exists(
+            os.path.join(tasks[2].directory, 'stdout.txt')))
+        # Delete everything that isn't kept.
+        policy = retention.RetentionPolicy(keep_last=1, max_bytes=0)
+        summary = policy.apply(tasks + [unfinished])
+        self.assertEqual(summary['deleted'], [tasks[0]._id, tasks[1]._id])
+        policy = retention.RetentionPolicy(keep_last=0, max_age=60)
+        summary = policy.apply([tasks[2]], now=time.time() + 120)
+        self.assertEqual(summary['deleted'], [tasks[2]._id])
+        self.assertTrue(unfinished.has_directory())
+        # The database still knows about deleted tasks.
+        t = task.VivadoTask(_id=tasks[0]._id, tasks_collection=tasks_collection)
+        self.assertFalse(t.has_directory())
+        self.assertEqual(t.get_current_state(), 'FINISHED_ERROR')
+        self.assertEqual(t.get_stdout(), [])
+
+    def test_clean_stale_runs(self):
+        directory = os.path.join(config.testdir, 'testcleanstaleruns')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        runs = os.path.join(directory, 'TheProject.runs')
+        def make_run(run_name, markers, pid):
+            os.makedirs(os.path.join(runs, run_name), exist_ok=True)
+            for marker in markers:
+                with open(os.path.join(runs, run_name, marker), 'w') as f:
+                    f.write('<Process Host="{}" Pid="{}"/>'.format(
+                        socket.gethostname(), pid))
+        def make_runs(pid):
+            make_run('synth_1', ('.vivado.begin.rst', '.vivado.end.rst'), pid)
+            make_run('impl_1', ('.vivado.begin.rst',), pid)
+        def start_process():
+            p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+            def finish():
+                p.kill()
+                p.wait()
+            self.addCleanup(finish)
+            return p
+        run_process = start_process()
+        make_runs(run_process.pid)
+        # A run driven by a live process that isn't owned (e.g. by another
+        # task on the same project) is left alone.
+        self.assertEqual(task.clean_stale_runs(directory), [])
+        self.assertTrue(os.path.exists(os.path.join(runs, 'impl_1')))
+        self.assertEqual(run_process.poll(), None)
+        # Owned run processes are killed and their runs removed.  A
+        # concurrent run is not touched.
+        concurrent_process = start_process()
+        make_run('impl_2', ('.vivado.begin.rst',), concurrent_process.pid)
+        removed = task.clean_stale_runs(directory, owned_pids=set([run_process.pid]))
+        self.assertEqual(removed, ['impl_1'])
+        self.assertTrue(os.path.exists(os.path.join(runs, 'synth_1')))
+        self.assertFalse(os.path.exists(os.path.join(runs, 'impl_1')))
+        self.assertEqual(run_process.wait(timeout=10), -signal.SIGKILL)
+        self.assertTrue(os.path.exists(os.path.join(runs, 'impl_2')))
+        self.assertEqual(concurrent_process.poll(), None)
+        # Runs whose processes no longer exist are removed.
+        make_runs(run_process.pid)
+        self.assertEqual(task.clean_stale_runs(directory), ['impl_1'])
+        self.assertTrue(os.path.exists(os.path.join(runs, 'impl_2')))
+
     def test_error_catching(self):
         parent_directory = os.path.join(config.testdir, 'testerrorcatching')
         if os.path.exists(parent_directory):
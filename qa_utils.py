@@ -0,0 +1,137 @@
+import unittest
+import os
+import shutil
+import hashlib
+import logging
+
+from pyvivado import config, utils, builder
+from pyvivado.hdl.test import testA
+
+logger = logging.getLogger('pyvivado.test_utils')
+
+
+class CountingManifest(utils.FileDigestManifest):
+    # Don't worry about files changing within the same mtime tick.
+    RACY_INTERVAL = -1
+    hashed = []
+
+    @classmethod
+    def hash_file(cls, fn, size):
+        cls.hashed.append(fn)
+        return super().hash_file(fn, size)
+
+
+class TestUtils(unittest.TestCase):
+
+    def test_file_digest_manifest(self):
+        directory = os.path.join(config.testdir, 'testfiledigestmanifest')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        fns = []
+        for i, size in enumerate((0, 10, CountingManifest.MMAP_THRESHOLD + 1)):
+            fn = os.path.join(directory, 'file{}.txt'.format(i))
+            with open(fn, 'wb') as f:
+                f.write(b'a' * size)
+            fns.append(fn)
+        manifest_fn = os.path.join(directory, 'manifest.json')
+        manifest = CountingManifest(manifest_fn, n_threads=2)
+        h = utils.files_hash(fns, manifest=manifest)
+        self.assertEqual(sorted(CountingManifest.hashed), sorted(fns))
+        self.assertEqual(
+            manifest.digests(fns)[2],
+            hashlib.sha1(b'a' * (CountingManifest.MMAP_THRESHOLD + 1)).digest())
+        # A new manifest reads the digests from the file.
+        CountingManifest.hashed = []
+        manifest = CountingManifest(manifest_fn)
+        self.assertEqual(utils.files_hash(fns, manifest=manifest), h)
+        self.assertEqual(CountingManifest.hashed, [])
+        # Only changed files are hashed again.
+        with open(fns[1], 'wb') as f:
+            f.write(b'b' * 11)
+        self.assertNotEqual(utils.files_hash(fns, manifest=manifest), h)
+        self.assertEqual(CountingManifest.hashed, [fns[1]])
+        # Files that might still be changing aren't recorded.
+        racy_manifest = utils.FileDigestManifest()
+        racy_manifest.digests(fns)
+        self.assertEqual(racy_manifest.entries, {})
+        # The manifest is only written when something was hashed.
+        os.utime(manifest_fn, (0, 0))
+        manifest.digests(fns)
+        self.assertEqual(os.stat(manifest_fn).st_mtime, 0)
+        # Entries for deleted files are dropped.
+        os.remove(fns[0])
+        with open(fns[1], 'wb') as f:
+            f.write(b'c' * 12)
+        manifest.digests(fns[1:])
+        self.assertEqual(sorted(CountingManifest.read(manifest_fn)), sorted(fns[1:]))
+
+    def test_write_if_changed(self):
+        directory = os.path.join(config.testdir, 'testwriteifchanged')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        fn = os.path.join(directory, 'file.txt')
+        self.assertTrue(utils.write_if_changed(fn, 'first\n'))
+        os.utime(fn, (0, 0))
+        self.assertFalse(utils.write_if_changed(fn, 'first\n'))
+        self.assertEqual(os.stat(fn).st_mtime, 0)
+        self.assertTrue(utils.write_if_changed(fn, b'second\n'))
+        with open(fn, 'rb') as f:
+            self.assertEqual(f.read(), b'second\n')
+        self.assertEqual(os.listdir(directory), ['file.txt'])
+
+    def test_build_all_changed_filenames(self):
+        directory = os.path.join(config.testdir, 'testbuildallchanged')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        def build(data_width):
+            interface = testA.get_testA_interface({
+                'data_width': data_width,
+                'array_length': 4,
+            })
+            return builder.build_all(
+                directory, top_builders=[interface.builder])
+        requirements = build(3)
+        fns = requirements['changed_filenames']
+        self.assertTrue(len(fns) > 0)
+        for fn in fns:
+            self.assertTrue(os.path.exists(fn))
+        # Nothing has changed the second time round.
+        self.assertEqual(build(3)['changed_filenames'], set())
+        self.assertTrue(len(build(4)['changed_filenames']) > 0)
+
+    def test_format_file(self):
+        directory = os.path.join(config.testdir, 'testformatfile')
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+        template_fn = os.path.join(directory, 'thing.vhd.t')
+        output_fn = os.path.join(directory, 'thing.vhd')
+        with open(template_fn, 'w') as f:
+            f.write('width = {{width}}')
+        self.assertTrue(utils.format_file(template_fn, output_fn, {'width': 3}))
+        template = utils.get_template(template_fn)
+        # The compiled template is reused.
+        self.assertIs(utils.get_template(template_fn), template)
+        files = utils.VirtualFiles()
+        self.assertIsNone(
+            utils.format_file(template_fn, output_fn, {'width': 4}, files=files))
+        self.assertEqual(files[output_fn], 'width = 4')
+        # Changed templates are compiled again.
+        with open(template_fn, 'w') as f:
+            f.write('width := {{width}}')
+        os.utime(template_fn, (0, 0))
+        utils.format_file(template_fn, output_fn, {'width': 3})
+        with open(output_fn, 'r') as f:
+            self.assertEqual(f.read(), 'width := 3')
+        # Templates in the hdl directory can be found by name too.
+        self.assertIs(
+            utils.get_jinja_environment().get_template('definitions.vhd.t'),
+            utils.get_template(os.path.join(config.hdldir, 'definitions.vhd.t')))
+
+
+if __name__ == '__main__':
+    config.setup_logging(logging.DEBUG)
+    unittest.main()
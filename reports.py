@@ -0,0 +1,452 @@
+'''
+Parsing the utilization, power, timing and clock utilization reports that
+Vivado writes.
+
+Parsing a report gives a JSON-compatible structure that is saved in a
+sidecar file next to the report (the report filename with '.json'
+appended).  The sidecar records the modification time, size and SHA-256
+of the report it was parsed from so that a report is only parsed again
+when it changes.  When a report does change, the previous parsed result
+is kept in the sidecar so a run can be compared with the one before it.
+'''
+
+import os
+import re
+import json
+import hashlib
+import logging
+
+from pyvivado import utils
+
+logger = logging.getLogger(__name__)
+
+# Increment whenever the parsed structure changes so that old sidecars
+# are ignored.
+PARSER_VERSION = 1
+
+# The keys that hold the names of the nodes in hierarchical tables.
+NAME_KEYS = ('Instance', 'Name')
+
+
+def to_number(cell):
+    '''
+    Convert a table cell to an int or float if it is a number.  Other
+    cells are returned stripped.
+    '''
+    cell = cell.strip()
+    for convert in (int, float):
+        try:
+            return convert(cell)
+        except ValueError:
+            pass
+    return cell
+
+
+def parse_tables(text):
+    '''
+    Find the tables drawn with '+---+' borders in a report.
+
+    Returns a list of dictionaries with:
+        'title': The heading of the section the table is in (without its
+            number).
+        'header': The column names, or None if the table has no header
+            row.
+        'rows': A list of rows, each a list of the unstripped cells.
+    '''
+    tables = []
+    title = None
+    table_lines = []
+    previous_line = ''
+    for line in text.split('\n') + ['']:
+        stripped = line.strip()
+        if stripped.startswith('+') or (table_lines and stripped.startswith('|')):
+            table_lines.append(stripped)
+        else:
+            if table_lines:
+                tables.append(make_table(title, table_lines))
+                table_lines = []
+            # Section headings are underlined with dashes.
+            if (stripped and (set(stripped) == set('-')) and previous_line.strip()
+                    and previous_line.strip()[0] not in '|+-'):
+                title = re.sub(r'^[\d.]+\s*', '', previous_line.strip())
+        previous_line = line
+    return tables
+
+
+def make_table(title, lines):
+    header = None
+    rows = []
+    for index, line in enumerate(lines):
+        if line.startswith('|'):
+            cells = line.split('|')[1:-1]
+            # A row between the first two borders is the header.
+            if (index == 1) and (len(lines) > 2) and lines[2].startswith('+'):
+                header = [cell.strip() for cell in cells]
+            else:
+                rows.append(cells)
+    return {'title': title, 'header': header, 'rows': rows}
+
+
+def find_table(tables, first_column=None, title=None):
+    '''
+    Find the first table with a given first column name and/or title.
+    '''
+    for table in tables:
+        if (first_column is not None) and (
+                (table['header'] is None) or (table['header'][0] != first_column)):
+            continue
+        if (title is not None) and (table['title'] != title):
+            continue
+        return table
+    return None
+
+
+def build_tree(table):
+    '''
+    Build a tree from a table whose first column is indented to show the
+    hierarchy.
+
+    Returns a list of the root nodes.  Each node is a dictionary mapping
+    the column names to the values of its row along with 'children'.
+    '''
+    rows = table['rows']
+    if not rows:
+        return []
+    indents = [len(row[0]) - len(row[0].lstrip()) for row in rows]
+    base = min(indents)
+    roots = []
+    parents = []
+    for indent, row in zip(indents, rows):
+        level = (indent - base)//2
+        node = dict((name, to_number(cell))
+                    for name, cell in zip(table['header'], row))
+        node[table['header'][0]] = row[0].strip()
+        node['children'] = []
+        if level == 0:
+            roots.append(node)
+        else:
+            parents[level-1]['children'].append(node)
+        parents = parents[:level] + [node]
+    return roots
+
+
+def parse_utilization(text):
+    '''
+    Parse a hierarchical utilization report.
+
+    Returns the node of the top instance.  Each node has 'Instance',
+    'Module', 'children' and the number of each resource used (e.g.
+    'Total LUTs', 'FFs').
+    '''
+    table = find_table(parse_tables(text), first_column='Instance')
+    if table is None:
+        raise ValueError('No utilization by hierarchy table in report.')
+    roots = build_tree(table)
+    if len(roots) != 1:
+        raise ValueError('Expected a single top instance but found {}.'.format(
+            len(roots)))
+    return roots[0]
+
+
+def parse_power(text):
+    '''
+    Parse a power report.
+
+    Returns a dictionary with:
+        'summary': The values in the summary (e.g.
+            'Total On-Chip Power (W)').
+        'on_chip': The power (W) of each of the on-chip components
+            (e.g. 'Clocks', 'Static Power', 'Total').
+        'hierarchy': The tree of the power of each instance (if the report
+            has one).
+    '''
+    tables = parse_tables(text)
+    summary = {}
+    table = find_table(tables, title='Summary')
+    if table is not None:
+        for row in table['rows']:
+            if len(row) == 2:
+                summary[row[0].strip()] = to_number(row[1])
+    on_chip = {}
+    table = find_table(tables, first_column='On-Chip')
+    if table is not None:
+        for row in table['rows']:
+            on_chip[row[0].strip()] = to_number(row[1])
+    table = find_table(tables, first_column='Name', title='Hierarchy')
+    if table is not None:
+        hierarchy = build_tree(table)
+    else:
+        hierarchy = []
+    return {
+        'summary': summary,
+        'on_chip': on_chip,
+        'hierarchy': hierarchy,
+    }
+
+
+def parse_timing(text):
+    '''
+    Parse a timing summary report.
+
+    Returns a dictionary mapping the columns of the 'Design Timing
+    Summary' table with the units removed (e.g. 'WNS', 'TNS Failing
+    Endpoints') to their values along with:
+        'met': True if setup, hold and pulse width timing are all met.
+        'clocks': The 'Period' (ns) and 'Frequency' (MHz) of each clock.
+    Values of 'NA' (when nothing is constrained) are None.
+    '''
+    lines = text.split('\n')
+    summary_index = None
+    for index, line in enumerate(lines):
+        if line.strip('| ') == 'Design Timing Summary':
+            summary_index = index
+            break
+    if summary_index is None:
+        raise ValueError('No design timing summary in report.')
+    header_index = None
+    for index in range(summary_index, len(lines)):
+        if 'WNS(ns)' in lines[index]:
+            header_index = index
+            break
+    if (header_index is None) or (header_index + 2 >= len(lines)):
+        raise ValueError('No design timing summary in report.')
+    header = lines[header_index]
+    dashes = lines[header_index+1]
+    values = lines[header_index+2].split()
+    # The dashes underline each column name.
+    names = [header[m.start(): m.end()].strip()
+             for m in re.finditer('-+', dashes)]
+    if len(names) != len(values):
+        raise ValueError('Could not parse design timing summary.')
+    timing = {}
+    for name, value in zip(names, values):
+        name = name.replace('(ns)', '')
+        if value == 'NA':
+            value = None
+        else:
+            value = to_number(value)
+        timing[name] = value
+    timing['met'] = all(
+        (timing.get(name) is None) or (timing[name] >= 0)
+        for name in ('WNS', 'WHS', 'WPWS'))
+    clocks = {}
+    in_clocks = False
+    for line in lines:
+        if line.strip('| ') == 'Clock Summary':
+            in_clocks = True
+        elif in_clocks:
+            match = re.match(r'^\s*(\S+)\s+\{[^}]*\}\s+(\S+)\s+(\S+)\s*$', line)
+            if match:
+                clocks[match.group(1)] = {
+                    'Period': to_number(match.group(2)),
+                    'Frequency': to_number(match.group(3)),
+                }
+            elif clocks and line.startswith('---'):
+                # The start of the next section.
+                break
+    timing['clocks'] = clocks
+    return timing
+
+
+def parse_clock_utilization(text):
+    '''
+    Parse a clock utilization report.
+
+    Returns a dictionary with:
+        'primitives': The columns (e.g. 'Used', 'Available') of each
+            clock primitive type (e.g. 'BUFG', 'MMCM').
+        'tables': Every table with a header in the report, keyed by its
+            title, as a list of dictionaries mapping column names to
+            values.
+    '''
+    tables = parse_tables(text)
+    primitives = {}
+    table = find_table(tables, first_column='Type')
+    if table is not None:
+        for row in table['rows']:
+            primitives[row[0].strip()] = dict(
+                (name, to_number(cell))
+                for name, cell in zip(table['header'][1:], row[1:]))
+    titled = {}
+    for table in tables:
+        if (table['header'] is not None) and (table['title'] not in titled):
+            titled[table['title']] = [
+                dict((name, to_number(cell))
+                     for name, cell in zip(table['header'], row))
+                for row in table['rows']]
+    return {
+        'primitives': primitives,
+        'tables': titled,
+    }
+
+
+PARSERS = {
+    'utilization': parse_utilization,
+    'power': parse_power,
+    'timing': parse_timing,
+    'clock_utilization': parse_clock_utilization,
+}
+
+
+def sidecar_filename(fn):
+    return fn + '.json'
+
+
+def read_sidecar(fn, kind):
+    '''
+    Read the sidecar of a report, returning None if it doesn't exist or
+    was written for a different kind of report or parser version.
+    '''
+    sidecar_fn = sidecar_filename(fn)
+    if not os.path.exists(sidecar_fn):
+        return None
+    try:
+        with open(sidecar_fn, 'r') as f:
+            sidecar = json.load(f)
+    except ValueError:
+        logger.warning('Ignoring corrupt sidecar {}.'.format(sidecar_fn))
+        return None
+    if (sidecar.get('kind') != kind) or (sidecar.get('version') != PARSER_VERSION):
+        return None
+    return sidecar
+
+
+def load(fn, kind):
+    '''
+    Get the parsed contents of a report, only parsing it if its sidecar
+    is missing or out of date.
+
+    Args:
+        `fn`: The filename of the report.
+        `kind`: The kind of report (a key of `PARSERS`).
+    '''
+    st = os.stat(fn)
+    sidecar = read_sidecar(fn, kind)
+    if ((sidecar is not None) and (sidecar['mtime'] == st.st_mtime_ns)
+            and (sidecar['size'] == st.st_size)):
+        return sidecar['data']
+    with open(fn, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if (sidecar is not None) and (sidecar['sha256'] == digest):
+        # Rewritten with the same contents.
+        data = sidecar['data']
+        previous = sidecar['previous']
+    else:
+        logger.debug('Parsing {}.'.format(fn))
+        data = PARSERS[kind](content.decode('utf-8', errors='replace'))
+        if sidecar is not None:
+            previous = sidecar['data']
+        else:
+            previous = None
+    utils.write_file(sidecar_filename(fn), json.dumps({
+        'kind': kind,
+        'version': PARSER_VERSION,
+        'mtime': st.st_mtime_ns,
+        'size': st.st_size,
+        'sha256': digest,
+        'data': data,
+        'previous': previous,
+    }, sort_keys=True))
+    return data
+
+
+def load_previous(fn, kind):
+    '''
+    Get the parsed contents of the report before it was last changed (or
+    None if it hasn't changed since it was first parsed).
+    '''
+    load(fn, kind)
+    return read_sidecar(fn, kind)['previous']
+
+
+def find_instance(node, instance):
+    '''
+    Find an instance in a hierarchical report.
+
+    Args:
+        `node`: The root node (e.g. from `parse_utilization`).
+        `instance`: Either a path of instance names separated by '/'
+            (starting with the root or one of its children) or the name
+            of a single instance which is searched for anywhere in the
+            hierarchy.
+
+    Returns the node or None if it isn't found.
+    '''
+    def name(n):
+        for key in NAME_KEYS:
+            if key in n:
+                return n[key]
+    if '/' in instance:
+        names = instance.strip('/').split('/')
+        if names[0] == name(node):
+            names = names[1:]
+        for child_name in names:
+            matches = [child for child in node['children']
+                       if name(child) == child_name]
+            if not matches:
+                return None
+            node = matches[0]
+        return node
+    nodes = [node]
+    while nodes:
+        n = nodes.pop(0)
+        if name(n) == instance:
+            return n
+        nodes += n['children']
+    return None
+
+
+def flatten(data, prefix=''):
+    '''
+    Flatten a parsed report into a dictionary mapping '/' separated paths
+    to values.  The children of hierarchical nodes are keyed by their
+    names.
+    '''
+    flat = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in NAME_KEYS:
+                continue
+            if key == 'children':
+                flat.update(flatten(value, prefix))
+            else:
+                flat.update(flatten(value, prefix + key + '/'))
+    elif isinstance(data, list):
+        for index, item in enumerate(data):
+            item_name = str(index)
+            if isinstance(item, dict):
+                for key in NAME_KEYS:
+                    if key in item:
+                        item_name = item[key]
+                        break
+            flat.update(flatten(item, prefix + item_name + '/'))
+    else:
+        flat[prefix.rstrip('/')] = data
+    return flat
+
+
+def diff(old, new):
+    '''
+    Compare two parsed reports of the same kind.
+
+    Returns a dictionary mapping the paths (see `flatten`) of the values
+    that differ to a dictionary with the 'old' and 'new' values (None if
+    missing) and the 'change' if both are numbers.
+    '''
+    old = flatten(old)
+    new = flatten(new)
+    differences = {}
+    for path in sorted(set(old) | set(new)):
+        old_value = old.get(path, None)
+        new_value = new.get(path, None)
+        if old_value == new_value:
+            continue
+        numbers = all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                      for v in (old_value, new_value))
+        differences[path] = {
+            'old': old_value,
+            'new': new_value,
+            'change': (new_value - old_value) if numbers else None,
+        }
+    return differences
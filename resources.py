@@ -0,0 +1,206 @@
+'''
+How many cores Vivado processes use.
+
+A `ResourceProfile` sets how many threads a Vivado process uses and how
+many runs (synthesis, implementation and the out of context runs of IP
+blocks) `launch_runs` starts at once.  Every Vivado task has one (the
+default comes from `config.vivado_threads` and `config.vivado_jobs`).
+
+If `config.core_budget` is set then tasks on the same host share that
+many cores.  A task is only started when the cores its profile needs are
+free, so several projects run at once don't oversubscribe the machine.
+The cores in use are recorded in a file in `config.cachedir` (one per
+host) that is guarded by a file lock so the budget is shared between
+python processes.
+'''
+
+import os
+import json
+import time
+import socket
+import logging
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from pyvivado import config, task, utils
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceProfile(object):
+    '''
+    The threads and parallel runs a Vivado task may use.
+    '''
+
+    def __init__(self, threads=None, jobs=None):
+        '''
+        Args:
+            `threads`: The maximum number of threads each Vivado process
+                uses (general.maxThreads).  Defaults to
+                `config.vivado_threads`.
+            `jobs`: How many runs `launch_runs` runs at once.  Defaults to
+                `config.vivado_jobs`.
+        '''
+        if threads is None:
+            threads = config.vivado_threads
+        if jobs is None:
+            jobs = config.vivado_jobs
+        if (threads < 1) or (jobs < 1):
+            raise ValueError('A resource profile needs at least one thread and one job.')
+        self.threads = threads
+        self.jobs = jobs
+
+    def cores(self):
+        '''
+        The number of cores the task can keep busy.  Each of the runs
+        launched at once is a Vivado process of its own.
+        '''
+        return self.threads * self.jobs
+
+    def to_dict(self):
+        return {'threads': self.threads, 'jobs': self.jobs}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(threads=d['threads'], jobs=d['jobs'])
+
+    def tcl(self):
+        '''
+        The TCL command that applies the profile to a Vivado process.
+        '''
+        return '::pyvivado::use_resources {} {}'.format(self.threads, self.jobs)
+
+
+def process_running(pid, start_time):
+    '''
+    Whether a process is still running (not a zombie and its ID hasn't
+    been reused since it started at `start_time`).
+    '''
+    if not task.process_exists(pid):
+        return False
+    try:
+        with open('/proc/{}/stat'.format(pid), 'r') as f:
+            state = f.read().rsplit(')', 1)[1].split()[0]
+    except OSError:
+        state = None
+    if state == 'Z':
+        return False
+    started = task.process_start_time(pid)
+    return (started is None) or (abs(started - start_time) < 5)
+
+
+class CoreBudget(object):
+    '''
+    The cores shared by the Vivado tasks on this host.
+    '''
+
+    def __init__(self, cores, directory=None):
+        '''
+        Args:
+            `cores`: How many cores the tasks can use between them.
+            `directory`: Where the record of the cores in use is kept.
+                Defaults to `config.cachedir`.
+        '''
+        if fcntl is None:
+            raise ValueError('A core budget requires fcntl file locks.')
+        if directory is None:
+            directory = config.cachedir
+        os.makedirs(directory, exist_ok=True)
+        self.cores = cores
+        self.fn = os.path.join(directory, 'cores_{}.json'.format(
+            socket.gethostname()))
+        self.lock_fn = self.fn + '.lock'
+
+    @contextlib.contextmanager
+    def locked(self):
+        with open(self.lock_fn, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_claims(self):
+        '''
+        Get the claims of the tasks that are still running as a
+        dictionary mapping the task keys to their 'pid', 'start_time' and
+        'cores'.  Must be called with the lock held.
+        '''
+        if os.path.exists(self.fn):
+            with open(self.fn, 'r') as f:
+                claims = json.load(f)
+        else:
+            claims = {}
+        return dict((key, claim) for key, claim in claims.items()
+                    if process_running(claim['pid'], claim['start_time']))
+
+    def in_use(self):
+        '''
+        How many cores are claimed by running tasks.
+        '''
+        with self.locked():
+            claims = self.read_claims()
+        return sum(claim['cores'] for claim in claims.values())
+
+    def try_run(self, key, cores, spawn):
+        '''
+        Start a process if enough cores are free (see `run`).
+
+        Returns the process ID or None if the cores aren't free.
+        '''
+        cores = min(cores, self.cores)
+        with self.locked():
+            claims = self.read_claims()
+            in_use = sum(claim['cores'] for claim in claims.values())
+            if in_use + cores > self.cores:
+                return None
+            pid = spawn()
+            claims[key] = {'pid': pid, 'start_time': time.time(),
+                           'cores': cores}
+            utils.write_file(self.fn, json.dumps(claims, sort_keys=True))
+        return pid
+
+    def run(self, key, cores, spawn, sleep_time=1, timeout=None):
+        '''
+        Wait until enough cores are free and then start a process.  The
+        cores are claimed until the process finishes.
+
+        Args:
+            `key`: Identifies the claim (e.g. the task directory).
+            `cores`: How many cores the process needs.  A process that
+                needs more than the whole budget runs on its own.
+            `spawn`: A function that starts the process and returns its
+                process ID.
+            `sleep_time`: How often to check for free cores (seconds).
+            `timeout`: Raise a `TimeoutError` if the cores aren't free
+                after this many seconds.
+
+        Returns the process ID.
+        '''
+        start_time = time.time()
+        waiting = False
+        while True:
+            pid = self.try_run(key, cores, spawn)
+            if pid is not None:
+                return pid
+            if (timeout is not None) and (time.time() - start_time > timeout):
+                raise TimeoutError('{} cores were not free after {}s.'.format(
+                    cores, timeout))
+            if not waiting:
+                logger.info('Waiting for {} cores ({} of {} in use).'.format(
+                    min(cores, self.cores), self.in_use(), self.cores))
+                waiting = True
+            time.sleep(sleep_time)
+
+
+def get_core_budget():
+    '''
+    The `CoreBudget` set by `config.core_budget` (or None).
+    '''
+    if config.core_budget is None:
+        return None
+    return CoreBudget(config.core_budget)
@@ -0,0 +1,105 @@
+'''
+Clearing out the directories of old tasks.
+
+Every task gets its own directory holding its command, its logs and
+anything else it wrote (e.g. simulation files).  Long-lived projects
+collect a lot of these so a `RetentionPolicy` can be applied to compress
+or delete the old ones.  The tasks stay in the tasks database.
+'''
+
+import time
+import logging
+
+from pyvivado import task
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy(object):
+    '''
+    Decides which task directories are kept, which have their logs
+    compressed and which are deleted.
+
+    Only finished tasks are touched.  The most recent `keep_last`
+    finished tasks of each kind are always left alone.
+    '''
+
+    def __init__(self, keep_last=5, compress='gzip', max_age=None,
+                 max_bytes=None):
+        '''
+        Args:
+            `keep_last`: How many finished tasks of each kind to leave
+                untouched.
+            `compress`: How to compress the logs of older tasks ('gzip',
+                'lzma' or None to leave them uncompressed).
+            `max_age`: Older task directories are deleted once the task
+                finished more than this many seconds ago.
+            `max_bytes`: If the task directories use more than this many
+                bytes then the oldest of the older task directories are
+                deleted until they don't.
+        '''
+        if (compress is not None) and (compress not in task.COMPRESSORS):
+            raise ValueError('Unknown compression method {}.'.format(compress))
+        self.keep_last = keep_last
+        self.compress = compress
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+
+    def apply(self, tasks, now=None):
+        '''
+        Apply the policy to some tasks (usually all the tasks in a project).
+
+        Args:
+            `tasks`: A list of `Task`s.
+            `now`: The time to measure ages from (defaults to the current time).
+
+        Returns a dictionary with the IDs of the tasks that were
+        'compressed' and 'deleted' and the number of 'bytes_freed'.
+        '''
+        if now is None:
+            now = time.time()
+        summary = {'compressed': [], 'deleted': [], 'bytes_freed': 0}
+        finished = [t for t in tasks if t.is_finished() and t.has_directory()]
+        # Oldest first.
+        finished.sort(key=lambda t: int(t._id))
+        by_kind = {}
+        for t in finished:
+            by_kind.setdefault(t.kind or '', []).append(t)
+        kept = set()
+        for kind_tasks in by_kind.values():
+            if self.keep_last > 0:
+                kept |= set(t._id for t in kind_tasks[-self.keep_last:])
+        old = [t for t in finished if t._id not in kept]
+        sizes = {}
+        for t in old:
+            if self.compress is not None:
+                summary['bytes_freed'] += t.compress_logs(method=self.compress)
+                summary['compressed'].append(t._id)
+            sizes[t._id] = t.disk_usage()
+        remaining = []
+        for t in old:
+            finish_time = t.finish_time()
+            if (self.max_age is not None) and (finish_time is not None) and (
+                    now - finish_time > self.max_age):
+                self.delete(t, sizes[t._id], summary)
+            else:
+                remaining.append(t)
+        if self.max_bytes is not None:
+            total = sum(t.disk_usage() for t in finished
+                        if t._id in kept) + sum(
+                            sizes[t._id] for t in remaining)
+            for t in remaining:
+                if total <= self.max_bytes:
+                    break
+                self.delete(t, sizes[t._id], summary)
+                total -= sizes[t._id]
+        logger.info('Retention policy compressed {} and deleted {} task directories freeing {} bytes.'.format(
+            len(summary['compressed']), len(summary['deleted']),
+            summary['bytes_freed']))
+        return summary
+
+    @staticmethod
+    def delete(t, size, summary):
+        t.delete_directory()
+        summary['deleted'].append(t._id)
+        summary['bytes_freed'] += size
@@ -65,6 +65,13 @@ class SignalType(object):
             conversion_name = name
         self.conversion_name = conversion_name
 
+    def canonical_form(self):
+        '''
+        Signal types are identified by their class and attributes
+        (see `utils.canonical`).
+        '''
+        return (self.__class__, vars(self))
+
     def typ(self):
         '''
         A string in VHDL that defines a signal of this type
@@ -659,7 +666,8 @@ def std_logic_vector_to_signed_integer(d):
             i -= powered
     return i
 
-def make_defs_file(filename, package_name, signal_types, contained_signal_types):
+def make_defs_file(filename, package_name, signal_types, contained_signal_types,
+                   files=None):
     '''
     Makes a package of definitions so you don't have to.
     TODO: I haven't been using this recently so it probably needs better
@@ -671,6 +679,8 @@ def make_defs_file(filename, package_name, signal_types, contained_signal_types)
         `signal_type`: A list of signal types to define in the package.
         `contained_signal_types`: A list of signa types which
             we will make unnamed arrays of.
+        `files`: A `utils.VirtualFiles` to put the file in rather than
+            writing it to disk.
     '''
     defs = []
     imps = []
@@ -688,7 +698,7 @@ def make_defs_file(filename, package_name, signal_types, contained_signal_types)
         'implementations': imps,
         'package_name': package_name,
     }
-    utils.format_file(template_fn, filename, template_params)
+    utils.format_file(template_fn, filename, template_params, files=files)
     
 def sint_to_uint(sint, width):
     '''
@@ -0,0 +1,380 @@
+'''
+Running Vivado tasks on other machines through a spool directory on
+shared storage.
+
+If `config.task_spool` is set then `VivadoTask.run` doesn't start Vivado.
+Instead it adds the task to the spool and a `Worker` (on any host that
+can see the spool and the project directories) claims it, runs it and
+removes it once it has finished.  Tasks are waited on and read in the
+usual way since everything a task writes is in its directory.
+
+The spool holds one small JSON entry per task:
+    pending/<key>.json: Tasks waiting for a worker.  Keys sort in the
+        order the tasks were submitted.
+    running/<key>.json: Tasks claimed by a worker.  A worker claims a
+        task by renaming its entry, which only one worker can do.  The
+        modification time of the entry is the worker's lease, which it
+        renews while the task runs.  If a worker stops renewing its lease
+        (e.g. its host went down) another worker puts the task back in
+        pending, or finishes it with FINISHED_ERROR once it has been
+        tried `max_attempts` times.
+
+Start a worker with:
+    python -m pyvivado.spool <spool directory> --slots 4
+
+Spooled tasks record their state in their current_state.txt rather than
+the tasks database, which may not be safe to share over the network.
+`Task.get_current_state` reads it back into the database.  Workers use
+their own Vivado (`--vivado`), python and copy of the pyvivado TCL files.
+'''
+
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import argparse
+
+from pyvivado import config, resources, sqlite_collection, task, utils
+
+logger = logging.getLogger(__name__)
+
+# Written in the task directory of a task that was added to a spool.
+QUEUED_FN = 'queued.json'
+# Written in the task directory to ask the worker to stop the task.  It
+# holds the state the task was cancelled with.
+CANCEL_FN = 'cancel.txt'
+
+
+def read_file_state(directory):
+    '''
+    Get the state a task recorded in its current_state.txt (or None).
+    '''
+    fn = os.path.join(directory, 'current_state.txt')
+    if not os.path.exists(fn):
+        return None
+    with open(fn, 'r') as f:
+        return f.read().strip()
+
+
+def write_file_state(directory, state):
+    utils.write_file(os.path.join(directory, 'current_state.txt'), state)
+
+
+def task_state(entry):
+    '''
+    Get the state of a spooled task from its spool entry.
+
+    The task's state in the tasks database (see `Task.get_current_state`)
+    is used if the database is a file on this host.  Otherwise only the
+    state the task recorded in its current_state.txt can be seen.
+    '''
+    tasks_db = entry.get('tasks_db')
+    if tasks_db and (entry.get('host') == socket.gethostname()) and (
+            os.path.exists(tasks_db)):
+        t = task.VivadoTask(
+            _id=entry['task_id'],
+            tasks_collection=sqlite_collection.SQLLiteCollection(tasks_db))
+        return t.get_current_state()
+    return read_file_state(entry['directory'])
+
+
+class Spool(object):
+    '''
+    A directory of tasks waiting to be run or being run by workers.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pending_directory = os.path.join(directory, 'pending')
+        self.running_directory = os.path.join(directory, 'running')
+        for d in (self.pending_directory, self.running_directory):
+            os.makedirs(d, exist_ok=True)
+
+    def submit(self, t):
+        '''
+        Add a `task.VivadoTask` to the spool.  Returns its key.
+        '''
+        key = '{:.6f}-{}'.format(time.time(), uuid.uuid4().hex[:8])
+        utils.write_file(os.path.join(t.directory, QUEUED_FN), json.dumps(
+            {'spool': self.directory, 'key': key}))
+        utils.write_file(self.pending_fn(key), json.dumps({
+            'directory': t.directory,
+            'task_id': t._id,
+            'tasks_db': task.tasks_db_fn(t.tasks_collection),
+            'host': socket.gethostname(),
+            'submit_time': time.time(),
+            'attempts': 0,
+        }))
+        logger.debug('Queued task {} as {}.'.format(t._id, key))
+        return key
+
+    def pending_fn(self, key):
+        return os.path.join(self.pending_directory, key + '.json')
+
+    def running_fn(self, key):
+        return os.path.join(self.running_directory, key + '.json')
+
+    @staticmethod
+    def keys(directory):
+        return sorted(fn[:-len('.json')] for fn in os.listdir(directory)
+                      if fn.endswith('.json'))
+
+    def pending(self):
+        return self.keys(self.pending_directory)
+
+    def running(self):
+        return self.keys(self.running_directory)
+
+    @staticmethod
+    def read_entry(fn):
+        try:
+            with open(fn, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Gone or not written yet.
+            return None
+
+    def claim(self, worker_id):
+        '''
+        Claim the oldest pending task.
+
+        Returns (key, entry) or None if there are no pending tasks.
+        '''
+        for key in self.pending():
+            try:
+                # Renaming keeps the modification time so start the lease
+                # first.  Otherwise the entry could be reaped straight away.
+                os.utime(self.pending_fn(key))
+                os.rename(self.pending_fn(key), self.running_fn(key))
+            except OSError:
+                # Another worker claimed it first.
+                continue
+            entry = self.read_entry(self.running_fn(key))
+            if entry is None:
+                # Reaped already.
+                continue
+            entry['worker'] = worker_id
+            entry['attempts'] += 1
+            utils.write_file(self.running_fn(key), json.dumps(entry))
+            return key, entry
+        return None
+
+    def renew(self, key):
+        '''
+        Renew the lease on a running task.
+
+        Returns False if the lease was lost (i.e. another worker reaped
+        the task).
+        '''
+        try:
+            os.utime(self.running_fn(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def finish(self, key):
+        '''
+        Remove a task that has finished from the spool.
+        '''
+        try:
+            os.remove(self.running_fn(key))
+        except FileNotFoundError:
+            pass
+
+    def reap(self, lease_seconds, max_attempts, worker_id):
+        '''
+        Deal with running tasks whose lease has expired.  They are put
+        back in pending or, if they have been tried `max_attempts` times,
+        recorded as FINISHED_ERROR.
+
+        Returns the keys of the tasks that were reaped.
+        '''
+        reaped = []
+        now = time.time()
+        for key in self.running():
+            fn = self.running_fn(key)
+            try:
+                if now - os.stat(fn).st_mtime < lease_seconds:
+                    continue
+                # Only one worker can rename it.
+                reaped_fn = '{}.reaped.{}'.format(fn, worker_id)
+                os.rename(fn, reaped_fn)
+            except OSError:
+                continue
+            entry = self.read_entry(reaped_fn)
+            message = 'Lost the lease on task in {} (worker {}).'.format(
+                entry['directory'], entry.get('worker'))
+            logger.warning(message)
+            if entry['attempts'] >= max_attempts:
+                with open(os.path.join(entry['directory'], 'stderr.txt'), 'a') as f:
+                    f.write('ERROR: {}\n'.format(message))
+                write_file_state(entry['directory'], 'FINISHED_ERROR')
+            else:
+                utils.write_file(self.pending_fn(key), json.dumps(entry))
+            os.remove(reaped_fn)
+            reaped.append(key)
+        return reaped
+
+
+class Worker(object):
+    '''
+    Claims tasks from a spool and runs them.
+    '''
+
+    def __init__(self, spool, n_slots=1, lease_seconds=60, poll_seconds=1,
+                 max_attempts=2):
+        '''
+        Args:
+            `spool`: The `Spool`.
+            `n_slots`: How many tasks to run at once.
+            `lease_seconds`: How long a lease on a task lasts without
+                being renewed.  Leases are renewed every `poll_seconds`.
+            `poll_seconds`: How often to check for tasks.
+            `max_attempts`: How many times a task is tried before it is
+                given up on if workers keep losing their leases.
+        '''
+        self.spool = spool
+        self.n_slots = n_slots
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = '{}-{}'.format(socket.gethostname(), os.getpid())
+        # Maps keys to (task directory, `Popen`) for the tasks running.
+        self.running = {}
+        # Maps keys to spool entries for the tasks claimed but waiting for
+        # cores (see `config.core_budget`).
+        self.waiting = {}
+
+    def start(self, key, entry):
+        '''
+        Start a claimed task unless it was cancelled while it was queued
+        or it already finished (e.g. before a lost lease put it back in
+        the spool).  If the cores the task needs aren't free it waits for
+        them without blocking the worker.
+        '''
+        self.waiting.pop(key, None)
+        directory = entry['directory']
+        if is_cancelled(directory) or (
+                task_state(entry) in task.Task.FINISHED_STATES):
+            logger.info('Skipping finished task in {}.'.format(directory))
+            self.spool.finish(key)
+            return
+        def spawn():
+            logger.info('Running task in {}.'.format(directory))
+            p = task.start_vivado(directory)
+            task.write_process_info(directory, p.pid)
+            self.running[key] = (directory, p)
+            return p.pid
+        budget = resources.get_core_budget()
+        if budget is None:
+            spawn()
+            return
+        profile_fn = os.path.join(directory, 'profile.json')
+        if os.path.exists(profile_fn):
+            with open(profile_fn, 'r') as f:
+                profile = resources.ResourceProfile.from_dict(json.load(f))
+        else:
+            profile = resources.ResourceProfile()
+        if budget.try_run(directory, profile.cores(), spawn) is None:
+            self.waiting[key] = entry
+
+    def check(self):
+        '''
+        Renew the leases of the claimed tasks, kill any that have been
+        cancelled and remove those that have finished from the spool.
+
+        A task whose lease was lost (e.g. because this worker was too slow
+        to renew it) has been handed to another worker, so it is stopped.
+        '''
+        for key, entry in list(self.waiting.items()):
+            if not self.spool.renew(key):
+                logger.warning('Lost the lease on task in {}.'.format(
+                    entry['directory']))
+                del self.waiting[key]
+        for key, (directory, p) in list(self.running.items()):
+            returncode = p.poll()
+            if returncode is None:
+                if not self.spool.renew(key):
+                    logger.warning('Lost the lease on task in {}.  Killing it.'.format(
+                        directory))
+                    task.kill_process_group(p.pid)
+                    p.wait()
+                    del self.running[key]
+                elif is_cancelled(directory):
+                    logger.info('Killing cancelled task in {}.'.format(directory))
+                    task.kill_process_group(p.pid)
+                    p.wait()
+                continue
+            if read_file_state(directory) not in task.Task.FINISHED_STATES:
+                # Vivado normally records its final state in the database
+                # before it exits, in which case this is ignored.  If it
+                # died before it could then the task failed.
+                write_file_state(directory, 'FINISHED_ERROR')
+            self.spool.finish(key)
+            del self.running[key]
+
+    def step(self):
+        '''
+        Check on the running tasks and start new ones in any free slots.
+        '''
+        self.check()
+        self.spool.reap(self.lease_seconds, self.max_attempts, self.worker_id)
+        for key, entry in list(self.waiting.items()):
+            self.start(key, entry)
+        while len(self.running) + len(self.waiting) < self.n_slots:
+            claimed = self.spool.claim(self.worker_id)
+            if claimed is None:
+                break
+            key, entry = claimed
+            self.start(key, entry)
+
+    def run(self, idle_timeout=None):
+        '''
+        Run tasks until there has been nothing to do for `idle_timeout`
+        seconds (or forever if it is None).
+        '''
+        logger.info('Worker {} serving {}.'.format(self.worker_id, self.spool.directory))
+        idle_since = time.time()
+        while True:
+            self.step()
+            if self.running or self.waiting or self.spool.pending():
+                idle_since = time.time()
+            elif (idle_timeout is not None) and (time.time() - idle_since > idle_timeout):
+                break
+            time.sleep(self.poll_seconds)
+
+
+def cancel(directory, state='CANCELLED'):
+    '''
+    Ask the worker running a queued task to stop it (or a worker not to
+    start it).
+    '''
+    utils.write_file(os.path.join(directory, CANCEL_FN), state)
+
+
+def is_cancelled(directory):
+    return os.path.exists(os.path.join(directory, CANCEL_FN))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run Vivado tasks from a spool directory.')
+    parser.add_argument('spool', help='The spool directory.')
+    parser.add_argument('--slots', type=int, default=1, help='How many tasks to run at once.')
+    parser.add_argument('--lease', type=float, default=60, help='Lease length (seconds).')
+    parser.add_argument('--poll', type=float, default=1, help='Polling period (seconds).')
+    parser.add_argument('--idle-timeout', type=float, default=None,
+                        help='Exit after this many seconds with nothing to do.')
+    parser.add_argument('--vivado', default=None, help='The Vivado executable.')
+    args = parser.parse_args(args)
+    if args.vivado is not None:
+        config.vivado = args.vivado
+    config.setup_logging(logging.INFO)
+    worker = Worker(Spool(args.spool), n_slots=args.slots,
+                    lease_seconds=args.lease, poll_seconds=args.poll)
+    worker.run(idle_timeout=args.idle_timeout)
+
+
+if __name__ == '__main__':
+    main()
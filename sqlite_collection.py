@@ -1,86 +1,380 @@
+import os
 import sqlite3
+import time
+import threading
+import contextlib
 
 class SQLLiteCollection(object):
     '''
-    Wraps a SQLLite database where we write information about 
+    Wraps a SQLLite database where we write information about
     tasks (Vivado processes).  This doesn't get used that much but it feels
     like it could be very useful for automating things down the road.
+
+    The database can be shared by many threads and processes.  Each thread
+    (and each process) gets its own connection, the database uses
+    write-ahead logging so that readers don't block writers, and
+    connections wait for locks rather than failing immediately.
+    Several writes can be grouped into a single transaction with
+    `transaction`.
     '''
 
     COMPULSORY_FIELDS = set(['parent_directory'])
-    OPTIONAL_FIELDS = set(['directory', 'description', 'state'])
+    OPTIONAL_FIELDS = set(['directory', 'description', 'state', 'kind'])
+    # The columns in the order that they are returned.
+    FIELDS = ('id', 'parent_directory', 'directory', 'description', 'state',
+              'kind')
 
-    def __init__(self, fn):
-        self.conn = sqlite3.connect(fn)
-        self.cur = self.conn.cursor()
-        sql = '''
+    def __init__(self, fn, timeout=60, wal=True):
+        '''
+        Args:
+            `fn`: The database filename (or ':memory:').
+            `timeout`: How many seconds to wait for a lock on the database
+                before giving up.
+            `wal`: Whether to use write-ahead logging.  This doesn't work
+                on network filesystems.
+        '''
+        self.fn = fn
+        self.timeout = timeout
+        self.wal = wal
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        # An in-memory database only exists inside a single connection
+        # so every thread must share that connection.
+        self.in_memory = (fn == ':memory:')
+        self.memory_lock = threading.RLock()
+        if self.in_memory:
+            self.memory_conn = self.connect()
+        with self.transaction() as cur:
+            cur.execute('''
 CREATE TABLE IF NOT EXISTS tasks
 (
 id INTEGER PRIMARY KEY,
 parent_directory TEXT,
 directory TEXT,
 description TEXT,
-state TEXT
-);'''
-        self.cur.execute(sql)
+state TEXT,
+kind TEXT
+);''')
+            # Databases created by older versions don't have all the columns.
+            cur.execute('PRAGMA table_info(tasks)')
+            columns = [row[1] for row in cur.fetchall()]
+            for field in self.FIELDS:
+                if field not in columns:
+                    cur.execute(
+                        'ALTER TABLE tasks ADD COLUMN {} TEXT'.format(field))
+            # Tasks are almost always looked up by project or by state.
+            cur.execute(
+                'CREATE INDEX IF NOT EXISTS tasks_parent_directory '
+                'ON tasks (parent_directory, id)')
+            cur.execute(
+                'CREATE INDEX IF NOT EXISTS tasks_parent_directory_kind '
+                'ON tasks (parent_directory, kind, id)')
+            cur.execute(
+                'CREATE INDEX IF NOT EXISTS tasks_parent_directory_description '
+                'ON tasks (parent_directory, description, id)')
+            cur.execute(
+                'CREATE INDEX IF NOT EXISTS tasks_state '
+                'ON tasks (state, parent_directory)')
+            # Every change of state is recorded along with when it happened.
+            cur.execute('''
+CREATE TABLE IF NOT EXISTS state_history
+(
+id INTEGER PRIMARY KEY,
+task_id INTEGER,
+state TEXT,
+time REAL
+);''')
+            cur.execute(
+                'CREATE INDEX IF NOT EXISTS state_history_task_id '
+                'ON state_history (task_id, id)')
+
+    def connect(self):
+        '''
+        Open a new connection to the database.
+        '''
+        # We manage transactions ourselves.
+        conn = sqlite3.connect(self.fn, timeout=self.timeout,
+                               isolation_level=None,
+                               check_same_thread=not self.in_memory)
+        conn.execute('PRAGMA busy_timeout = {}'.format(int(self.timeout*1000)))
+        if self.wal and not self.in_memory:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+        with self.connections_lock:
+            self.connections.append(conn)
+        return conn
+
+    @property
+    def conn(self):
+        '''
+        The connection for this thread.
+        '''
+        if self.in_memory:
+            return self.memory_conn
+        # Connections must not be shared with forked processes.
+        if getattr(self.local, 'pid', None) != os.getpid():
+            self.local.conn = self.connect()
+            self.local.pid = os.getpid()
+            self.local.depth = 0
+        return self.local.conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        A context manager that groups all the database operations inside
+        it into one transaction which is committed at the end (or rolled
+        back if there is an exception).  Transactions can be nested, only
+        the outermost one commits.
+
+        Yields a cursor.
+        '''
+        with self.memory_lock if self.in_memory else contextlib.nullcontext():
+            conn = self.conn
+            depth = getattr(self.local, 'depth', 0)
+            cur = conn.cursor()
+            if depth == 0:
+                # Take the write lock now rather than failing to upgrade
+                # a read lock later.
+                cur.execute('BEGIN IMMEDIATE')
+            self.local.depth = depth + 1
+            try:
+                yield cur
+            except BaseException:
+                # Roll back on interrupts too so the connection isn't left
+                # inside a transaction.
+                self.local.depth = depth
+                if depth == 0:
+                    cur.execute('ROLLBACK')
+                raise
+            self.local.depth = depth
+            if depth == 0:
+                cur.execute('COMMIT')
+
+    def query(self, sql, values=()):
+        '''
+        Run a read-only query and return all the rows.
+        '''
+        with self.memory_lock if self.in_memory else contextlib.nullcontext():
+            cur = self.conn.execute(sql, values)
+            rows = cur.fetchall()
+        return rows
+
+    def close(self):
+        '''
+        Close all the connections to the database.
+        '''
+        with self.connections_lock:
+            for conn in self.connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Connections belonging to other threads.
+                    pass
+            self.connections = []
+        self.local = threading.local()
 
     def __del__(self):
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        if hasattr(self, 'connections'):
+            self.close()
 
-    def insert(self, record):
+    def check_keys(self, record):
         for key in record.keys():
             if key not in (self.COMPULSORY_FIELDS | self.OPTIONAL_FIELDS):
-                raise ValueError('Unknown attribute: {}'.format(key))
+                if key not in ('id', '_id'):
+                    raise ValueError('Unknown attribute: {}'.format(key))
+
+    def insert(self, record):
+        self.check_keys(record)
         for opfield in self.OPTIONAL_FIELDS:
             if opfield not in record:
                 record[opfield] = ''
-        self.cur.execute(
-            'INSERT INTO tasks VALUES (?, ?, ?, ?, ?)',
-            [None, record['parent_directory'], record['directory'],
-             record['description'], record['state']],
-        )
-        self.conn.commit()
-        new_id = self.cur.lastrowid
+        labels = self.FIELDS[1:]
+        with self.transaction() as cur:
+            cur.execute(
+                'INSERT INTO tasks ({}) VALUES ({})'.format(
+                    ', '.join(labels), ', '.join(['?']*len(labels))),
+                [record[label] for label in labels],
+            )
+            new_id = cur.lastrowid
+            if record['state']:
+                cur.execute(
+                    'INSERT INTO state_history (task_id, state, time) '
+                    'VALUES (?, ?, ?)', (new_id, record['state'], time.time()))
         record['id'] = new_id
         return new_id
 
+    def insert_many(self, records):
+        '''
+        Insert several records in a single transaction.
+        Returns their new IDs.
+        '''
+        with self.transaction():
+            ids = [self.insert(record) for record in records]
+        return ids
+
     def update(self, record):
-        labels = []
+        '''
+        Update the fields of an existing record.  The record must contain
+        its 'id' and the fields to change.
+        '''
+        self.check_keys(record)
+        _id = record.get('id', record.get('_id', None))
+        if _id is None:
+            raise ValueError('Cannot update a record without an id.')
+        labels = [key for key in record.keys() if key not in ('id', '_id')]
+        if not labels:
+            return
+        sql = 'UPDATE tasks SET {} WHERE id = ?'.format(
+            ', '.join(['{} = ?'.format(label) for label in labels]))
+        with self.transaction() as cur:
+            cur.execute(sql, [record[label] for label in labels] + [_id])
+            if cur.rowcount == 0:
+                raise ValueError('No record with id {}'.format(_id))
+
+    def set_state(self, _id, state, final_states=()):
+        '''
+        Change the state of a task and record the change in its history.
+        Nothing happens if the task already has that state or if it is
+        in one of the `final_states` (so that a task that has finished
+        can't be marked as running by a late update).
+
+        Returns True if the state was changed.
+        '''
+        final_states = list(final_states)
+        sql = 'UPDATE tasks SET state = ? WHERE id = ? AND state IS NOT ?'
+        if final_states:
+            sql += ' AND state NOT IN ({})'.format(
+                ', '.join(['?']*len(final_states)))
+        with self.transaction() as cur:
+            cur.execute(sql, [state, _id, state] + final_states)
+            changed = (cur.rowcount > 0)
+            if changed:
+                cur.execute(
+                    'INSERT INTO state_history (task_id, state, time) '
+                    'VALUES (?, ?, ?)', (_id, state, time.time()))
+        return changed
+
+    def get_state(self, _id):
+        rows = self.query('SELECT state FROM tasks WHERE id = ?', (_id,))
+        if not rows:
+            raise ValueError('No record with id {}'.format(_id))
+        return rows[0][0]
+
+    def get_state_history(self, _id):
+        '''
+        Get a list of the (state, time) tuples that a task has passed
+        through.  Times are seconds since the epoch.
+        '''
+        rows = self.query(
+            'SELECT state, time FROM state_history WHERE task_id = ? '
+            'ORDER BY id', (_id,))
+        return [tuple(row) for row in rows]
+
+    def record_from_row(self, row):
+        return dict(zip(self.FIELDS, row))
+
+    def find_by_id(self, _id):
+        rows = self.query(
+            'SELECT {} FROM tasks WHERE id = ?'.format(', '.join(self.FIELDS)),
+            (_id,))
+        record = self.record_from_row(rows[0])
+        return record
+
+    def find(self, limit=None, offset=0, newest_first=False, **conditions):
+        '''
+        Get the records that match all the conditions (e.g. state='RUNNING')
+        ordered by when they were created.  A condition can also be a list
+        of acceptable values (e.g. state=['NOT_STARTED', 'RUNNING']).
+
+        Args:
+            `limit`: The maximum number of records to return.
+            `offset`: How many records to skip (for paging).
+            `newest_first`: Return the most recent records first.
+        '''
+        self.check_keys(conditions)
+        clauses = []
         values = []
-        for key in record.keys():
-            if key not in (self.COMPULSORY_FIELDS | self.OPTIONAL_FIELDS):
-                if key != '_id':
-                    raise ValueError('Unknown attribute: {}'.format(key))
+        for label in sorted(conditions.keys()):
+            value = conditions[label]
+            if isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append('{} IN ({})'.format(
+                    label, ', '.join(['?']*len(value))))
+                values += value
             else:
-                labels.append(key)
-                values.append(record[key])
-        sql = 'INSERT INTO tasks({}) VALUES ({}) where id=?'.format(
-            [', '.join(labels), ', '.join(['?']*len(labels))])
-        self.cur.execute(sql, values + [record['id']])
-        self.conn.commit()
-    
-    def find_by_id(self, _id):
-        self.cur.execute(
-            'SELECT * FROM tasks WHERE id = ?', (_id,))
-        values = self.cur.fetchone()
-        record = {
-            'id': values[0],
-            'parent_directory': values[1],
-            'directory': values[2],
-            'description': values[3],
-            'state': values[4],
-        }
+                clauses.append('{} = ?'.format(label))
+                values.append(value)
+        if clauses:
+            where = 'WHERE ' + ' AND '.join(clauses)
+        else:
+            where = ''
+        sql = 'SELECT {} FROM tasks {} ORDER BY id {} LIMIT ? OFFSET ?'.format(
+            ', '.join(self.FIELDS), where, 'DESC' if newest_first else 'ASC')
+        if limit is None:
+            limit = -1
+        values += [limit, offset]
+        records = [self.record_from_row(row)
+                   for row in self.query(sql, values)]
+        return records
+
+    def find_by_parent_directory(self, parent_directory, limit=None, offset=0,
+                                 newest_first=False):
+        '''
+        Get the records of the tasks in a directory ordered by when they
+        were created.
+
+        Args:
+            `parent_directory`: The directory containing the tasks.
+            `limit`: The maximum number of records to return.
+            `offset`: How many records to skip (for paging).
+            `newest_first`: Return the most recent tasks first.
+        '''
+        return self.find(parent_directory=parent_directory, limit=limit,
+                         offset=offset, newest_first=newest_first)
+
+    def find_latest(self, parent_directory, description=None, kind=None):
+        '''
+        Get the record of the most recent task in a directory, optionally
+        only considering tasks with a matching description or kind.
+        Returns None if there is no such task.
+        '''
+        conditions = {'parent_directory': parent_directory}
+        if description is not None:
+            conditions['description'] = description
+        if kind is not None:
+            conditions['kind'] = kind
+        records = self.find(limit=1, newest_first=True, **conditions)
+        if records:
+            record = records[0]
+        else:
+            record = None
         return record
 
-    def count(self):
-        self.cur.execute('SELECT count(*) FROM tasks')
-        values = self.cur.fetchone()
-        count = values[0]
+    def count(self, parent_directory=None):
+        if parent_directory is None:
+            rows = self.query('SELECT count(*) FROM tasks')
+        else:
+            rows = self.query(
+                'SELECT count(*) FROM tasks WHERE parent_directory = ?',
+                (parent_directory,))
+        count = rows[0][0]
         return count
-        
+
+    def delete_by_parent_directory(self, parent_directory):
+        '''
+        Forget about all the tasks in a directory (e.g. when the directory
+        has been deleted).
+        '''
+        with self.transaction() as cur:
+            cur.execute(
+                'DELETE FROM state_history WHERE task_id IN '
+                '(SELECT id FROM tasks WHERE parent_directory = ?)',
+                (parent_directory,))
+            cur.execute('DELETE FROM tasks WHERE parent_directory = ?',
+                        (parent_directory,))
+
     def drop(self):
-        self.cur.execute('DELETE FROM tasks')
-        self.conn.commit()
-        
-    
+        with self.transaction() as cur:
+            cur.execute('DELETE FROM tasks')
+            cur.execute('DELETE FROM state_history')
@@ -0,0 +1,274 @@
+'''
+Exploring a design space by synthesizing and implementing a design for
+every point of a parameter grid.
+
+Each point gets its own project in the sweep directory.  A few points
+are run at once and the utilization, power and run time of each point
+are recorded in an SQLite database in the sweep directory so that an
+interrupted sweep can be resumed without running the finished points
+again.
+'''
+
+import os
+import csv
+import json
+import time
+import logging
+import sqlite3
+import itertools
+import threading
+import concurrent.futures
+
+from pyvivado import interface, project, utils
+
+logger = logging.getLogger(__name__)
+
+
+def grid_points(grid):
+    '''
+    Get every combination of the values in a grid.
+
+    Args:
+        `grid`: A dictionary mapping parameter names to lists of values.
+
+    Returns a list of parameter dictionaries.
+    '''
+    names = sorted(grid.keys())
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[name] for name in names])]
+
+
+class SweepResults(object):
+    '''
+    An SQLite table holding the state and results of each point of a sweep.
+    '''
+
+    FIELDS = ('key', 'params', 'state', 'results', 'error', 'start_time',
+              'end_time')
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(fn, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute('''
+CREATE TABLE IF NOT EXISTS points
+(
+key TEXT PRIMARY KEY,
+params TEXT,
+state TEXT,
+results TEXT,
+error TEXT,
+start_time REAL,
+end_time REAL
+);''')
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, key, params, state, results=None, error=None,
+               start_time=None, end_time=None):
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO points ({}) VALUES ({})'.format(
+                    ', '.join(self.FIELDS), ', '.join(['?']*len(self.FIELDS))),
+                (key, json.dumps(params, sort_keys=True), state,
+                 json.dumps(results, sort_keys=True), error, start_time,
+                 end_time))
+
+    def get(self, key):
+        '''
+        Get the record of a point (or None if it hasn't been run).
+        '''
+        records = self.find('key = ?', (key,))
+        if records:
+            record = records[0]
+        else:
+            record = None
+        return record
+
+    def find(self, where='', values=()):
+        sql = 'SELECT {} FROM points'.format(', '.join(self.FIELDS))
+        if where:
+            sql += ' WHERE ' + where
+        with self.lock:
+            rows = self.conn.execute(sql + ' ORDER BY start_time', values).fetchall()
+        records = []
+        for row in rows:
+            record = dict(zip(self.FIELDS, row))
+            record['params'] = json.loads(record['params'])
+            record['results'] = json.loads(record['results'])
+            if (record['start_time'] is not None) and (record['end_time'] is not None):
+                record['seconds'] = record['end_time'] - record['start_time']
+            else:
+                record['seconds'] = None
+            records.append(record)
+        return records
+
+    def rows(self):
+        '''
+        Get a flat dictionary for each finished point with its parameters,
+        its results and how long it took.
+        '''
+        rows = []
+        for record in self.find('state = ?', ('DONE',)):
+            row = dict(record['params'])
+            for group, values in sorted(record['results'].items()):
+                for name, value in sorted(values.items()):
+                    row['{}.{}'.format(group, name)] = value
+            row['seconds'] = record['seconds']
+            rows.append(row)
+        return rows
+
+    def to_csv(self, fn):
+        '''
+        Write the finished points to a CSV file.
+        '''
+        rows = self.rows()
+        fieldnames = []
+        for row in rows:
+            for name in row:
+                if name not in fieldnames:
+                    fieldnames.append(name)
+        with open(fn, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+
+
+class Sweep(object):
+    '''
+    Synthesizes (and optionally implements) a design for every point of a
+    parameter grid and records the results.
+    '''
+
+    def __init__(self, directory, factory, points, implement=True,
+                 n_parallel=2, part='', board='', profile=None):
+        '''
+        Args:
+            `directory`: Where the projects and results are kept.
+            `factory`: A function that takes the parameters of a point and
+                returns an `interface.Interface` or a `builder.Builder` for
+                the design.
+            `points`: A list of parameter dictionaries (see `grid_points`).
+            `implement`: Whether to implement the design or just
+                synthesize it.
+            `n_parallel`: How many points are run at once.
+            `part`: The 'part' to use when implementing.
+            `board`: The 'board' to use when implementing.
+            `profile`: The `resources.ResourceProfile` of each point's
+                Vivado process.
+        '''
+        self.directory = directory
+        self.factory = factory
+        self.points = points
+        self.implement = implement
+        self.n_parallel = n_parallel
+        self.part = part
+        self.board = board
+        self.profile = profile
+        os.makedirs(directory, exist_ok=True)
+        self.results = SweepResults(os.path.join(directory, 'sweep.db'))
+
+    @staticmethod
+    def point_key(params):
+        return utils.fingerprint(params)[:16]
+
+    def point_directory(self, params):
+        return os.path.join(self.directory, self.point_key(params))
+
+    def make_project(self, params):
+        '''
+        Create (or update) the project of a point.
+        '''
+        design = self.factory(params)
+        parameters = dict(params)
+        if isinstance(design, interface.Interface):
+            design_builders = [design.builder]
+            top_module = design.module_name
+            parameters.setdefault('factory_name', design.factory_name)
+        else:
+            design_builders = [design]
+            top_module = ''
+            parameters.setdefault('factory_name', design.__class__.__name__)
+        return project.BuilderProject.create_or_update(
+            design_builders=design_builders,
+            simulation_builders=[],
+            parameters=parameters,
+            directory=self.point_directory(params),
+            part=self.part,
+            board=self.board,
+            top_module=top_module,
+        )
+
+    def collect(self, p):
+        '''
+        Get the results of a point from its project once it has been
+        synthesized or implemented.
+        '''
+        from_synthesis = not self.implement
+        utilization = p.get_utilization(from_synthesis=from_synthesis)
+        return {
+            'utilization': dict(
+                (k, v) for k, v in utilization.items()
+                if k not in ('Instance', 'Module', 'children')),
+            'power': p.get_power(from_synthesis=from_synthesis),
+        }
+
+    def run_point(self, params):
+        '''
+        Run a single point and record its results.
+        '''
+        key = self.point_key(params)
+        start_time = time.time()
+        self.results.record(key, params, 'RUNNING', start_time=start_time)
+        try:
+            p = self.make_project(params)
+            if self.implement:
+                t = p.implement_and_report(bitstream=False, profile=self.profile)
+            else:
+                t = p.synthesize_and_report(profile=self.profile)
+            t.wait()
+            # Reports left by an earlier run of the point would otherwise
+            # be collected as the results.
+            errors = t.get_errors()
+            if errors or (t.get_current_state() != 'FINISHED_OK'):
+                raise Exception('Task {} finished with state {}: {}'.format(
+                    t._id, t.get_current_state(), errors))
+            results = self.collect(p)
+        except Exception as e:
+            logger.error('Sweep point {} failed: {}'.format(params, e))
+            self.results.record(key, params, 'ERROR', error=str(e),
+                                start_time=start_time, end_time=time.time())
+            return False
+        self.results.record(key, params, 'DONE', results=results,
+                            start_time=start_time, end_time=time.time())
+        return True
+
+    def todo(self):
+        '''
+        The points that haven't been finished.
+        '''
+        todo = []
+        for params in self.points:
+            record = self.results.get(self.point_key(params))
+            if (record is None) or (record['state'] != 'DONE'):
+                todo.append(params)
+        return todo
+
+    def run(self):
+        '''
+        Run every point that hasn't been finished yet, `n_parallel` at a
+        time.  Points that fail are recorded and retried the next time the
+        sweep is run.
+
+        Returns the number of points that failed.
+        '''
+        todo = self.todo()
+        logger.info('Sweep has {} of {} points to run.'.format(
+            len(todo), len(self.points)))
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.n_parallel) as executor:
+            succeeded = list(executor.map(self.run_point, todo))
+        return succeeded.count(False)
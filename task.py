@@ -4,25 +4,54 @@ import subprocess
 import logging
 import time
 import warnings
+import json
+import re
+import signal
+import shutil
+import socket
+import sys
+import gzip
+import lzma
+import fnmatch
 
-from pyvivado import config
+from pyvivado import config, resources, spool
 
 logger = logging.getLogger(__name__)
 
+# How to compress old logs: method -> (open function, file suffix).
+COMPRESSORS = {
+    'gzip': (gzip.open, '.gz'),
+    'lzma': (lzma.open, '.xz'),
+}
+# The files in a task directory that are logs.
+LOG_PATTERNS = ('stdout.txt', 'stderr.txt', '*.log', '*.jou')
+
 
 class Task:
     '''
     A task is an external process that we run.
     Each task has it's own directory created for it.
-    This directory contains the following files:
-     - current_state.txt - either NOT_STARTED, RUNNING, FINISHED_OK, FINISHED_ERROR.
-     - final_state.txt either FINISHED_OK or FINISHED_ERROR
+
+    The state of the task (NOT_STARTED, RUNNING, FINISHED_OK,
+    FINISHED_ERROR, CANCELLED or TIMED_OUT) is kept in the tasks database
+    along with a history of when it changed.
+
+    The task directory contains the following files:
+     - current_state.txt - only written if the process running the task
+       could not write its state to the database.
+     - process.json - the process ID, host and start time of the process
+       running the task.
+     - queued.json - the spool the task was added to if it is run by a
+       worker (see `spool`).
     '''
     POSSIBLE_STATES = ('NOT_STARTED', 'RUNNING', 'FINISHED_OK',
-                       'FINISHED_ERROR')
+                       'FINISHED_ERROR', 'CANCELLED', 'TIMED_OUT')
+    FINISHED_STATES = ('FINISHED_OK', 'FINISHED_ERROR', 'CANCELLED',
+                       'TIMED_OUT')
 
     @classmethod
-    def create(cls, parent_directory, tasks_collection, description=None):
+    def create(cls, parent_directory, tasks_collection, description=None,
+               kind=None):
         '''
         Create a new task.  Mostly just setting the database entry up,
         creating the directory and stuff like that.  Subclasses of this
@@ -33,7 +62,10 @@ class Task:
                 tasks directory.
             `tasks_collection`: How we keep track of tasks.
             `description`: Describes the task.
+            `kind`: A short label for the type of task (e.g. 'synthesize')
+                so that tasks of one type can be looked up quickly.
         '''
+        parent_directory = os.path.abspath(parent_directory)
         if not os.path.exists(parent_directory):
             raise ValueError(
                 'Parent directory of task ({}) does not exist'.format(
@@ -42,6 +74,7 @@ class Task:
             'parent_directory': parent_directory,
             'description': description,
             'state': 'NOT_STARTED',
+            'kind': kind,
         }
         task_id = tasks_collection.insert(record)
         _id = str(record['id'])
@@ -49,57 +82,168 @@ class Task:
         directory = os.path.join(parent_directory, dn)
         os.mkdir(directory)
         t = cls(_id=record['id'], tasks_collection=tasks_collection)
-        t.set_current_state('NOT_STARTED')
         return t
         
     def current_state_fn(self):
         '''
-        The filename where the task writes its state.
+        The filename where the task writes its state if it can't write
+        it to the database.
         '''
         fn = os.path.join(self.directory, 'current_state.txt')
         return fn
 
     def set_current_state(self, state):
         '''
-        Sets the state in the state file.
+        Sets the state in the database.  Once a task has finished its
+        state doesn't change.
+
+        Returns True if the state was changed.
         '''
-        fn = self.current_state_fn()
         if state not in self.POSSIBLE_STATES:
             raise ValueError('State of {} is unknown.'.format(state))
-        with open(fn, 'w') as f:
-            f.write(state)
-        
+        return self.tasks_collection.set_state(
+            int(self._id), state, final_states=self.FINISHED_STATES)
 
     def get_current_state(self):
         '''
         Get the current state of this task.
         '''
-        fn = self.current_state_fn()
-        with open(fn, 'r') as f:
-            state = f.read().strip()
+        state = self.tasks_collection.get_state(int(self._id))
+        if state not in self.FINISHED_STATES:
+            # The process running the task may have fallen back to
+            # writing its state to a file.
+            fn = self.current_state_fn()
+            if os.path.exists(fn):
+                with open(fn, 'r') as f:
+                    file_state = f.read().strip()
+                # The file might be half written.
+                if (file_state in self.POSSIBLE_STATES) and (file_state != state):
+                    self.set_current_state(file_state)
+                    state = self.tasks_collection.get_state(int(self._id))
         if state not in self.POSSIBLE_STATES:
             raise ValueError('State of {} is unknown.'.format(state))
         return state
 
+    def get_state_history(self):
+        '''
+        Get a list of the (state, time) tuples that this task has passed
+        through.  Times are seconds since the epoch.
+        '''
+        return self.tasks_collection.get_state_history(int(self._id))
+
+    def is_finished(self):
+        return self.get_current_state() in self.FINISHED_STATES
+
     def __init__(self, _id, tasks_collection):
         '''
         Get the task corresponding to the passed id.
         '''
+        self.tasks_collection = tasks_collection
         self.record = tasks_collection.find_by_id(_id)
         self._id = str(self.record['id'])
         self.parent_directory = self.record['parent_directory']
         self.description = self.record.get('description', '')
-        if not os.path.exists(self.parent_directory):
-            raise Exception(
-                'Cannot find tasks parent directory {}'
-                .format(self.parent_directory))
+        self.kind = self.record.get('kind', '')
         dn = 'task_' + self._id
         self.directory = os.path.join(self.parent_directory, dn)
-        if not os.path.exists(self.directory):
-            raise Exception(
-                'Cannot find tasks directory {}'
-                .format(self.directory))
-        
+        # The directory of an old task may have been deleted by
+        # `retention.RetentionPolicy` but we still know about the task.
+
+    def has_directory(self):
+        '''
+        Whether the task directory still exists.
+        '''
+        return os.path.exists(self.directory)
+
+    def finish_time(self):
+        '''
+        When the task finished (seconds since the epoch) or None if it
+        hasn't finished.
+        '''
+        history = self.get_state_history()
+        if history and (history[-1][0] in self.FINISHED_STATES):
+            finish_time = history[-1][1]
+        else:
+            finish_time = None
+        return finish_time
+
+    def disk_usage(self):
+        '''
+        The number of bytes used by the files in the task directory.
+        '''
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for fn in filenames:
+                try:
+                    total += os.lstat(os.path.join(dirpath, fn)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def compress_logs(self, method='gzip'):
+        '''
+        Compress the log files in the task directory.  The logs can still
+        be read with `read_log`.
+
+        Args:
+            `method`: Either 'gzip' or 'lzma'.
+
+        Returns the number of bytes saved.
+        '''
+        if method not in COMPRESSORS:
+            raise ValueError('Unknown compression method {}.'.format(method))
+        if not self.is_finished():
+            raise Exception('Cannot compress the logs of unfinished task {}.'.format(
+                self._id))
+        opener, suffix = COMPRESSORS[method]
+        saved = 0
+        if not self.has_directory():
+            return saved
+        for fn in os.listdir(self.directory):
+            if not any(fnmatch.fnmatch(fn, pattern) for pattern in LOG_PATTERNS):
+                continue
+            full_fn = os.path.join(self.directory, fn)
+            if not os.path.isfile(full_fn):
+                continue
+            compressed_fn = full_fn + suffix
+            # Write to a temporary file so that we never leave a half
+            # written log behind.
+            with open(full_fn, 'rb') as f_in, \
+                    opener(compressed_fn + '.tmp', 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.replace(compressed_fn + '.tmp', compressed_fn)
+            saved += os.path.getsize(full_fn) - os.path.getsize(compressed_fn)
+            os.remove(full_fn)
+        return saved
+
+    def read_log(self, fn):
+        '''
+        Read the lines of a log file in the task directory whether or
+        not it has been compressed.  Returns an empty list if the file
+        doesn't exist.
+        '''
+        full_fn = os.path.join(self.directory, fn)
+        # Might not have been created yet.
+        if os.path.exists(full_fn):
+            with open(full_fn, 'r') as f:
+                return f.readlines()
+        for opener, suffix in COMPRESSORS.values():
+            if os.path.exists(full_fn + suffix):
+                with opener(full_fn + suffix, 'rt') as f:
+                    return f.readlines()
+        return []
+
+    def delete_directory(self):
+        '''
+        Delete the task directory of a finished task.  The task is still
+        recorded in the tasks database.
+        '''
+        if not self.is_finished():
+            raise Exception('Cannot delete the directory of unfinished task {}.'.format(
+                self._id))
+        if self.has_directory():
+            logger.debug('Deleting task directory {}.'.format(self.directory))
+            shutil.rmtree(self.directory)
 
 
 class VivadoTask(Task):
@@ -124,7 +268,7 @@ class VivadoTask(Task):
 
     @classmethod
     def create(cls, parent_directory, command_text, tasks_collection,
-               description=None):
+               description=None, kind=None, profile=None):
         '''
         Create the files necessary for the Vivado process.
         
@@ -133,61 +277,344 @@ class VivadoTask(Task):
            command_text: The TCL command we will execute.
            tasks_collection: How we keep track of Vivado processes.
            description: A description of this task.
+           kind: A short label for the type of task.
+           profile: The `resources.ResourceProfile` of the process
+               (defaults to the one set in `config`).
         '''
+        logger.debug('Creating a new VivadoTask in directory {}'.format(parent_directory))
+        logger.debug('Command is {}'.format(command_text))
+        t = super().create(parent_directory=parent_directory,
+                           description=description,
+                           tasks_collection=tasks_collection,
+                           kind=kind)
+        if profile is None:
+            profile = resources.ResourceProfile()
+        with open(t.profile_fn(), 'w') as f:
+            json.dump(profile.to_dict(), f)
+        # Vivado records its state directly in the tasks database unless
+        # the database only exists inside this python process.  Spooled
+        # tasks may run on another host where the database (and this
+        # python) can't safely be used so they write current_state.txt,
+        # which `get_current_state` reads back into the database.
+        if config.task_spool is not None:
+            tasks_db = ''
+        else:
+            tasks_db = tasks_db_fn(tasks_collection)
         # Generate the TCL script that this Vivado process will run.
         command_template_fn = os.path.join(config.tcldir, 'vivado_task.tcl.t')
         with open(command_template_fn, 'r') as f:
             command_template = f.read()
         command = command_template.format(
             tcl_directory=config.tcldir,
-            command=command_text
+            task_id=t._id,
+            tasks_db=tasks_db,
+            python=sys.executable,
+            finished_states=' '.join(cls.FINISHED_STATES),
+            command=profile.tcl() + '\n' + command_text
         )
-        # Make parent directory absolute
-        logger.debug('Creating a new VivadoTask in directory {}'.format(parent_directory))
-        logger.debug('Command is {}'.format(command_text))
-        t = super().create(parent_directory=parent_directory,
-                           description=description,
-                           tasks_collection=tasks_collection)
         # Create the command file.
         command_fn = os.path.join(t.directory, 'command.tcl')
         with open(command_fn, 'w') as f:
             f.write(command)
         return t
 
+    @classmethod
+    def create_pipeline(cls, parent_directory, steps, tasks_collection,
+                        description=None, kind='pipeline', profile=None):
+        '''
+        Create a task that runs several steps one after another in a
+        single Vivado process.  This saves opening the project (and any
+        checkpoints) once for every step.
+
+        Args:
+           parent_directory: The directory of the Vivado project.
+           steps: A list of (step name, TCL command) tuples.
+           tasks_collection: How we keep track of Vivado processes.
+           description: A description of this task.
+           kind: A short label for the type of task.
+           profile: The `resources.ResourceProfile` of the process.
+        '''
+        names = [name for name, command_text in steps]
+        if len(names) != len(set(names)):
+            raise ValueError('Step names must be unique: {}'.format(names))
+        t = cls.create(
+            parent_directory=parent_directory,
+            command_text=pipeline_command(steps),
+            description=description,
+            tasks_collection=tasks_collection,
+            kind=kind,
+            profile=profile,
+        )
+        with open(t.steps_fn(), 'w') as f:
+            json.dump(steps, f, indent=2)
+        return t
+
     def __init__(self, _id, tasks_collection):
         super().__init__(_id=_id, tasks_collection=tasks_collection)
-        
+        # The `Popen` object if this python process started the task.
+        self.process = None
+
+    def profile_fn(self):
+        '''
+        The filename where the resource profile of the task is kept.
+        '''
+        return os.path.join(self.directory, 'profile.json')
+
+    def get_profile(self):
+        '''
+        Get the `resources.ResourceProfile` of the task.
+        '''
+        fn = self.profile_fn()
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                profile = resources.ResourceProfile.from_dict(json.load(f))
+        else:
+            # Tasks created before profiles were recorded.
+            profile = resources.ResourceProfile()
+        return profile
+
+    def steps_fn(self):
+        '''
+        The filename where the steps of a pipeline task are listed.
+        '''
+        return os.path.join(self.directory, 'steps.json')
+
+    def get_steps(self):
+        '''
+        Get the (step name, TCL command) tuples of a pipeline task.
+        A task that is not a pipeline has no steps.
+        '''
+        fn = self.steps_fn()
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                steps = [tuple(step) for step in json.load(f)]
+        else:
+            steps = []
+        return steps
+
+    def get_finished_steps(self):
+        '''
+        Get the names of the steps of a pipeline task that have finished.
+        '''
+        fn = os.path.join(self.directory, 'steps.txt')
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                names = [line.strip() for line in f if line.strip()]
+        else:
+            names = []
+        return names
+
+    def wait_for_step(self, step_name, sleep_time=1):
+        '''
+        Block python until a step of a pipeline task has finished.
+        Raises an exception if the task finishes without completing the
+        step.
+        '''
+        step_names = [name for name, command_text in self.get_steps()]
+        if step_name not in step_names:
+            raise ValueError('Task has no step named {}'.format(step_name))
+        while step_name not in self.get_finished_steps():
+            if self.is_finished():
+                # Check the steps one last time in case the task
+                # finished between the two checks.
+                if step_name in self.get_finished_steps():
+                    break
+                self.log_messages(self.get_messages())
+                raise Exception('Task finished without completing step {}'.format(
+                    step_name))
+            logger.debug('Waiting for step {} to finish.'.format(step_name))
+            time.sleep(sleep_time)
+
     def run(self):
         '''
         Spawn the process that will run the vivado process.
+
+        The process is started in its own process group so that it can
+        be killed along with any children (xsim, runs from `launch_runs`).
+
+        If `config.core_budget` is set then this blocks until the cores
+        that the task's resource profile needs are free.
+
+        If `config.task_spool` is set then the task is added to the spool
+        instead and a worker runs it (see `spool`).
         '''
-        cwd = os.getcwd()
-        os.chdir(self.directory)
-        stdout_fn = 'stdout.txt' 
-        stderr_fn = 'stderr.txt' 
-        command_fn = 'command.tcl' 
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            DETACHED_PROCESS = 8
-            if os.name == 'nt':
-                commands = [config.vivado, '-log', stdout_fn, '-mode', 'batch',
-                            '-source', command_fn]
-                p = subprocess.Popen(
-                    commands,
-                    # So that process stays alive when terminal is closed
-                    # in Windows.
-                    creationflags=DETACHED_PROCESS,
-                )
+        if config.task_spool is not None:
+            spool.Spool(config.task_spool).submit(self)
+            return
+        budget = resources.get_core_budget()
+        if budget is None:
+            self.spawn()
+        else:
+            budget.run(self.directory, self.get_profile().cores(), self.spawn)
+        # Vivado will also do this but it takes a while to start up.
+        self.set_current_state('RUNNING')
+
+    def spawn(self):
+        '''
+        Start the Vivado process and return its process ID.
+        '''
+        p = start_vivado(self.directory)
+        self.process = p
+        self.write_process_info(pid=p.pid)
+        return p.pid
+
+    def process_fn(self):
+        '''
+        The filename where we record which process is running the task.
+        '''
+        return os.path.join(self.directory, 'process.json')
+
+    def write_process_info(self, pid):
+        '''
+        Record the process ID, host and start time of the process running
+        the task so that the task can be found again if this python
+        process dies.
+        '''
+        write_process_info(self.directory, pid)
+
+    def is_queued(self):
+        '''
+        Whether the task was added to a spool to be run by a worker.
+        '''
+        return os.path.exists(os.path.join(self.directory, spool.QUEUED_FN))
+
+    def get_process_info(self):
+        '''
+        Get a dictionary with the 'pid', 'host' and 'start_time' of the
+        process running the task (or None if it was never started).
+        '''
+        fn = self.process_fn()
+        if os.path.exists(fn):
+            with open(fn, 'r') as f:
+                info = json.load(f)
+        else:
+            info = None
+        return info
+
+    def get_pid(self):
+        '''
+        Get the process ID of the Vivado process (or None if it was never
+        started).
+        '''
+        info = self.get_process_info()
+        if info is None:
+            pid = None
+        else:
+            pid = info['pid']
+        return pid
+
+    def is_local(self):
+        '''
+        Whether the task was started on this machine.
+        '''
+        info = self.get_process_info()
+        return (info is not None) and (info['host'] == socket.gethostname())
+
+    def is_alive(self):
+        '''
+        Whether the Vivado process is still running.
+        Returns None if the task was started on a different machine
+        since we can't tell.
+        '''
+        if self.process is not None:
+            alive = self.process.poll() is None
+        else:
+            info = self.get_process_info()
+            if info is None:
+                alive = False
+            elif not self.is_local():
+                alive = None
             else:
-                commands = [config.vivado, '-mode', 'batch', '-source',
-                            command_fn]
-                p = subprocess.Popen(
-                    commands,
-                    stdout=open(stdout_fn, 'w'),
-                    stderr=open(stderr_fn, 'w'),
-                )
-                
-        os.chdir(cwd)
+                alive = process_exists(info['pid'])
+                started = process_start_time(info['pid'])
+                if alive and (started is not None):
+                    # Make sure the process ID hasn't been reused by
+                    # some other process.
+                    alive = abs(started - info['start_time']) < 5
+        return alive
+
+    def reconcile(self):
+        '''
+        Work out what happened to an unfinished task after the python
+        process that started it has died.  If the Vivado process has died
+        without finishing the task is marked as FINISHED_ERROR.
+
+        Returns one of:
+            'finished': The task had already finished.
+            'not_started': The task was never run.
+            'alive': The task is still running.  This object can be used to
+                wait on it or cancel it.
+            'dead': The process died without finishing.
+            'unknown': The task was started on another machine.
+            'queued': The task is waiting for a worker.
+        '''
+        if self.is_finished():
+            status = 'finished'
+        elif self.get_process_info() is None:
+            status = 'queued' if self.is_queued() else 'not_started'
+        else:
+            alive = self.is_alive()
+            if alive is None:
+                status = 'unknown'
+            elif alive:
+                status = 'alive'
+            elif self.is_finished():
+                # It finished while we were looking.
+                status = 'finished'
+            else:
+                info = self.get_process_info()
+                message = 'Task process {} on {} died before the task finished.'.format(
+                    info['pid'], info['host'])
+                logger.warning(message)
+                with open(os.path.join(self.directory, 'stderr.txt'), 'a') as f:
+                    f.write('ERROR: {}\n'.format(message))
+                self.set_current_state('FINISHED_ERROR')
+                status = 'dead'
+        return status
+
+    def cancel(self, state='CANCELLED', grace_period=5, clean_runs=True):
+        '''
+        Kill the Vivado process along with all the processes it started and
+        record that the task was stopped.
+
+        Args:
+            `state`: The state to record (CANCELLED or TIMED_OUT).
+            `grace_period`: How long to wait for the processes to exit after
+                asking them nicely before killing them.
+            `clean_runs`: Whether to clean up runs in the project that
+                were left half finished.
+
+        A task that was added to a spool is stopped by the worker that
+        claims it.
+
+        Returns True if the task was still running.
+        '''
+        if state not in ('CANCELLED', 'TIMED_OUT'):
+            raise ValueError('Cannot cancel a task with state {}.'.format(state))
+        if self.is_finished():
+            return False
+        pid = self.get_pid()
+        if self.is_queued() and (self.process is None):
+            logger.info('Cancelling queued task {}.'.format(self._id))
+            spool.cancel(self.directory, state=state)
+            self.set_current_state(state)
+            return True
+        if (pid is not None) and (self.process is None) and (not self.is_local()):
+            raise Exception('Cannot cancel task {} running on {}.'.format(
+                self._id, self.get_process_info()['host']))
+        owned_pids = set()
+        if pid is not None:
+            logger.info('Killing task {} (process {}).'.format(self._id, pid))
+            # Runs can leave the process group so find them first.
+            owned_pids = process_descendants(pid)
+            kill_process_group(pid, grace_period=grace_period)
+            if self.process is not None:
+                # Reap the process.
+                self.process.wait()
+        self.set_current_state(state)
+        if clean_runs:
+            clean_stale_runs(self.parent_directory, owned_pids=owned_pids)
+        return True
 
     def get_messages(self, ignore_strings=config.default_ignore_strings):
         '''
@@ -242,35 +669,29 @@ class VivadoTask(Task):
         return errors
 
     def get_stdout(self):
-        stdout_fn = os.path.join(self.directory, 'stdout.txt')
-        # Might not have been created yet.
-        if os.path.exists(stdout_fn):
-            with open(stdout_fn, 'r') as f:
-                lines = f.readlines()
-        else:
-            lines = []
-        return lines
+        return self.read_log('stdout.txt')
 
     def get_stderr(self):
-        stderr_fn = os.path.join(self.directory, 'stderr.txt')
         # We don't write this file in Windows.
-        if os.path.exists(stderr_fn):
-            with open(stderr_fn, 'r') as f:
-                lines = f.readlines()
-        else:
-            lines = []
-        return lines        
-
-    def is_finished(self):
-        return os.path.exists(os.path.join(self.directory, 'finished.txt'))
+        return self.read_log('stderr.txt')
 
     def wait(self, sleep_time=1,
-             failure_message_types=DEFAULT_FAILURE_MESSAGE_TYPES):
+             failure_message_types=DEFAULT_FAILURE_MESSAGE_TYPES,
+             timeout=None):
         '''
         Block python until this task has finished.
+
+        If `timeout` seconds pass before the task finishes, the task is
+        killed, its state is set to TIMED_OUT and a `TimeoutError` is
+        raised.
         '''
+        start_time = time.time()
         finished = self.is_finished()
         while not finished:
+            if (timeout is not None) and (time.time() - start_time > timeout):
+                self.cancel(state='TIMED_OUT')
+                raise TimeoutError('Task {} timed out after {}s.'.format(
+                    self._id, timeout))
             time.sleep(sleep_time)
             finished = self.is_finished()
             logger.debug("Waiting for task to finish.")
@@ -281,7 +702,7 @@ class VivadoTask(Task):
             if mt in failure_message_types:
                 raise Exception('Task Error: {}'.format(message))
 
-    def run_and_wait(self, sleep_time=1):
+    def run_and_wait(self, sleep_time=1, timeout=None):
         '''
         Start the task and block python until the task has finished.
         Also log the output from the process.
@@ -290,7 +711,7 @@ class VivadoTask(Task):
         process was running instead of waiting until it was finished.
         '''
         self.run()
-        self.wait(sleep_time=sleep_time)
+        self.wait(sleep_time=sleep_time, timeout=timeout)
 
     def monitor_output(self):
         '''
@@ -315,4 +736,278 @@ class VivadoTask(Task):
             stdout_length = len(stdout)
             stderr_length = len(stderr)
             time.sleep(1)
-        
+
+
+def running_tasks(tasks_collection):
+    '''
+    Get all the tasks in a tasks database that are running (in any
+    project that uses that database).
+    '''
+    records = tasks_collection.find(state='RUNNING')
+    tasks = [VivadoTask(_id=record['id'], tasks_collection=tasks_collection)
+             for record in records]
+    return [t for t in tasks if not t.is_finished()]
+
+
+def process_exists(pid):
+    '''
+    Whether a process with this process ID exists on this machine.
+    '''
+    if os.name == 'nt':
+        output = subprocess.check_output(
+            ['tasklist', '/FI', 'PID eq {}'.format(pid)])
+        exists = str(pid).encode('ascii') in output
+    else:
+        try:
+            os.kill(pid, 0)
+            exists = True
+        except ProcessLookupError:
+            exists = False
+        except PermissionError:
+            exists = True
+    return exists
+
+
+def process_start_time(pid):
+    '''
+    When a process started (seconds since the epoch).  Only works on Linux,
+    returns None if it can't be worked out.
+    '''
+    try:
+        with open('/proc/{}/stat'.format(pid), 'r') as f:
+            # The command name is in brackets and may contain spaces.
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/stat', 'r') as f:
+            boot_time = [int(line.split()[1]) for line in f
+                         if line.startswith('btime')][0]
+    except (OSError, IndexError):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    # The start time is field 22, which is 20th after the command name.
+    return boot_time + int(fields[19]) / ticks
+
+
+def process_descendants(pid):
+    '''
+    The process IDs of the processes in the process group led by `pid`
+    and of all the processes descended from it.  Only works on Linux,
+    returns an empty set if it can't be worked out.
+    '''
+    parents = {}
+    descendants = set()
+    try:
+        pids = [int(dn) for dn in os.listdir('/proc') if dn.isdigit()]
+    except OSError:
+        return descendants
+    for other in pids:
+        try:
+            with open('/proc/{}/stat'.format(other), 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            # It exited while we were looking.
+            continue
+        parents[other] = int(fields[1])
+        if int(fields[2]) == pid:
+            descendants.add(other)
+    children = {}
+    for other, parent in parents.items():
+        children.setdefault(parent, []).append(other)
+    to_visit = [pid] + list(descendants)
+    while to_visit:
+        for child in children.get(to_visit.pop(), []):
+            if child not in descendants:
+                descendants.add(child)
+                to_visit.append(child)
+    descendants.discard(pid)
+    return descendants
+
+
+def kill_process_group(pid, grace_period=5):
+    '''
+    Kill a process that was started as a process group leader along with
+    all the processes in its group.  The processes are sent SIGTERM and
+    then SIGKILL if they are still around after `grace_period` seconds.
+    '''
+    if os.name == 'nt':
+        subprocess.call(['taskkill', '/F', '/T', '/PID', str(pid)])
+        return
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    end_time = time.time() + grace_period
+    while time.time() < end_time:
+        try:
+            # Reap the group leader if it is our child so that it does
+            # not hang around as a zombie.
+            os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            pass
+        try:
+            # Signal 0 checks whether anything is left in the group.
+            os.killpg(pid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.1)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def kill_process(pid):
+    '''
+    Kill a single process (and on Windows its children).
+    '''
+    if os.name == 'nt':
+        subprocess.call(['taskkill', '/F', '/T', '/PID', str(pid)])
+    else:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def clean_stale_runs(project_directory, owned_pids=()):
+    '''
+    Remove the runs (e.g. synth_1, impl_1) in a Vivado project that were
+    started but never finished because their Vivado process was killed.
+    Vivado would otherwise think that they are still running.
+
+    A run is only removed if every process recorded for it is either
+    owned or is on this host and no longer exists.  Runs that may still
+    be driven by another task (a live process that isn't owned, or a
+    process on another host) are left alone.
+
+    Args:
+        `owned_pids`: The process IDs that belonged to the task that was
+            stopped (see `process_descendants`).  Run processes on this
+            host that are among them and still alive are killed first.
+
+    Returns the names of the runs that were removed.
+    '''
+    runs_directory = os.path.join(project_directory, 'TheProject.runs')
+    if not os.path.exists(runs_directory):
+        return []
+    removed = []
+    for run_name in sorted(os.listdir(runs_directory)):
+        run_directory = os.path.join(runs_directory, run_name)
+        begin_fn = os.path.join(run_directory, '.vivado.begin.rst')
+        finished = [os.path.exists(os.path.join(run_directory, fn))
+                    for fn in ('.vivado.end.rst', '.vivado.error.rst')]
+        if (not os.path.exists(begin_fn)) or any(finished):
+            continue
+        # Vivado records the host and process ID of the run in the
+        # begin file.
+        with open(begin_fn, 'r') as f:
+            processes = re.findall(r'<Process\b([^>]*)>', f.read())
+        pids = []
+        for attributes in processes:
+            host = re.search(r'Host="([^"]*)"', attributes)
+            pid = re.search(r'Pid="(\d+)"', attributes)
+            if (host is None) or (pid is None) or (
+                    host.group(1) != socket.gethostname()):
+                pids = None
+                break
+            pid = int(pid.group(1))
+            if (pid not in owned_pids) and process_exists(pid):
+                pids = None
+                break
+            pids.append(pid)
+        if not pids:
+            logger.info('Not removing run {} since it may still be running.'.format(
+                run_directory))
+            continue
+        for pid in pids:
+            if process_exists(pid):
+                kill_process(pid)
+        logger.info('Removing stale run {}.'.format(run_directory))
+        shutil.rmtree(run_directory)
+        removed.append(run_name)
+    return removed
+
+
+def tasks_db_fn(tasks_collection):
+    '''
+    The absolute filename of the database of a tasks collection, or ''
+    if the database only exists inside this python process.
+    '''
+    if getattr(tasks_collection, 'in_memory', True):
+        return ''
+    return os.path.abspath(tasks_collection.fn)
+
+
+def start_vivado(directory):
+    '''
+    Start a Vivado process running the command.tcl of a task directory.
+
+    The process is started in its own process group so that it can
+    be killed along with any children (xsim, runs from `launch_runs`).
+    It is told where this host's copy of the pyvivado TCL files is.
+
+    Returns the `Popen` object.
+    '''
+    stdout_fn = 'stdout.txt'
+    stderr_fn = 'stderr.txt'
+    command_fn = 'command.tcl'
+    env = dict(os.environ, PYVIVADO_TCLDIR=config.tcldir)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        DETACHED_PROCESS = 8
+        CREATE_NEW_PROCESS_GROUP = 0x200
+        if os.name == 'nt':
+            commands = [config.vivado, '-log', stdout_fn, '-mode', 'batch',
+                        '-source', command_fn]
+            p = subprocess.Popen(
+                commands,
+                cwd=directory,
+                env=env,
+                # So that process stays alive when terminal is closed
+                # in Windows.
+                creationflags=DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP,
+            )
+        else:
+            commands = [config.vivado, '-mode', 'batch', '-source',
+                        command_fn]
+            with open(os.path.join(directory, stdout_fn), 'w') as stdout, \
+                    open(os.path.join(directory, stderr_fn), 'w') as stderr:
+                p = subprocess.Popen(
+                    commands,
+                    cwd=directory,
+                    env=env,
+                    stdout=stdout,
+                    stderr=stderr,
+                    start_new_session=True,
+                )
+    return p
+
+
+def write_process_info(directory, pid):
+    '''
+    Record the process ID, host and start time of the process running
+    the task in a task directory (see `VivadoTask.get_process_info`).
+    '''
+    info = {
+        'pid': pid,
+        'host': socket.gethostname(),
+        'start_time': time.time(),
+    }
+    with open(os.path.join(directory, 'process.json'), 'w') as f:
+        json.dump(info, f)
+
+
+def pipeline_command(steps):
+    '''
+    Combine several steps into the TCL command for a single task.
+    After each step has run we record that it has finished so that
+    python can report completion one step at a time.
+
+    Args:
+        `steps`: A list of (step name, TCL command) tuples.
+    '''
+    lines = []
+    for name, command_text in steps:
+        lines.append(command_text)
+        lines.append('::pyvivado::step_finished {{{}}}'.format(name))
+    return '\n'.join(lines)
+
@@ -1,6 +1,19 @@
 package provide pyvivado 0.1
 
 namespace eval ::pyvivado {
+    # How many runs launch_runs starts at once (see use_resources).
+    variable jobs 1
+}
+
+# Apply the resource profile of a task (see resources.py).
+# Args:
+#     `threads`: The maximum number of threads Vivado uses.
+#     `jobs`: How many runs launch_runs starts at once.
+proc ::pyvivado::use_resources {threads jobs} {
+    if {[info commands set_param] != ""} {
+        set_param general.maxThreads $threads
+    }
+    set ::pyvivado::jobs $jobs
 }
 
 # Create a new Vivado project.
@@ -10,8 +23,9 @@ namespace eval ::pyvivado {
 #     `simulation_files`: The wrapper files for simulation (can be "  ").
 #     `part`: The part for which we will implement (can be "").
 #     `board`: The board for which we will implement (can be "").
-#     `ips`: A list of (ip_name, ip_version, module_name, properties) used
-#         define the IP blocks that are required.
+#     `ips`: A list of (ip_name, ip_version, module_name, properties,
+#         cache_dir) used define the IP blocks that are required
+#         (see create_ips).
 #     `top_module`: The top module of the design (can be "").
 proc ::pyvivado::create_vivado_project {project_dir design_files simulation_files part board ips top_module} {
     if {$part != ""} {
@@ -33,30 +47,152 @@ proc ::pyvivado::create_vivado_project {project_dir design_files simulation_file
     } else {
 	puts "DEBUG: no simulation files."
     }
+    ::pyvivado::create_ips $ips
+    set_property SOURCE_SET sources_1 [get_filesets sim_1]
+    if {$top_module != ""} {
+	set_property top $top_module [get_filesets sim_1]
+    }
+    update_compile_order -fileset sim_1
+    update_compile_order -fileset sources_1
+}
+
+# Create IP blocks in the current project.
+# Args:
+#     `ips`: A list of (ip_name, ip_version, module_name, properties,
+#         cache_dir) used define the IP blocks that are required.
+#         If `cache_dir` is not "" then the IP block is copied from there
+#         if it has been cached, and is cached there once it is
+#         generated if it hasn't (see ::pyvivado::ip_cache_dir).
+proc ::pyvivado::create_ips {ips} {
     foreach ip $ips {
-        lassign $ip ip_name ip_version module_name properties
+        lassign $ip ip_name ip_version module_name properties cache_dir
+        set cache_dir [::pyvivado::ip_cache_dir $cache_dir]
         puts "DEBUG: ip_name = $ip_name"
         puts "DEBUG: ip_version = $ip_version"
         puts "DEBUG: module_name = $module_name"
-        if {$ip_version != ""} {
-            create_ip -name $ip_name -version $ip_version -vendor xilinx.com -library ip -module_name $module_name
-        } else {
-            create_ip -name $ip_name -vendor xilinx.com -library ip -module_name $module_name
+        if {$cache_dir != "" && [file exists [file join $cache_dir "${module_name}.xci"]]} {
+            puts "DEBUG: Using cached IP in $cache_dir"
+            set ip_dir [file join [get_property DIRECTORY [current_project]] \
+                            TheProject.srcs sources_1 ip $module_name]
+            file delete -force $ip_dir
+            file mkdir [file dirname $ip_dir]
+            file copy $cache_dir $ip_dir
+            add_files -norecurse [file join $ip_dir "${module_name}.xci"]
+            continue
         }
-        foreach property $properties {
-            lassign $property property_name property_value
-            puts "DEBUG: Setting $property_name = $property_value"
-            set_property -name CONFIG.$property_name -value $property_value -objects [get_ips $module_name]
+        ::pyvivado::new_ip $ip_name $ip_version $module_name $properties
+        if {$cache_dir != ""} {
+            ::pyvivado::cache_ip $module_name $cache_dir
         }
     }
-    set_property SOURCE_SET sources_1 [get_filesets sim_1]
-    if {$top_module != ""} {
-	set_property top $top_module [get_filesets sim_1]
+}
+
+# Create an IP block and set its properties.
+# Args:
+#     `args`: Extra arguments for create_ip (e.g. "-dir $ip_dir").
+proc ::pyvivado::new_ip {ip_name ip_version module_name properties args} {
+    if {$ip_version != ""} {
+        create_ip -name $ip_name -version $ip_version -vendor xilinx.com -library ip {*}$args -module_name $module_name
+    } else {
+        create_ip -name $ip_name -vendor xilinx.com -library ip {*}$args -module_name $module_name
+    }
+    foreach property $properties {
+        lassign $property property_name property_value
+        puts "DEBUG: Setting $property_name = $property_value"
+        set_property -name CONFIG.$property_name -value $property_value -objects [get_ips $module_name]
+    }
+}
+
+# The directory an IP block is cached in for this version of Vivado.
+# Generated IP only works with the version of Vivado that generated it.
+proc ::pyvivado::ip_cache_dir {cache_dir} {
+    if {$cache_dir == ""} {
+        return ""
+    }
+    return [file join $cache_dir [version -short]]
+}
+
+# Generate the output products of an IP block and copy its directory
+# into the IP cache.
+proc ::pyvivado::cache_ip {module_name cache_dir} {
+    set ip [get_ips $module_name]
+    generate_target all $ip
+    if {[catch {synth_ip $ip} message]} {
+        puts "WARNING: Could not synthesize IP $module_name: $message"
+    }
+    set ip_dir [file dirname [get_property IP_FILE $ip]]
+    # Copy to a temporary directory first so that other projects never
+    # see a partly copied IP block.
+    set temp_dir "${cache_dir}.[pid].tmp"
+    file delete -force $temp_dir
+    file mkdir [file dirname $cache_dir]
+    file copy $ip_dir $temp_dir
+    if {[catch {file rename $temp_dir $cache_dir}]} {
+        # Another project cached the same IP block at the same time.
+        file delete -force $temp_dir
+    }
+}
+
+# Bring an existing project up to date by only changing what is
+# different, so that Vivado can reuse generated IP and the results of
+# previous runs where possible.
+# Args:
+#     `project_dir`: The directory of the project.
+#     `add_design_files`: Synthesizable files to add.
+#     `remove_design_files`: Synthesizable files to remove.
+#     `add_simulation_files`: Simulation files to add.
+#     `remove_simulation_files`: Simulation files to remove.
+#     `remove_ips`: The module names of IP blocks to remove.
+#     `add_ips`: A list of (ip_name, ip_version, module_name, properties,
+#         cache_dir) for IP blocks to create (see create_ips).
+#     `reset_runs`: 1 if the design has changed so the synthesis and
+#         implementation runs must be reset.
+proc ::pyvivado::update_vivado_project {project_dir add_design_files remove_design_files add_simulation_files remove_simulation_files remove_ips add_ips reset_runs} {
+    ::pyvivado::ensure_project_open $project_dir
+    if {[llength $remove_design_files] > 0} {
+        remove_files -fileset sources_1 $remove_design_files
+    }
+    if {[llength $remove_simulation_files] > 0} {
+        remove_files -fileset sim_1 $remove_simulation_files
+    }
+    foreach module_name $remove_ips {
+        puts "DEBUG: removing ip $module_name"
+        remove_files [get_files "${module_name}.xci"]
+        file delete -force "${project_dir}/TheProject.srcs/sources_1/ip/${module_name}"
+    }
+    if {[llength $add_design_files] > 0} {
+        add_files -fileset sources_1 -norecurse $add_design_files
+    }
+    if {[llength $add_simulation_files] > 0} {
+        add_files -fileset sim_1 -norecurse $add_simulation_files
+    }
+    ::pyvivado::create_ips $add_ips
+    if {$reset_runs} {
+        reset_run synth_1
+        reset_run impl_1
     }
     update_compile_order -fileset sim_1
     update_compile_order -fileset sources_1
 }
 
+# Open the project in `proj_dir` unless a project is already open.
+# This lets several steps be run one after another in a single Vivado
+# process without loading the project each time.
+proc ::pyvivado::ensure_project_open {proj_dir} {
+    if {[llength [get_projects -quiet]] == 0} {
+        open_project "${proj_dir}/TheProject.xpr"
+    }
+}
+
+# Record that a step of a pipeline task has finished.
+# The step names are appended to steps.txt in the task directory so that
+# python can follow the progress of the task.
+proc ::pyvivado::step_finished {step_name} {
+    set fileId [open "${::pyvivado_task_dir}/steps.txt" "a"]
+    puts $fileId $step_name
+    close $fileId
+}
+
 # Check if the project has been syntehesized yet.
 proc ::pyvivado::is_synthesized {} {
     set is_done 1
@@ -75,53 +211,249 @@ proc ::pyvivado::is_implemented {} {
     return $is_done
 }
 
+# The checkpoint that was restored into a run from the checkpoint cache
+# (see checkpoint_cache.py) or "" if the run wasn't restored.
+proc ::pyvivado::restored_checkpoint {run_name} {
+    set run_dir [get_property DIRECTORY [get_runs $run_name]]
+    set marker [file join $run_dir pyvivado_restored.txt]
+    if {![file exists $marker]} {
+        return ""
+    }
+    set fileId [open $marker "r"]
+    set checkpoint [string trim [read $fileId]]
+    close $fileId
+    return [file join $run_dir $checkpoint]
+}
+
 # Synthesize the project if it hasn't been yet.
-proc ::pyvivado::synthesize {keep_hierarchy} {
+# Args:
+#     `keep_hierarchy`: Not "" to keep the hierarchy of the design.
+#     `use_restored`: 0 to synthesize even if a synthesis checkpoint was
+#         restored (the implementation run needs a real synthesis run).
+proc ::pyvivado::synthesize {keep_hierarchy {use_restored 1}} {
+    if {$use_restored && [::pyvivado::restored_checkpoint synth_1] != ""} {
+        puts "Using the restored synthesis checkpoint."
+        return
+    }
     set_property STEPS.SYNTH_DESIGN.ARGS.FLATTEN_HIERARCHY full [get_runs synth_1]
     if {$keep_hierarchy != ""} {
 	set_property STEPS.SYNTH_DESIGN.ARGS.FLATTEN_HIERARCHY rebuilt [get_runs synth_1]
     }
     set synthesized [::pyvivado::is_synthesized]
     if {$synthesized == 0} {
-        launch_runs synth_1
+        launch_runs synth_1 -jobs $::pyvivado::jobs
         wait_on_run synth_1
     }
 }
 
 # Implement the project if it hasn't been yet.
 proc ::pyvivado::implement {} {
+    if {[::pyvivado::restored_checkpoint impl_1] != ""} {
+        puts "Using the restored implementation checkpoint."
+        ::pyvivado::write_bitstream
+        return
+    }
     set implemented [::pyvivado::is_implemented]
     if {$implemented == 0} {
-        ::pyvivado::synthesize {}
-        launch_runs impl_1 -to_step write_bitstream
+        ::pyvivado::synthesize {} 0
+        launch_runs impl_1 -to_step write_bitstream -jobs $::pyvivado::jobs
         wait_on_run impl_1
     }
 }
 
 # Implement the project but skip generating the bitstream.
 proc ::pyvivado::implement_without_bitstream {} {
+    if {[::pyvivado::restored_checkpoint impl_1] != ""} {
+        puts "Using the restored implementation checkpoint."
+        return
+    }
     set implemented [::pyvivado::is_implemented]
     if {$implemented == 0} {
-        ::pyvivado::synthesize {}
+        ::pyvivado::synthesize {} 0
 	set_property STEPS.PHYS_OPT_DESIGN.IS_ENABLED true [get_runs impl_1]
-        launch_runs impl_1
+        launch_runs impl_1 -jobs $::pyvivado::jobs
         wait_on_run impl_1
     }
 }
 
-# Open the project (specified by the `proj_dir`) and sythesize
+# Generate the bitstream for an implemented project.
+proc ::pyvivado::write_bitstream {} {
+    set checkpoint [::pyvivado::restored_checkpoint impl_1]
+    if {$checkpoint != ""} {
+        # The bitstream is restored along with the checkpoint if there
+        # was one.
+        set run_dir [get_property DIRECTORY [get_runs impl_1]]
+        if {[llength [glob -nocomplain -directory $run_dir *.bit]] == 0} {
+            ::pyvivado::ensure_run_open impl_1
+            set top [get_property TOP [current_fileset]]
+            ::write_bitstream -force [file join $run_dir "${top}.bit"]
+        }
+        return
+    }
+    launch_runs impl_1 -to_step write_bitstream -jobs $::pyvivado::jobs
+    wait_on_run impl_1
+}
+
+# Synthesize a module out of context and put its checkpoint and a stub
+# declaring it in `cache_dir` (unless they are already there).
+# Args:
+#     `part`: The part to synthesize for.
+#     `top`: The name of the module.
+#     `generics`: A list of (name, value) generics for the module.
+#     `files`: The files the module is made from (including the packages
+#         it uses).
+#     `cache_dir`: Where to put the checkpoint and stub.
+proc ::pyvivado::synthesize_ooc {part top generics files cache_dir} {
+    if {[file exists [file join $cache_dir "${top}.dcp"]]} {
+        return
+    }
+    create_project -in_memory -part $part
+    foreach fn $files {
+        switch [file extension $fn] {
+            .vhd {read_vhdl $fn}
+            .sv {read_verilog -sv $fn}
+            default {read_verilog $fn}
+        }
+    }
+    set generic_args {}
+    foreach generic $generics {
+        lassign $generic name value
+        lappend generic_args -generic "${name}=${value}"
+    }
+    synth_design -mode out_of_context -top $top -part $part {*}$generic_args
+    # Write to a temporary directory first so that other processes never
+    # see a partly written entry.
+    set temp_dir "${cache_dir}.[pid].tmp"
+    file delete -force $temp_dir
+    file mkdir $temp_dir
+    write_checkpoint -force [file join $temp_dir "${top}.dcp"]
+    write_vhdl -mode synth_stub -force [file join $temp_dir "${top}_stub.vhd"]
+    close_project
+    if {[catch {file rename $temp_dir $cache_dir}]} {
+        file delete -force $temp_dir
+    }
+}
+
+# The file where ::pyvivado::use_ooc_checkpoints records the changes it
+# made to a project: a list of (sources left out of synthesis, stubs and
+# checkpoints added).
+proc ::pyvivado::ooc_record_fn {proj_dir} {
+    return [file join $proj_dir ooc_checkpoints.txt]
+}
+
+proc ::pyvivado::read_ooc_record {proj_dir} {
+    set fn [::pyvivado::ooc_record_fn $proj_dir]
+    if {![file exists $fn]} {
+        return [list {} {}]
+    }
+    set f [open $fn r]
+    set record [read $f]
+    close $f
+    return $record
+}
+
+# Synthesize the project using out of context checkpoints for some
+# modules.  The sources of those modules are left out of synthesis and
+# their stubs and checkpoints are used instead.  The synthesis run is
+# reset if the checkpoints have changed.  The changes are undone by
+# ::pyvivado::remove_ooc_checkpoints.
+# Args:
+#     `proj_dir`: The directory of the project.
+#     `modules`: A list of (top, files, cache_dir) for the modules where
+#         `files` are the sources of the module that are replaced.
+proc ::pyvivado::use_ooc_checkpoints {proj_dir modules} {
+    ::pyvivado::ensure_project_open $proj_dir
+    set sources {}
+    set added {}
+    foreach module $modules {
+        lassign $module top files cache_dir
+        set sources [concat $sources $files]
+        lappend added [file join $cache_dir "${top}_stub.vhd"] \
+            [file join $cache_dir "${top}.dcp"]
+    }
+    set record [list $sources $added]
+    if {[string equal $record [::pyvivado::read_ooc_record $proj_dir]]} {
+        return
+    }
+    ::pyvivado::remove_ooc_checkpoints $proj_dir
+    if {[llength $added] == 0} {
+        return
+    }
+    set_property USED_IN_SYNTHESIS false [get_files $sources]
+    add_files -fileset sources_1 -norecurse $added
+    set_property USED_IN_SIMULATION false [get_files $added]
+    set f [open [::pyvivado::ooc_record_fn $proj_dir] w]
+    puts -nonewline $f $record
+    close $f
+    reset_run synth_1
+    update_compile_order -fileset sources_1
+}
+
+# Undo ::pyvivado::use_ooc_checkpoints so that the project is synthesized
+# from its sources again.
+# Returns 1 if the project was changed.
+proc ::pyvivado::remove_ooc_checkpoints {proj_dir} {
+    set fn [::pyvivado::ooc_record_fn $proj_dir]
+    if {![file exists $fn]} {
+        return 0
+    }
+    lassign [::pyvivado::read_ooc_record $proj_dir] sources added
+    # The sources may have been removed from the project since.
+    if {[llength $added] > 0} {
+        set added_files [get_files -quiet $added]
+        if {$added_files != ""} {
+            remove_files $added_files
+        }
+    }
+    if {[llength $sources] > 0} {
+        set source_files [get_files -quiet $sources]
+        if {$source_files != ""} {
+            set_property USED_IN_SYNTHESIS true $source_files
+        }
+    }
+    file delete $fn
+    reset_run synth_1
+    update_compile_order -fileset sources_1
+    return 1
+}
+
+# Open the project (specified by the `proj_dir`) and sythesize it from
+# its sources.
 proc ::pyvivado::open_and_synthesize {proj_dir keep_hierarchy} {
-    open_project "${proj_dir}/TheProject.xpr"
+    ::pyvivado::ensure_project_open $proj_dir
+    ::pyvivado::remove_ooc_checkpoints $proj_dir
+    ::pyvivado::synthesize $keep_hierarchy
+}
+
+# Open the project (specified by the `proj_dir`) and sythesize it with
+# the out of context checkpoints set up by
+# ::pyvivado::use_ooc_checkpoints.
+proc ::pyvivado::open_and_synthesize_ooc {proj_dir keep_hierarchy} {
+    ::pyvivado::ensure_project_open $proj_dir
     ::pyvivado::synthesize $keep_hierarchy
 }
 
 # Open the project (specified by the `proj_dir`) and implement
 # it.
 proc ::pyvivado::open_and_implement {proj_dir} {
-    open_project "${proj_dir}/TheProject.xpr"
+    ::pyvivado::ensure_project_open $proj_dir
     ::pyvivado::implement
 }
 
+# Open the project (specified by the `proj_dir`) and implement
+# it without generating the bitstream.
+proc ::pyvivado::open_and_implement_without_bitstream {proj_dir} {
+    ::pyvivado::ensure_project_open $proj_dir
+    ::pyvivado::implement_without_bitstream
+}
+
+# Open the project (specified by the `proj_dir`) and generate its
+# bitstream.
+proc ::pyvivado::open_and_write_bitstream {proj_dir} {
+    ::pyvivado::ensure_project_open $proj_dir
+    ::pyvivado::write_bitstream
+}
+
 # Run a behavioral HDL simulation.
 proc ::pyvivado::run_hdl_simulation {proj_dir runtime} {
     set sim_dir "${proj_dir}/TheProject.sim/sim_1/behav"
@@ -242,7 +574,6 @@ proc ::pyvivado::send_bitstream_to_fpga {proj_dir hwcode fake} {
 # Check redis for any AXI commands to send to the FPGA.
 # Writes responses back to redis.
 proc ::pyvivado::check_redis {r hwcode fake} {
-    puts "checking redis"
     $r set ${hwcode}_last_A [clock format [clock seconds] -format %Y%m%d%H%M%S]
     set output [$r get ${hwcode}_comm]
     set bits [split $output]
@@ -317,16 +648,186 @@ proc ::pyvivado::write_axi {address value} {
     return $results
 }
 
+# Open a run unless it is already the current design.
+# Restored runs are opened from their restored checkpoint.
+proc ::pyvivado::ensure_run_open {run_name} {
+    set design [current_design -quiet]
+    if {$design == "" || [get_property NAME $design] != $run_name} {
+        set checkpoint [::pyvivado::restored_checkpoint $run_name]
+        if {$checkpoint != ""} {
+            open_checkpoint $checkpoint
+            set_property NAME $run_name [current_design]
+        } else {
+            open_run $run_name -name $run_name
+        }
+    }
+}
+
+# Write the reports for an implemented design.
+# Assumes the project is already open.
+proc ::pyvivado::write_impl_reports {proj_dir} {
+    ::pyvivado::ensure_run_open impl_1
+    ::pyvivado::write_reports $proj_dir impl
+}
+
+# Write the reports for a synthesized design.
+# Assumes the project is already open.
+proc ::pyvivado::write_synth_reports {proj_dir} {
+    ::pyvivado::ensure_run_open synth_1
+    ::pyvivado::write_reports $proj_dir synth
+}
+
+# Write the reports for the current design.
+# Args:
+#     `prefix`: "synth" or "impl".
+proc ::pyvivado::write_reports {proj_dir prefix} {
+    report_power -file ${proj_dir}/${prefix}_power.txt
+    report_utilization -file ${proj_dir}/${prefix}_utilization.txt -hierarchical -hierarchical_depth 10
+    report_timing_summary -file ${proj_dir}/${prefix}_timing.txt
+    report_clock_utilization -file ${proj_dir}/${prefix}_clock_utilization.txt
+}
+
 proc ::pyvivado::generate_impl_reports {proj_dir} {
-    open_project "${proj_dir}/TheProject.xpr"
-    open_run impl_1
-    report_power -file ${proj_dir}/impl_power.txt
-    report_utilization -file ${proj_dir}/impl_utilization.txt -hierarchical -hierarchical_depth 10
+    ::pyvivado::ensure_project_open $proj_dir
+    ::pyvivado::write_impl_reports $proj_dir
 }
 
 proc ::pyvivado::generate_synth_reports {proj_dir} {
-    open_project "${proj_dir}/TheProject.xpr"
-    open_run synth_1
-    report_power -file ${proj_dir}/synth_power.txt
-    report_utilization -file ${proj_dir}/synth_utilization.txt -hierarchical -hierarchical_depth 10
+    ::pyvivado::ensure_project_open $proj_dir
+    ::pyvivado::write_synth_reports $proj_dir
+}
+
+# The non-project flow (see nonproject.py) builds a design in memory
+# without creating a project or launching runs.  The checkpoints and
+# bitstream are written where the project runs would put them and the
+# reports are written to the same files so the rest of pyvivado finds
+# them.
+
+# The run directory that the artifacts of a stage are written to.
+proc ::pyvivado::nonproject_run_dir {proj_dir run_name} {
+    set run_dir [file join $proj_dir TheProject.runs $run_name]
+    file mkdir $run_dir
+    return $run_dir
+}
+
+# Mark a run as finished in the same way Vivado does so that its
+# checkpoints can be saved (see checkpoint_cache.py).
+proc ::pyvivado::nonproject_run_finished {run_dir} {
+    close [open [file join $run_dir .vivado.end.rst] "w"]
+}
+
+# Make sure the design of a run is the current design, opening its
+# checkpoint if it was restored or the steps are being run in a new
+# Vivado process.
+# Args:
+#     `pattern`: The pattern of the checkpoint in the run directory.
+proc ::pyvivado::nonproject_ensure_open {proj_dir run_name pattern} {
+    if {[info exists ::pyvivado::nonproject_run] &&
+        $::pyvivado::nonproject_run == $run_name} {
+        return
+    }
+    set run_dir [file join $proj_dir TheProject.runs $run_name]
+    set checkpoints [glob -nocomplain -directory $run_dir $pattern]
+    if {[llength $checkpoints] == 0} {
+        error "No $run_name checkpoint in $proj_dir."
+    }
+    catch {close_design}
+    open_checkpoint [lindex $checkpoints 0]
+    set ::pyvivado::nonproject_run $run_name
+}
+
+# Read the sources and IP blocks of a design into memory.
+# Args:
+#     `proj_dir`: Where the design files were generated.  IP blocks are
+#         created in the "ip" directory in it.
+#     `part`: The part to build for.
+#     `files`: The design files (VHDL, Verilog and XDC).
+#     `ips`: A list of (ip_name, ip_version, module_name, properties,
+#         cache_dir) (see create_ips).
+proc ::pyvivado::nonproject_read {proj_dir part files ips} {
+    create_project -in_memory -part $part
+    set_property target_language VHDL [current_project]
+    foreach fn $files {
+        switch [file extension $fn] {
+            .vhd {read_vhdl $fn}
+            .sv {read_verilog -sv $fn}
+            .xdc {read_xdc $fn}
+            default {read_verilog $fn}
+        }
+    }
+    set ip_root [file join $proj_dir ip]
+    file mkdir $ip_root
+    foreach ip $ips {
+        lassign $ip ip_name ip_version module_name properties cache_dir
+        set cache_dir [::pyvivado::ip_cache_dir $cache_dir]
+        set ip_dir [file join $ip_root $module_name]
+        file delete -force $ip_dir
+        if {$cache_dir != "" && [file exists [file join $cache_dir "${module_name}.xci"]]} {
+            puts "DEBUG: Using cached IP in $cache_dir"
+            file copy $cache_dir $ip_dir
+            read_ip [file join $ip_dir "${module_name}.xci"]
+            continue
+        }
+        ::pyvivado::new_ip $ip_name $ip_version $module_name $properties -dir $ip_root
+        if {$cache_dir != ""} {
+            ::pyvivado::cache_ip $module_name $cache_dir
+        } else {
+            generate_target all [get_ips $module_name]
+            synth_ip [get_ips $module_name]
+        }
+    }
+    set ::pyvivado::nonproject_run ""
+}
+
+# Synthesize the design that has been read into memory.
+# Args:
+#     `top`: The top module (found automatically if "").
+#     `keep_hierarchy`: Not "" to keep the hierarchy of the design.
+proc ::pyvivado::nonproject_synthesize {proj_dir top keep_hierarchy} {
+    if {$top == ""} {
+        set top [lindex [find_top] 0]
+    }
+    set flatten full
+    if {$keep_hierarchy != ""} {
+        set flatten rebuilt
+    }
+    synth_design -top $top -flatten_hierarchy $flatten
+    set run_dir [::pyvivado::nonproject_run_dir $proj_dir synth_1]
+    write_checkpoint -force [file join $run_dir "${top}.dcp"]
+    ::pyvivado::nonproject_run_finished $run_dir
+    set ::pyvivado::nonproject_run synth_1
+}
+
+# Place and route the synthesized design.
+proc ::pyvivado::nonproject_implement {proj_dir} {
+    ::pyvivado::nonproject_ensure_open $proj_dir synth_1 *.dcp
+    opt_design
+    place_design
+    phys_opt_design
+    route_design
+    set top [get_property TOP [current_design]]
+    set run_dir [::pyvivado::nonproject_run_dir $proj_dir impl_1]
+    write_checkpoint -force [file join $run_dir "${top}_routed.dcp"]
+    ::pyvivado::nonproject_run_finished $run_dir
+    set ::pyvivado::nonproject_run impl_1
+}
+
+# Write the reports of the synthesized or implemented design.
+# Args:
+#     `prefix`: "synth" or "impl".
+proc ::pyvivado::nonproject_reports {proj_dir prefix} {
+    if {$prefix == "synth"} {
+        ::pyvivado::nonproject_ensure_open $proj_dir synth_1 *.dcp
+    } else {
+        ::pyvivado::nonproject_ensure_open $proj_dir impl_1 *_routed.dcp
+    }
+    ::pyvivado::write_reports $proj_dir $prefix
+}
+
+# Generate the bitstream of the implemented design.
+proc ::pyvivado::nonproject_write_bitstream {proj_dir} {
+    ::pyvivado::nonproject_ensure_open $proj_dir impl_1 *_routed.dcp
+    set top [get_property TOP [current_design]]
+    set run_dir [::pyvivado::nonproject_run_dir $proj_dir impl_1]
+    ::write_bitstream -force [file join $run_dir "${top}.bit"]
 }
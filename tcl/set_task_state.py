@@ -0,0 +1,31 @@
+'''
+Records the state of a task in the tasks database.
+
+Vivado runs this at the start and end of a task (see vivado_task.tcl.t).
+It is run as a script so it loads `sqlite_collection` directly rather
+than importing the pyvivado package.
+
+Usage:
+    python set_task_state.py <database> <task id> <state> [<final state> ...]
+'''
+import os
+import sys
+import importlib.util
+
+
+def load_sqlite_collection():
+    fn = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'sqlite_collection.py')
+    spec = importlib.util.spec_from_file_location('sqlite_collection', fn)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+if __name__ == '__main__':
+    db_fn, task_id, state = sys.argv[1:4]
+    final_states = sys.argv[4:]
+    sqlite_collection = load_sqlite_collection()
+    collection = sqlite_collection.SQLLiteCollection(db_fn)
+    collection.set_state(int(task_id), state, final_states=final_states)
+    collection.close()
@@ -1,35 +1,51 @@
-# -*- tcl -*- 
+# -*- tcl -*-
 
+# Remember the task directory since some commands change the
+# working directory.
+set ::pyvivado_task_dir [pwd]
+# Where to record the state of this task.  If there is no tasks
+# database (or it can't be reached) the state is written to
+# current_state.txt instead.
+set ::pyvivado_task_id {task_id}
+set ::pyvivado_tasks_db {{{tasks_db}}}
+set ::pyvivado_python {{{python}}}
+set ::pyvivado_finished_states {{{finished_states}}}
+# Where the pyvivado TCL files are.  The process that starts Vivado (e.g.
+# a spool worker on another host) says where its own copy is.
+if {{[info exists ::env(PYVIVADO_TCLDIR)]}} {{
+  set ::pyvivado_tcl_directory $::env(PYVIVADO_TCLDIR)
+}} else {{
+  set ::pyvivado_tcl_directory {{{tcl_directory}}}
+}}
+proc ::pyvivado_set_task_state {{state}} {{
+  if {{$::pyvivado_tasks_db != ""}} {{
+    set helper [file join $::pyvivado_tcl_directory set_task_state.py]
+    if {{![catch {{exec $::pyvivado_python $helper $::pyvivado_tasks_db \
+                   $::pyvivado_task_id $state {{*}}$::pyvivado_finished_states}} message]}} {{
+      return
+    }}
+    puts "WARNING: Could not write task state to database: $message"
+  }}
+  set fileId [open [file join $::pyvivado_task_dir current_state.txt] "w"]
+  puts -nonewline $fileId $state
+  close $fileId
+}}
 # Update the state of this task to 'RUNNING'.
-set current_state_f current_state.txt
-set fileId [open $current_state_f "w"]
-puts -nonewline $fileId RUNNING
-close $fileId
-# We also write the state to finished.txt when we finish.
-set finished_f finished.txt
+::pyvivado_set_task_state RUNNING
 # Put our command in a catch so that if we have errors in
 # the command, we'll still update the state correctly before
 # exiting.
 if {{[catch {{
-  lappend auto_path {{{tcl_directory}}}
+  lappend auto_path $::pyvivado_tcl_directory
   package require pyvivado
   # And the actual command that this task was created to perform.
   {command}
 }} message]}} {{
   # Handle an error in the command.
   puts "ERROR: $message"
-  set fileId [open $current_state_f "w"]
-  puts -nonewline $fileId FINISHED_ERROR
-  close $fileId
-  set fileId [open $finished_f "w"]
-  puts -nonewline $fileId FINISHED_ERROR
-  close $fileId
+  ::pyvivado_set_task_state FINISHED_ERROR
+}} else {{
+  # Everything went smoothly so update our state
+  # with FINISHED_OK.
+  ::pyvivado_set_task_state FINISHED_OK
 }}
-# Everything went smoothly so update our state
-# with FINISHED_OK.
-set fileId [open $current_state_f "w"]
-puts -nonewline $fileId FINISHED_OK
-close $fileId
-set fileId [open $finished_f "w"]
-puts -nonewline $fileId FINISHED_OK
-close $fileId
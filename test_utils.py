@@ -3,6 +3,8 @@ import unittest
 import testfixtures
 import logging
 import shutil
+import stat
+import sys
 
 from pyvivado import project, config, external, axi
 
@@ -21,6 +23,66 @@ class TestCase(unittest.TestCase):
         return check_output(*args, **kwargs)
 
 
+def make_fake_vivado(directory, run_time=0, final_state='FINISHED_OK',
+                     messages=()):
+    '''
+    Write an executable that can stand in for `config.vivado` when testing
+    the task machinery without Vivado.  Like a real Vivado task that
+    can't reach the tasks database it writes its state to
+    current_state.txt.  It also starts a child process (recording its
+    process ID in child_pid.txt) so that tests can check that the whole
+    process group is killed.
+
+    Args:
+        `directory`: Where to write the executable.
+        `run_time`: How many seconds the fake task takes.
+        `final_state`: The state the fake task finishes in.
+        `messages`: Lines written to stdout (e.g. 'ERROR: broken').
+
+    Returns the filename of the executable.
+    '''
+    fn = os.path.join(directory, 'fake_vivado')
+    script = '''#!{python}
+import subprocess
+import sys
+import time
+
+with open('current_state.txt', 'w') as f:
+    f.write('RUNNING')
+child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep({run_time})'])
+with open('child_pid.txt', 'w') as f:
+    f.write(str(child.pid))
+for message in {messages!r}:
+    print(message)
+sys.stdout.flush()
+time.sleep({run_time})
+with open('current_state.txt', 'w') as f:
+    f.write({final_state!r})
+'''.format(python=sys.executable, run_time=run_time,
+           final_state=final_state, messages=list(messages))
+    with open(fn, 'w') as f:
+        f.write(script)
+    os.chmod(fn, os.stat(fn).st_mode | stat.S_IEXEC)
+    return fn
+
+
+def make_tclsh_vivado(directory):
+    '''
+    Write an executable that can stand in for `config.vivado` by running
+    the task's TCL script with tclsh.  Only works for commands that
+    don't need Vivado.
+
+    Returns the filename of the executable.
+    '''
+    fn = os.path.join(directory, 'tclsh_vivado')
+    # Called as `vivado -mode batch -source command.tcl`.
+    script = '#!/bin/sh\nexec tclsh "$4"\n'
+    with open(fn, 'w') as f:
+        f.write(script)
+    os.chmod(fn, os.stat(fn).st_mode | stat.S_IEXEC)
+    return fn
+
+
 def check_output(output_data, expected_data):
     assert(len(output_data) >= len(expected_data))
     output_data = output_data[:len(expected_data)]
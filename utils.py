@@ -1,31 +1,366 @@
+import os
+import time
+import mmap
+import logging
+import threading
+import concurrent.futures
 import jinja2
 import hashlib
 import json
+import collections
 
-def format_file(template_filename, output_filename, parameters):
+from pyvivado import config
+
+logger = logging.getLogger(__name__)
+
+# How many compiled templates are kept in memory.
+TEMPLATE_CACHE_SIZE = 400
+
+_jinja_environment = None
+_jinja_environment_lock = threading.Lock()
+
+
+def get_jinja_environment():
+    '''
+    Get the shared jinja2 environment used to format templates.
+
+    Templates are found relative to `config.hdldir` or by their absolute
+    path.  Compiled templates are kept in an LRU cache (and recompiled if
+    the template file changes) and their bytecode is cached on disk in
+    `config.cachedir` so that other processes don't have to compile them
+    again.
+    '''
+    global _jinja_environment
+    with _jinja_environment_lock:
+        if _jinja_environment is None:
+            bytecode_directory = os.path.join(config.cachedir, 'jinja')
+            try:
+                os.makedirs(bytecode_directory, exist_ok=True)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(
+                    bytecode_directory)
+            except OSError as e:
+                logger.warning('Not caching template bytecode: {}'.format(e))
+                bytecode_cache = None
+            loader = jinja2.ChoiceLoader([
+                jinja2.FileSystemLoader(config.hdldir),
+                jinja2.FileSystemLoader(os.path.abspath(os.sep)),
+            ])
+            _jinja_environment = jinja2.Environment(
+                loader=loader, cache_size=TEMPLATE_CACHE_SIZE,
+                bytecode_cache=bytecode_cache, auto_reload=True)
+    return _jinja_environment
+
+
+def get_template(template_filename):
+    '''
+    Get a compiled template from the shared jinja2 environment.
+    '''
+    template_filename = os.path.abspath(template_filename)
+    relative_fn = os.path.relpath(template_filename, config.hdldir)
+    if relative_fn.startswith(os.pardir):
+        name = os.path.relpath(template_filename, os.path.abspath(os.sep))
+    else:
+        name = relative_fn
+    # jinja2 template names always use forward slashes.
+    return get_jinja_environment().get_template(name.replace(os.sep, '/'))
+
+
+def format_file(template_filename, output_filename, parameters, files=None):
     '''
     Create a file from a template and parameters.
+
+    If `files` (a `VirtualFiles`) is given the file is put there rather
+    than being written to disk.  Otherwise the file is only written if
+    its contents have changed and True is returned if it was.
     '''
-    with open(template_filename, 'r') as f:
-        template_text = f.read()
-        template = jinja2.Template(template_text)
+    template = get_template(template_filename)
     formatted_text = template.render(**parameters)
-    with open(output_filename, 'w') as g:
-        g.write(formatted_text)
+    if files is None:
+        changed = write_if_changed(output_filename, formatted_text)
+    else:
+        files[output_filename] = formatted_text
+        changed = None
+    return changed
+
+
+def canonical(obj):
+    '''
+    Convert an object into a canonical form built from JSON types so that
+    equal objects always serialize identically in every process.  Unlike
+    `hash` this doesn't change between Python processes.
+
+    Objects can define a `canonical_form` method that returns something
+    that can itself be made canonical.  Classes and functions are
+    represented by their qualified names.
+    '''
+    if hasattr(obj, 'canonical_form') and not isinstance(obj, type):
+        form = canonical(obj.canonical_form())
+    elif (obj is None) or isinstance(obj, (bool, int, float, str)):
+        form = obj
+    elif isinstance(obj, bytes):
+        form = {'bytes': obj.hex()}
+    elif isinstance(obj, collections.OrderedDict):
+        form = {'odict': [[canonical(k), canonical(v)] for k, v in obj.items()]}
+    elif isinstance(obj, dict):
+        items = [[canonical(k), canonical(v)] for k, v in obj.items()]
+        form = {'dict': sorted(items, key=lambda item: canonical_dumps(item[0]))}
+    elif isinstance(obj, (list, tuple)):
+        form = [canonical(v) for v in obj]
+    elif isinstance(obj, (set, frozenset)):
+        form = {'set': sorted([canonical(v) for v in obj], key=canonical_dumps)}
+    elif hasattr(obj, '__qualname__'):
+        form = {'name': '{}.{}'.format(obj.__module__, obj.__qualname__)}
+    else:
+        raise ValueError('Cannot make a canonical form of {!r}.'.format(obj))
+    return form
+
+
+def canonical_dumps(form):
+    return json.dumps(form, sort_keys=True, separators=(',', ':'))
+
+
+def fingerprint(obj):
+    '''
+    A stable SHA-256 hex digest of the canonical form of an object.
+    Suitable for file names and cache keys.
+    '''
+    return hashlib.sha256(
+        canonical_dumps(canonical(obj)).encode('utf-8')).hexdigest()
+
+
+def as_bytes(content):
+    '''
+    Text is written as UTF-8 without newline translation so that files
+    have the same digest as their text (see `VirtualFiles.digest`).
+    '''
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return content
+
+
+def write_file(filename, content):
+    '''
+    Write text or bytes to a file.  The file is replaced atomically so
+    nothing ever sees it half written.
+    '''
+    tmp_filename = '{}.{}.{}.tmp'.format(
+        filename, os.getpid(), threading.get_ident())
+    with open(tmp_filename, 'wb') as f:
+        f.write(as_bytes(content))
+    os.replace(tmp_filename, filename)
+
+
+def write_if_changed(filename, content):
+    '''
+    Write text or bytes to a file unless the file already has those
+    contents.  Leaving unchanged files alone keeps their modification
+    times so that Vivado and xsim don't recompile them.
+
+    Returns True if the file was written.
+    '''
+    content = as_bytes(content)
+    if os.path.exists(filename) and (os.path.getsize(filename) == len(content)):
+        with open(filename, 'rb') as f:
+            if f.read() == content:
+                return False
+    write_file(filename, content)
+    return True
+
+
+class VirtualFiles(dict):
+    '''
+    Generated files held in memory rather than written to disk.
+    Maps filenames to their contents (text or bytes).
+
+    Builders that accept a `files` argument put the files they generate
+    here so that we can work out a project's hash without touching the
+    disk, and only write the files once when the project is created.
+    '''
+
+    def digest(self, filename):
+        '''
+        The SHA-1 digest of a file's contents.  This matches the digest
+        of the file once it is written.
+        '''
+        return hashlib.sha1(as_bytes(self[filename])).digest()
+
+    def write_all(self):
+        '''
+        Write all the files to disk.  Files that already have the right
+        contents are left alone.
+
+        Returns a sorted list of the files that were written.
+        '''
+        changed = []
+        for filename, content in self.items():
+            directory = os.path.dirname(filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if write_if_changed(filename, content):
+                changed.append(filename)
+        return sorted(changed)
+
+
+class FileDigestManifest(object):
+    '''
+    A persistent record of the digests of files.  Each digest is stored
+    along with the (size, mtime_ns, inode) of the file when it was
+    hashed, so a file that hasn't changed only needs a `stat` rather
+    than being read again.
+    '''
+
+    # Files bigger than this are memory mapped rather than read.
+    MMAP_THRESHOLD = 1 << 20
+    # Files modified this recently (in seconds) aren't recorded since
+    # they could change again without their mtime changing.
+    RACY_INTERVAL = 2
+
+    def __init__(self, fn=None, n_threads=None):
+        '''
+        Args:
+            `fn`: Where the manifest is stored (None to keep it in memory).
+            `n_threads`: How many files to hash in parallel.
+        '''
+        self.fn = fn
+        if n_threads is None:
+            n_threads = min(8, os.cpu_count() or 1)
+        self.n_threads = n_threads
+        self.entries = {}
+        # Whether entries were added since the manifest was last saved.
+        self.changed = False
+        self.lock = threading.Lock()
+        if (fn is not None) and os.path.exists(fn):
+            self.entries = self.read(fn)
+
+    @staticmethod
+    def read(fn):
+        try:
+            with open(fn, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            logger.warning('Ignoring unreadable file digest manifest {}.'.format(fn))
+            entries = {}
+        return entries
 
-def files_hash(fns):
+    def save(self):
+        '''
+        Write the manifest if any entries were added.  Entries written by
+        other processes in the meantime are kept and entries for files
+        that no longer exist are dropped.
+        '''
+        if (self.fn is None) or (not self.changed):
+            return
+        with self.lock:
+            if os.path.exists(self.fn):
+                entries = self.read(self.fn)
+            else:
+                os.makedirs(os.path.dirname(self.fn), exist_ok=True)
+                entries = {}
+            entries.update(self.entries)
+            entries = dict((fn, entry) for fn, entry in entries.items()
+                           if os.path.exists(fn))
+            self.entries = entries
+            self.changed = False
+            # Write to a temporary file so that the manifest is never
+            # half written.
+            tmp_fn = '{}.{}.tmp'.format(self.fn, os.getpid())
+            with open(tmp_fn, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_fn, self.fn)
+
+    @classmethod
+    def hash_file(cls, fn, size):
+        '''
+        Get the SHA-1 digest of the contents of a file.
+        '''
+        h = hashlib.sha1()
+        with open(fn, 'rb') as f:
+            if size >= cls.MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    h.update(m)
+            else:
+                h.update(f.read())
+        return h.digest()
+
+    def digest(self, fn):
+        '''
+        Get the digest of a file, hashing it only if it has changed
+        since it was last hashed.
+        '''
+        fn = os.path.abspath(fn)
+        st = os.stat(fn)
+        key = [st.st_size, st.st_mtime_ns, st.st_ino]
+        with self.lock:
+            entry = self.entries.get(fn, None)
+        if (entry is not None) and (entry[:3] == key):
+            return bytes.fromhex(entry[3])
+        digest = self.hash_file(fn, st.st_size)
+        if time.time() - st.st_mtime_ns / 1e9 > self.RACY_INTERVAL:
+            with self.lock:
+                self.entries[fn] = key + [digest.hex()]
+                self.changed = True
+        return digest
+
+    def digests(self, fns):
+        '''
+        Get the digests of several files.  Files that need hashing are
+        hashed in parallel.
+        '''
+        fns = list(fns)
+        if (self.n_threads > 1) and (len(fns) > 1):
+            with concurrent.futures.ThreadPoolExecutor(self.n_threads) as executor:
+                digests = list(executor.map(self.digest, fns))
+        else:
+            digests = [self.digest(fn) for fn in fns]
+        self.save()
+        return digests
+
+
+default_manifest = None
+
+def get_default_manifest():
+    '''
+    The manifest shared by all projects, stored in `config.cachedir`.
+    '''
+    global default_manifest
+    if default_manifest is None:
+        default_manifest = FileDigestManifest(
+            os.path.join(config.cachedir, 'file_digests.json'))
+    return default_manifest
+
+
+def files_hash(fns, manifest=None, files=None):
     '''
     Generate a hash from the contents of several files.
+
+    Args:
+        `fns`: The filenames.
+        `manifest`: A `FileDigestManifest` caching the digests of the
+            files.  Defaults to the shared manifest.
+        `files`: A `VirtualFiles` holding the contents of any files that
+            haven't been written to disk.
     '''
     h = hashlib.sha1()
-    for fn in fns:
-        with open(fn, 'rb') as f:
-            finished = False
-            while not finished:
-                buf = f.read(4096)
-                if buf:
-                    h.update(hashlib.sha1(buf).digest())
-                else: 
-                    finished = True
+    for digest in file_digests(fns, manifest=manifest, files=files):
+        h.update(digest)
     return h.digest()
 
+
+def file_digests(fns, manifest=None, files=None):
+    '''
+    Get the digests of the contents of several files.  The arguments are
+    the same as for `files_hash`.
+    '''
+    if manifest is None:
+        manifest = get_default_manifest()
+    if files is None:
+        files = {}
+    fns = list(fns)
+    disk_digests = iter(manifest.digests([fn for fn in fns if fn not in files]))
+    digests = []
+    for fn in fns:
+        if fn in files:
+            digests.append(files.digest(fn))
+        else:
+            digests.append(next(disk_digests))
+    return digests